@@ -0,0 +1,21 @@
+from sqlalchemy import create_engine, inspect, text
+from backend.database import SQLALCHEMY_DATABASE_URL
+
+def add_item_store_category_index():
+    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    inspector = inspect(engine)
+    indexes = {i["name"] for i in inspector.get_indexes("items")}
+    with engine.begin() as conn:
+        if "ix_items_store_id_category_id" in indexes:
+            print("Index 'ix_items_store_id_category_id' already exists.")
+        else:
+            # GET /items reads one store's menu, optionally one category, in id order
+            conn.execute(text("CREATE INDEX ix_items_store_id_category_id ON items (store_id, category, id)"))
+            print("Index 'ix_items_store_id_category_id' created.")
+        if "ix_items_category" in indexes:
+            # Covered by the composite index for every query that filters on category
+            conn.execute(text("DROP INDEX ix_items_category"))
+            print("Index 'ix_items_category' dropped.")
+
+if __name__ == "__main__":
+    add_item_store_category_index()
@@ -0,0 +1,21 @@
+from sqlalchemy import create_engine, inspect, text
+from backend.database import SQLALCHEMY_DATABASE_URL
+
+def add_order_client_id_column():
+    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    inspector = inspect(engine)
+    columns = {c["name"] for c in inspector.get_columns("orders")}
+    indexes = {i["name"] for i in inspector.get_indexes("orders")}
+    with engine.begin() as conn:
+        if "client_order_id" in columns:
+            print("Column 'orders.client_order_id' already exists.")
+        else:
+            conn.execute(text("ALTER TABLE orders ADD COLUMN client_order_id VARCHAR"))
+            print("Column 'orders.client_order_id' added.")
+        if "ix_orders_client_order_id" not in indexes:
+            # Unique: offline replays are deduplicated on it. Existing orders stay NULL
+            conn.execute(text("CREATE UNIQUE INDEX ix_orders_client_order_id ON orders (client_order_id)"))
+            print("Index 'ix_orders_client_order_id' created.")
+
+if __name__ == "__main__":
+    add_order_client_id_column()
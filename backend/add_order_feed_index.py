@@ -0,0 +1,22 @@
+from sqlalchemy import create_engine, inspect, text
+from backend.database import SQLALCHEMY_DATABASE_URL
+
+def add_order_feed_index():
+    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    columns = {c["name"] for c in inspect(engine).get_columns("orders")}
+    with engine.begin() as conn:
+        if "updated_at" in columns:
+            print("Column 'updated_at' already exists.")
+        else:
+            print("Column 'updated_at' does not exist. Adding...")
+            conn.execute(text("ALTER TABLE orders ADD COLUMN updated_at DATETIME"))
+            # Existing orders: treat creation as the last change
+            conn.execute(text("UPDATE orders SET updated_at = created_at WHERE updated_at IS NULL"))
+            print("Column 'updated_at' added successfully.")
+
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_orders_created_at_id ON orders (created_at, id)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_orders_updated_at_id ON orders (updated_at, id)"))
+        print("Order feed indexes ensured.")
+
+if __name__ == "__main__":
+    add_order_feed_index()
@@ -0,0 +1,32 @@
+from sqlalchemy import create_engine, inspect, text
+from backend.database import SQLALCHEMY_DATABASE_URL
+
+def add_order_store_column():
+    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    inspector = inspect(engine)
+    columns = {c["name"] for c in inspector.get_columns("orders")}
+    indexes = {i["name"] for i in inspector.get_indexes("orders")}
+    with engine.begin() as conn:
+        if "store_id" in columns:
+            print("Column 'orders.store_id' already exists.")
+        else:
+            conn.execute(text("ALTER TABLE orders ADD COLUMN store_id INTEGER"))
+            print("Column 'orders.store_id' added.")
+        if "ix_orders_store_id" not in indexes:
+            conn.execute(text("CREATE INDEX ix_orders_store_id ON orders (store_id)"))
+            print("Index 'ix_orders_store_id' created.")
+
+        # Backfill from the ordered items, for orders whose items all belong to one store
+        conn.execute(text("""
+            UPDATE orders SET store_id = (
+                SELECT MIN(items.store_id) FROM order_items
+                JOIN items ON items.id = order_items.item_id
+                WHERE order_items.order_id = orders.id
+                HAVING COUNT(DISTINCT items.store_id) = 1
+            )
+            WHERE store_id IS NULL
+        """))
+        print("Order stores backfilled.")
+
+if __name__ == "__main__":
+    add_order_store_column()
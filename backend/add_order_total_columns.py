@@ -0,0 +1,43 @@
+from sqlalchemy import create_engine, inspect, text
+from backend.database import SQLALCHEMY_DATABASE_URL
+
+def add_order_total_columns():
+    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    order_columns = {c["name"] for c in inspect(engine).get_columns("orders")}
+    line_columns = {c["name"] for c in inspect(engine).get_columns("order_items")}
+    with engine.begin() as conn:
+        for table, column, existing in (
+            ("order_items", "unit_price", line_columns),
+            ("order_items", "line_total", line_columns),
+            ("orders", "total", order_columns),
+        ):
+            if column in existing:
+                print(f"Column '{table}.{column}' already exists.")
+            else:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} INTEGER"))
+                print(f"Column '{table}.{column}' added.")
+
+        # Backfill from current prices (historical prices were never recorded)
+        conn.execute(text("""
+            UPDATE order_items SET unit_price = (
+                SELECT items.price + COALESCE((
+                    SELECT SUM(options.price_adjustment)
+                    FROM order_item_options
+                    JOIN options ON options.id = order_item_options.option_id
+                    WHERE order_item_options.order_item_id = order_items.id
+                ), 0)
+                FROM items WHERE items.id = order_items.item_id
+            )
+            WHERE unit_price IS NULL
+        """))
+        conn.execute(text("UPDATE order_items SET line_total = unit_price * quantity WHERE line_total IS NULL"))
+        conn.execute(text("""
+            UPDATE orders SET total = (
+                SELECT COALESCE(SUM(line_total), 0) FROM order_items WHERE order_items.order_id = orders.id
+            )
+            WHERE total IS NULL
+        """))
+        print("Order totals backfilled.")
+
+if __name__ == "__main__":
+    add_order_total_columns()
@@ -0,0 +1,29 @@
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import sessionmaker
+from backend.database import SQLALCHEMY_DATABASE_URL
+from backend.fix_duplicates import fix_duplicates
+
+def add_unique_constraints():
+    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    # The unique indexes can't be built while duplicates remain
+    with sessionmaker(bind=engine)() as db:
+        fix_duplicates(db)
+
+    inspector = inspect(engine)
+    option_indexes = {i["name"]: i for i in inspector.get_indexes("options")}
+    item_indexes = {i["name"] for i in inspector.get_indexes("items")}
+    with engine.begin() as conn:
+        if option_indexes.get("ix_options_name", {}).get("unique"):
+            print("Index 'ix_options_name' is already unique.")
+        else:
+            conn.execute(text("DROP INDEX IF EXISTS ix_options_name"))
+            conn.execute(text("CREATE UNIQUE INDEX ix_options_name ON options (name)"))
+            print("Index 'ix_options_name' made unique.")
+        if "uq_items_store_id_name" in item_indexes:
+            print("Index 'uq_items_store_id_name' already exists.")
+        else:
+            conn.execute(text("CREATE UNIQUE INDEX uq_items_store_id_name ON items (store_id, name)"))
+            print("Index 'uq_items_store_id_name' created.")
+
+if __name__ == "__main__":
+    add_unique_constraints()
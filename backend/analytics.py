@@ -0,0 +1,132 @@
+from collections import defaultdict
+from datetime import datetime
+from itertools import chain
+from typing import Iterable, Optional
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from . import models
+
+UNKNOWN = "unknown"
+UNASSIGNED_STORE = 0 # Items seeded without a store
+
+
+def hour_bucket(timestamp: datetime) -> datetime:
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def _order_lines_statement():
+    # One row per order line, priced from the totals persisted at order time
+    return (
+        select(
+            models.Order.id.label("order_id"),
+            models.Order.created_at,
+            models.Order.age_group,
+            models.Order.gender,
+            func.coalesce(models.Order.store_id, models.Item.store_id, UNASSIGNED_STORE).label("store_id"),
+            models.OrderItem.item_id,
+            models.OrderItem.quantity,
+            func.coalesce(models.OrderItem.line_total, 0).label("line_total"),
+        )
+        .join(models.OrderItem, models.OrderItem.order_id == models.Order.id)
+        .join(models.Item, models.Item.id == models.OrderItem.item_id)
+    )
+
+
+def _aggregate(lines: Iterable):
+    items = defaultdict(lambda: [0, 0])
+    demographics = defaultdict(lambda: [set(), 0, 0])
+    for line in lines:
+        hour = hour_bucket(line.created_at)
+        revenue = line.line_total
+        item_bucket = items[(line.store_id, line.item_id, hour)]
+        item_bucket[0] += line.quantity
+        item_bucket[1] += revenue
+        demo_bucket = demographics[(line.store_id, hour, line.age_group or UNKNOWN, line.gender or UNKNOWN)]
+        demo_bucket[0].add(line.order_id)
+        demo_bucket[1] += line.quantity
+        demo_bucket[2] += revenue
+
+    item_rows = [
+        {"store_id": store_id, "item_id": item_id, "hour": hour, "quantity": quantity, "revenue": revenue}
+        for (store_id, item_id, hour), (quantity, revenue) in items.items()
+    ]
+    demographic_rows = [
+        {"store_id": store_id, "hour": hour, "age_group": age_group, "gender": gender,
+         "orders": len(order_ids), "quantity": quantity, "revenue": revenue}
+        for (store_id, hour, age_group, gender), (order_ids, quantity, revenue) in demographics.items()
+    ]
+    return item_rows, demographic_rows
+
+
+def _upsert(db: Session, model, rows, keys, counters):
+    if not rows:
+        return
+    dialect_insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+    stmt = dialect_insert(model)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=keys,
+        set_={name: getattr(model, name) + getattr(stmt.excluded, name) for name in counters},
+    )
+    db.execute(stmt, rows)
+
+
+def record_checkout(db: Session, order_id: int):
+    """Add one checked-out order to the rollups. Runs inside the checkout transaction."""
+    record_checkouts(db, [order_id])
+
+
+def record_checkouts(db: Session, order_ids: Iterable[int]):
+    lines = db.execute(_order_lines_statement().where(models.Order.id.in_(list(order_ids)))).all()
+    item_rows, demographic_rows = _aggregate(lines)
+    _upsert(db, models.SalesItemHourly, item_rows, ["store_id", "item_id", "hour"], ["quantity", "revenue"])
+    _upsert(db, models.SalesDemographicHourly, demographic_rows,
+            ["store_id", "hour", "age_group", "gender"], ["orders", "quantity", "revenue"])
+
+
+def rebuild(db: Session):
+    """Recompute both rollup tables from every checked-out order, archived ones included."""
+    # Imported here: archive imports crud, which imports this module
+    from . import archive
+
+    db.execute(delete(models.SalesItemHourly))
+    db.execute(delete(models.SalesDemographicHourly))
+    lines = db.execute(
+        _order_lines_statement()
+        .where(models.Order.payment_method.is_not(None))
+        .execution_options(yield_per=1000)
+    )
+    item_rows, demographic_rows = _aggregate(chain(lines, archive.archived_lines(db)))
+    if item_rows:
+        db.execute(models.SalesItemHourly.__table__.insert(), item_rows)
+    if demographic_rows:
+        db.execute(models.SalesDemographicHourly.__table__.insert(), demographic_rows)
+    db.commit()
+    return len(item_rows), len(demographic_rows)
+
+
+def _filter(query, model, store_id: Optional[int], start: Optional[datetime], end: Optional[datetime]):
+    if store_id is not None:
+        query = query.filter(model.store_id == store_id)
+    if start is not None:
+        query = query.filter(model.hour >= hour_bucket(start))
+    if end is not None:
+        query = query.filter(model.hour < end)
+    return query
+
+
+def get_item_sales(db: Session, store_id: Optional[int] = None, start: Optional[datetime] = None, end: Optional[datetime] = None):
+    query = _filter(db.query(models.SalesItemHourly), models.SalesItemHourly, store_id, start, end)
+    return query.order_by(models.SalesItemHourly.hour, models.SalesItemHourly.store_id, models.SalesItemHourly.item_id).all()
+
+
+def get_demographic_sales(db: Session, store_id: Optional[int] = None, start: Optional[datetime] = None, end: Optional[datetime] = None):
+    query = _filter(db.query(models.SalesDemographicHourly), models.SalesDemographicHourly, store_id, start, end)
+    return query.order_by(
+        models.SalesDemographicHourly.hour,
+        models.SalesDemographicHourly.store_id,
+        models.SalesDemographicHourly.age_group,
+        models.SalesDemographicHourly.gender,
+    ).all()
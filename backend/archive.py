@@ -0,0 +1,290 @@
+"""Cold storage for old orders.
+
+archive_orders moves completed orders older than ARCHIVE_AFTER_DAYS out of
+orders, order_items and order_item_options into segment files under
+ARCHIVE_DIR, ARCHIVE_SEGMENT_ORDERS orders per file, so the live tables only
+hold recent and open orders. A segment is self-contained: it also snapshots
+the items and options its lines reference, so it renders the same after
+menu changes. It is LZMA-compressed JSON holding each table column by column
+({"orders": {"id": [...], "total": [...]}, ...}), which keeps similar values
+next to each other and compresses far better than row records.
+
+order_archive_segments catalogs the segments with their order id and
+created_at ranges, so a lookup only opens the segments that can hold the
+answer; decoded segments are kept in a small LRU cache. get_order and
+get_order_history read the live tables and then the archive, and analytics.rebuild
+includes archived lines, so callers don't need to know where an order lives.
+"""
+import json
+import lzma
+import os
+import uuid
+from bisect import bisect_left
+from collections import namedtuple
+from datetime import datetime, timedelta
+from functools import lru_cache
+from itertools import groupby
+from operator import itemgetter
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import DateTime, delete, select
+from sqlalchemy.orm import Session
+
+from . import analytics, crud, models, schemas, serialization
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", os.path.join(os.path.dirname(__file__), "archive"))
+ARCHIVE_AFTER_DAYS = float(os.getenv("ARCHIVE_AFTER_DAYS", 90))
+ARCHIVE_SEGMENT_ORDERS = int(os.getenv("ARCHIVE_SEGMENT_ORDERS", 5000))
+ARCHIVE_CACHE_SEGMENTS = int(os.getenv("ARCHIVE_CACHE_SEGMENTS", 8))
+SEGMENT_VERSION = 1
+
+# Segment tables; the last three snapshot what the archived lines reference
+TABLES = {
+    "orders": models.Order.__table__,
+    "order_items": models.OrderItem.__table__,
+    "order_item_options": models.OrderItemOption.__table__,
+    "items": models.Item.__table__,
+    "item_options": models.ItemOption.__table__,
+    "options": models.Option.__table__,
+}
+
+# What analytics aggregates, for archived lines
+ArchivedLine = namedtuple(
+    "ArchivedLine", ["order_id", "created_at", "age_group", "gender", "store_id", "item_id", "quantity", "line_total"]
+)
+
+
+def encode_segment(tables: Dict[str, List[dict]]) -> bytes:
+    columnar = {
+        name: {column.name: [row[column.name] for row in tables[name]] for column in table.columns}
+        for name, table in TABLES.items()
+    }
+    return lzma.compress(serialization.dumps({"version": SEGMENT_VERSION, "tables": columnar}))
+
+
+def decode_segment(data: bytes) -> Dict[str, List[dict]]:
+    payload = json.loads(lzma.decompress(data))
+    tables = {}
+    for name, table in TABLES.items():
+        columns = payload["tables"][name]
+        # Columns added to the model after the segment was written are simply absent
+        for column in table.columns:
+            if isinstance(column.type, DateTime) and column.name in columns:
+                columns[column.name] = [datetime.fromisoformat(v) if v is not None else None for v in columns[column.name]]
+        tables[name] = [dict(zip(columns, values)) for values in zip(*columns.values())]
+    return tables
+
+
+class Segment:
+    """A decoded segment, indexed for lookups by order id."""
+
+    def __init__(self, tables: Dict[str, List[dict]]):
+        self.orders = sorted(tables["orders"], key=itemgetter("id"))
+        self._order_ids = [order["id"] for order in self.orders]
+        self._lines = {
+            order_id: list(lines)
+            for order_id, lines in groupby(sorted(tables["order_items"], key=itemgetter("order_id", "id")), itemgetter("order_id"))
+        }
+        self._line_options = {}
+        for link in tables["order_item_options"]:
+            self._line_options.setdefault(link["order_item_id"], []).append(link["option_id"])
+        self._items = {item["id"]: item for item in tables["items"]}
+        self._options = {option["id"]: option for option in tables["options"]}
+        self._item_options = {}
+        for link in tables["item_options"]:
+            self._item_options.setdefault(link["item_id"], []).append(link["option_id"])
+
+    def order(self, order_id: int) -> Optional[dict]:
+        index = bisect_left(self._order_ids, order_id)
+        if index < len(self._order_ids) and self._order_ids[index] == order_id:
+            return self.orders[index]
+        return None
+
+    def lines(self, order_id: int) -> List[dict]:
+        return self._lines.get(order_id, [])
+
+    def item(self, item_id: int) -> dict:
+        return self._items.get(item_id, {})
+
+    def line_options(self, line_id: int) -> List[dict]:
+        return [self._options[o] for o in self._line_options.get(line_id, [])]
+
+    def render(self, order: dict) -> schemas.Order:
+        items = []
+        for line in self.lines(order["id"]):
+            item = self.item(line["item_id"])
+            items.append({
+                **line,
+                "item": {**item, "options": [self._options[o] for o in self._item_options.get(item.get("id"), [])]},
+                "options": self.line_options(line["id"]),
+            })
+        return schemas.Order.model_validate({**order, "items": items})
+
+
+def read_segment(path: str) -> Segment:
+    with open(path, "rb") as f:
+        return Segment(decode_segment(f.read()))
+
+
+@lru_cache(maxsize=ARCHIVE_CACHE_SEGMENTS)
+def load_segment(path: str) -> Segment:
+    # Segments are immutable, so a cached one never goes stale
+    return read_segment(path)
+
+
+def _segment_path(segment: models.OrderArchiveSegment, directory: Optional[str]) -> str:
+    return os.path.join(directory or ARCHIVE_DIR, segment.path)
+
+
+def _snapshot(db: Session, order_ids: List[int]) -> Dict[str, List[dict]]:
+    def rows(table, *where, order_by=()):
+        return [dict(row) for row in db.execute(select(table).where(*where).order_by(*order_by)).mappings()]
+
+    o, oi, oio = (TABLES[name].c for name in ("orders", "order_items", "order_item_options"))
+    i, io, op = (TABLES[name].c for name in ("items", "item_options", "options"))
+    tables = {"orders": rows(TABLES["orders"], o.id.in_(order_ids), order_by=[o.id])}
+    tables["order_items"] = rows(TABLES["order_items"], oi.order_id.in_(order_ids), order_by=[oi.order_id, oi.id])
+    line_ids = [line["id"] for line in tables["order_items"]]
+    tables["order_item_options"] = rows(TABLES["order_item_options"], oio.order_item_id.in_(line_ids))
+    item_ids = {line["item_id"] for line in tables["order_items"]}
+    tables["items"] = rows(TABLES["items"], i.id.in_(item_ids))
+    tables["item_options"] = rows(TABLES["item_options"], io.item_id.in_(item_ids))
+    option_ids = {link["option_id"] for name in ("order_item_options", "item_options") for link in tables[name]}
+    tables["options"] = rows(TABLES["options"], op.id.in_(option_ids))
+    return tables
+
+
+def archive_orders(db: Session, older_than: Optional[timedelta] = None, now: Optional[datetime] = None,
+                   segment_size: Optional[int] = None, directory: Optional[str] = None):
+    """Move completed orders created before now - older_than into new segments.
+
+    Each segment is written (to a temporary name, then renamed) before its
+    catalog row and the deletes commit, so a crash leaves at worst an
+    uncatalogued file behind, never a lost order. Returns (segments, orders).
+    """
+    directory = directory or ARCHIVE_DIR
+    os.makedirs(directory, exist_ok=True)
+    cutoff = (now or datetime.utcnow()) - (older_than if older_than is not None else timedelta(days=ARCHIVE_AFTER_DAYS))
+    segments = archived = 0
+    while True:
+        order_ids = db.scalars(
+            select(models.Order.id)
+            .where(models.Order.status == models.OrderStatus.COMPLETED, models.Order.created_at < cutoff)
+            .order_by(models.Order.id)
+            .limit(segment_size or ARCHIVE_SEGMENT_ORDERS)
+        ).all()
+        if not order_ids:
+            return segments, archived
+
+        tables = _snapshot(db, order_ids)
+        name = f"orders-{order_ids[0]}-{order_ids[-1]}-{uuid.uuid4().hex[:8]}.seg.xz"
+        path = os.path.join(directory, name)
+        with open(path + ".tmp", "wb") as f:
+            f.write(encode_segment(tables))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+
+        created = [order["created_at"] for order in tables["orders"]]
+        db.add(models.OrderArchiveSegment(
+            path=name, first_order_id=order_ids[0], last_order_id=order_ids[-1],
+            first_created_at=min(created), last_created_at=max(created),
+            order_count=len(order_ids), line_count=len(tables["order_items"]),
+        ))
+        line_ids = [line["id"] for line in tables["order_items"]]
+        db.execute(delete(models.OrderItemOption).where(models.OrderItemOption.order_item_id.in_(line_ids)))
+        db.execute(delete(models.OrderItem).where(models.OrderItem.order_id.in_(order_ids)))
+        db.execute(delete(models.Order).where(models.Order.id.in_(order_ids)))
+        db.commit()
+        segments += 1
+        archived += len(order_ids)
+
+
+# Reads
+
+def get_archived_order(db: Session, order_id: int, directory: Optional[str] = None) -> Optional[schemas.Order]:
+    segments = db.query(models.OrderArchiveSegment).filter(
+        models.OrderArchiveSegment.first_order_id <= order_id, models.OrderArchiveSegment.last_order_id >= order_id
+    )
+    for segment in segments:
+        loaded = load_segment(_segment_path(segment, directory))
+        order = loaded.order(order_id)
+        if order is not None:
+            return loaded.render(order)
+    return None
+
+
+def get_order(db: Session, order_id: int, directory: Optional[str] = None):
+    """crud.get_order, then the archive."""
+    return crud.get_order(db, order_id) or get_archived_order(db, order_id, directory)
+
+
+def _newest_first(order) -> tuple:
+    created_at = order["created_at"] if isinstance(order, dict) else order.created_at
+    order_id = order["id"] if isinstance(order, dict) else order.id
+    return created_at, order_id
+
+
+def get_order_history(db: Session, start: Optional[datetime] = None, end: Optional[datetime] = None,
+               store_id: Optional[int] = None, limit: int = 100, directory: Optional[str] = None) -> List[schemas.Order]:
+    """crud.get_order_history over live and archived orders alike: [start, end), newest first."""
+    live = [schemas.Order.model_validate(order) for order in crud.get_order_history(db, start, end, store_id, limit)]
+
+    segments = db.query(models.OrderArchiveSegment)
+    if start is not None:
+        segments = segments.filter(models.OrderArchiveSegment.last_created_at >= start)
+    if end is not None:
+        segments = segments.filter(models.OrderArchiveSegment.first_created_at < end)
+    archived = []
+    for segment in segments.order_by(models.OrderArchiveSegment.last_created_at.desc()):
+        if len(archived) >= limit and segment.last_created_at < archived[-1][0]["created_at"]:
+            break # This and every later segment only holds older orders
+        loaded = load_segment(_segment_path(segment, directory))
+        archived.extend(
+            (order, loaded) for order in loaded.orders
+            if (start is None or order["created_at"] >= start)
+            and (end is None or order["created_at"] < end)
+            and (store_id is None or order.get("store_id") == store_id)
+        )
+        archived.sort(key=lambda entry: _newest_first(entry[0]), reverse=True)
+        del archived[limit:]
+
+    merged = live + [loaded.render(order) for order, loaded in archived]
+    merged.sort(key=_newest_first, reverse=True)
+    return merged[:limit]
+
+
+def archived_orders(db: Session, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                    store_id: Optional[int] = None, directory: Optional[str] = None) -> Iterator[Tuple[Segment, List[dict]]]:
+    """(segment, its orders created in [start, end) oldest first) one segment at a time, for full scans."""
+    segments = db.query(models.OrderArchiveSegment)
+    if start is not None:
+        segments = segments.filter(models.OrderArchiveSegment.last_created_at >= start)
+    if end is not None:
+        segments = segments.filter(models.OrderArchiveSegment.first_created_at < end)
+    for segment in segments.order_by(models.OrderArchiveSegment.first_created_at, models.OrderArchiveSegment.id):
+        # Read past the cache so a scan doesn't evict the segments lookups keep hitting
+        loaded = read_segment(_segment_path(segment, directory))
+        orders = [
+            order for order in loaded.orders
+            if (start is None or order["created_at"] >= start)
+            and (end is None or order["created_at"] < end)
+            and (store_id is None or order.get("store_id") == store_id)
+        ]
+        orders.sort(key=itemgetter("created_at", "id"))
+        yield loaded, orders
+
+
+def archived_lines(db: Session, directory: Optional[str] = None) -> Iterator[ArchivedLine]:
+    """Lines of archived checked-out orders, shaped like analytics' order line rows."""
+    for loaded, orders in archived_orders(db, directory=directory):
+        for order in orders:
+            if order.get("payment_method") is None:
+                continue
+            for line in loaded.lines(order["id"]):
+                item = loaded.item(line["item_id"])
+                yield ArchivedLine(
+                    order["id"], order["created_at"], order.get("age_group"), order.get("gender"),
+                    order.get("store_id") or item.get("store_id") or analytics.UNASSIGNED_STORE,
+                    line["item_id"], line["quantity"], line.get("line_total") or 0,
+                )
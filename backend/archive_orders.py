@@ -0,0 +1,33 @@
+from backend.database import SessionLocal, engine
+from backend.models import Base
+from backend import archive, sharding
+
+# Create tables if they don't exist
+Base.metadata.create_all(bind=engine)
+
+def _archive_database(db, name):
+    try:
+        segments, orders = archive.archive_orders(db)
+        print(f"{name}: {segments} segments, {orders} orders")
+        return segments, orders
+    except Exception as e:
+        print(f"Error during archiving {name}: {e}")
+        db.rollback()
+        return 0, 0
+
+def archive_orders():
+    # Orders live on their store's shard when DATABASE_SHARD_URLS is set, so each shard is archived in turn
+    print(f"Archiving completed orders older than {archive.ARCHIVE_AFTER_DAYS:g} days to {archive.ARCHIVE_DIR}...")
+    if sharding.router is None:
+        with SessionLocal() as db:
+            results = [_archive_database(db, "primary")]
+    else:
+        with sharding.router.sessions() as sessions:
+            results = [_archive_database(db, f"shard-{index}") for index, db in enumerate(sessions)]
+    segments, orders = (sum(counts) for counts in zip(*results))
+    print(f"Segments written: {segments}")
+    print(f"Orders archived: {orders}")
+    return segments, orders
+
+if __name__ == "__main__":
+    archive_orders()
@@ -0,0 +1,99 @@
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import archive, auth, crud_async, pricing, schemas, sharding
+from .database import get_async_db, mark_client_write
+from .menu_cache import menu_cache
+from .principal_cache import principal_cache
+
+# Async versions of the hot kiosk endpoints. main.py registers this router ahead
+# of the sync routes when USE_ASYNC_DB is enabled, so these take precedence.
+router = APIRouter()
+
+def check_supported():
+    # These routes run on the primary's async engine only; sharded they would
+    # write orders to the primary while the sync order routes read the shards
+    if sharding.router is not None:
+        raise RuntimeError("USE_ASYNC_DB cannot be combined with DATABASE_SHARD_URLS: the async routes are not shard-aware")
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
+    # Same checks as main.get_current_user, with the store lookup on the async engine
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    claims = auth.decode_token(token)
+    if claims is None:
+        raise credentials_exception
+    code, store_id = claims
+    if auth.EMBED_STORE_ID_IN_TOKEN and store_id is not None:
+        principal_cache.record_token_hit()
+        return schemas.StorePrincipal(id=store_id, code=code)
+    user = await principal_cache.aget_or_load(code, lambda: crud_async.get_store_by_code(db, code))
+    if user is None:
+        raise credentials_exception
+    return user
+
+@router.post("/token", response_model=schemas.Token)
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    user = await crud_async.get_store_by_code(db, form_data.username)
+    try:
+        password_ok = user is not None and await auth.password_pool.verify(form_data.password, user.hashed_password)
+    except auth.PasswordPoolBusyError:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Login busy, retry shortly", headers={"Retry-After": "1"})
+    if not password_ok:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect username or password",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    access_token_expires = auth.timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
+    access_token = auth.create_access_token(
+        data=auth.store_token_claims(user), expires_delta=access_token_expires
+    )
+    return {"access_token": access_token, "token_type": "bearer"}
+
+@router.get("/items", response_model=List[schemas.Item])
+async def read_items(request: Request, skip: int = 0, limit: int = 100, category: Optional[str] = None, db: AsyncSession = Depends(get_async_db), current_user: schemas.StorePrincipal = Depends(get_current_user)):
+    snapshot = await menu_cache.aget(
+        (category, skip, limit),
+        lambda: crud_async.get_items(db, skip=skip, limit=limit, store_id=current_user.id, category=category),
+        store_id=current_user.id,
+    )
+    headers = {"ETag": snapshot.etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == snapshot.etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=snapshot.body, media_type="application/json", headers=headers)
+
+@router.post("/orders", response_model=schemas.Order, dependencies=[Depends(mark_client_write)])
+async def create_order(order: schemas.OrderCreate, db: AsyncSession = Depends(get_async_db)):
+    try:
+        return await crud_async.create_order(db=db, order=order)
+    except pricing.UnknownPriceError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/orders/{order_id}/items", response_model=schemas.Order, dependencies=[Depends(mark_client_write)])
+async def add_items(order_id: int, order_items: schemas.OrderAddItems, db: AsyncSession = Depends(get_async_db)):
+    try:
+        db_order = await crud_async.add_items_to_order(db=db, order_id=order_id, items=order_items.items)
+    except pricing.UnknownPriceError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if db_order is None:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return db_order
+
+@router.get("/orders/{order_id}", response_model=schemas.Order)
+async def read_order(order_id: int, db: AsyncSession = Depends(get_async_db)):
+    db_order = await crud_async.get_order(db, order_id=order_id)
+    if db_order is None:
+        # Archived orders are only in their segment files, as in main.read_order
+        db_order = await db.run_sync(archive.get_archived_order, order_id)
+    if db_order is None:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return db_order
@@ -1,7 +1,10 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from jose import JWTError, jwt
+import asyncio
 import bcrypt
+import threading
 
 import os
 from dotenv import load_dotenv
@@ -12,6 +15,11 @@ load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY", "supersecretkey")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 60 * 12))
+# Put the store id in issued tokens so get_current_user can skip the store lookup
+EMBED_STORE_ID_IN_TOKEN = os.getenv("EMBED_STORE_ID_IN_TOKEN", "false").lower() in ("1", "true", "yes")
+# bcrypt runs on its own bounded pool so a login storm can't starve request threads
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", 64))
 
 def verify_password(plain_password, hashed_password):
     if isinstance(hashed_password, str):
@@ -25,6 +33,22 @@ def get_password_hash(password):
         password = password.encode('utf-8')
     return bcrypt.hashpw(password, bcrypt.gensalt()).decode('utf-8')
 
+def store_token_claims(store) -> dict:
+    claims = {"sub": store.code}
+    if EMBED_STORE_ID_IN_TOKEN:
+        claims["sid"] = store.id
+    return claims
+
+def decode_token(token: str) -> Optional[Tuple[str, Optional[int]]]:
+    """(store code, store id claim or None) for a valid token, None otherwise."""
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    if payload.get("sub") is None:
+        return None
+    return payload["sub"], payload.get("sid")
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -34,3 +58,73 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
+
+class PasswordPoolBusyError(Exception):
+    pass
+
+class PasswordHashPool:
+    """Runs bcrypt on a dedicated, size-bounded thread pool.
+
+    bcrypt releases the GIL, so the worker threads hash in parallel while the
+    event loop keeps serving other requests. Submissions beyond max_queue
+    waiting jobs are rejected with PasswordPoolBusyError instead of piling up.
+    """
+
+    def __init__(self, max_workers: int = PASSWORD_HASH_WORKERS, max_queue: int = PASSWORD_HASH_MAX_QUEUE):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="password-hash")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._peak_queued = 0
+        self._completed = 0
+        self._rejected = 0
+
+    async def run(self, fn, *args):
+        with self._lock:
+            if self._queued + self._running >= self.max_workers + self.max_queue:
+                self._rejected += 1
+                raise PasswordPoolBusyError("Password hashing pool is saturated")
+            self._queued += 1
+            self._peak_queued = max(self._peak_queued, self._queued)
+        future = self._executor.submit(self._track, fn, args)
+        future.add_done_callback(self._on_done)
+        return await asyncio.wrap_future(future)
+
+    def _on_done(self, future):
+        # A job cancelled before it started never reached _track
+        if future.cancelled():
+            with self._lock:
+                self._queued -= 1
+
+    def _track(self, fn, args):
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+
+    async def verify(self, plain_password, hashed_password) -> bool:
+        return await self.run(verify_password, plain_password, hashed_password)
+
+    async def hash(self, password) -> str:
+        return await self.run(get_password_hash, password)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "queued": self._queued,
+                "running": self._running,
+                "peak_queued": self._peak_queued,
+                "completed": self._completed,
+                "rejected": self._rejected,
+            }
+
+password_pool = PasswordHashPool()
@@ -0,0 +1,76 @@
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from backend.database import create_db_engine
+from backend import models
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(samples):
+    """Return mean/p50/p95/p99 in milliseconds for a list of durations in seconds."""
+    ms = [s * 1000 for s in samples]
+    return {
+        "count": len(ms),
+        "mean_ms": round(sum(ms) / len(ms), 3) if ms else 0.0,
+        "p50_ms": round(percentile(ms, 50), 3),
+        "p95_ms": round(percentile(ms, 95), 3),
+        "p99_ms": round(percentile(ms, 99), 3),
+    }
+
+
+@contextmanager
+def temp_sqlite_engine(profile=None, **engine_kwargs):
+    """File-backed SQLite database so commits pay the real fsync cost.
+
+    profile selects a database.py engine profile; without one the engine is
+    built from engine_kwargs alone.
+    """
+    tmpdir = tempfile.mkdtemp(prefix="bench_")
+    path = os.path.join(tmpdir, "bench.db")
+    if profile is not None:
+        engine = create_db_engine(f"sqlite:///{path}", profile, **engine_kwargs)
+    else:
+        engine_kwargs.setdefault("connect_args", {"check_same_thread": False})
+        engine = create_engine(f"sqlite:///{path}", **engine_kwargs)
+    models.Base.metadata.create_all(bind=engine)
+    try:
+        yield engine
+    finally:
+        engine.dispose()
+        for suffix in ("", "-wal", "-shm", "-journal"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        os.rmdir(tmpdir)
+
+
+class CommitCounter:
+    """Counts COMMITs issued on an engine."""
+
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, "commit", self._on_commit)
+
+    def _on_commit(self, conn):
+        self.count += 1
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def make_session_factory(engine):
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -0,0 +1,89 @@
+"""Commits per order and latency of crud.create_order.
+
+Compares the current single-transaction implementation with the previous
+commit-per-line version on a file-backed SQLite database.
+
+    python -m backend.benchmarks.create_order --orders 500 --lines 5
+"""
+import argparse
+import json
+
+from backend import crud, models, schemas
+from backend.benchmarks import CommitCounter, make_session_factory, summarize, temp_sqlite_engine, timed
+
+
+def legacy_create_order(db, order: schemas.OrderCreate):
+    # Previous implementation: one commit + refresh for the order and every line
+    db_order = models.Order(
+        status=models.OrderStatus.PENDING,
+        age_group=order.age_group,
+        gender=order.gender
+    )
+    db.add(db_order)
+    db.commit()
+    db.refresh(db_order)
+
+    for item in order.items:
+        db_order_item = models.OrderItem(order_id=db_order.id, item_id=item.item_id, quantity=item.quantity)
+        db.add(db_order_item)
+        db.commit()
+        db.refresh(db_order_item)
+        for option_id in item.option_ids:
+            db.add(models.OrderItemOption(order_item_id=db_order_item.id, option_id=option_id))
+
+    db.commit()
+    db.refresh(db_order)
+    return db_order
+
+
+def seed(db, lines):
+    store = models.Store(name="bench", code="bench", hashed_password="x")
+    db.add(store)
+    db.flush()
+    items = [models.Item(name=f"item{i}", price=500, stock=10**9, store_id=store.id) for i in range(lines)]
+    options = [models.Option(name=f"opt{i}", price_adjustment=100) for i in range(2)]
+    db.add_all(items + options)
+    db.commit()
+    return [i.id for i in items], [o.id for o in options]
+
+
+def run(create_fn, orders, lines):
+    with temp_sqlite_engine() as engine:
+        SessionLocal = make_session_factory(engine)
+        with SessionLocal() as db:
+            item_ids, option_ids = seed(db, lines)
+        payload = schemas.OrderCreate(
+            items=[schemas.OrderItemCreate(item_id=i, quantity=1, option_ids=option_ids) for i in item_ids],
+            age_group="30s",
+            gender="male",
+        )
+
+        counter = CommitCounter(engine)
+        samples = []
+        for _ in range(orders):
+            with SessionLocal() as db:
+                _, elapsed = timed(create_fn, db, payload)
+            samples.append(elapsed)
+
+        result = summarize(samples)
+        result["commits_per_order"] = round(counter.count / orders, 2)
+        return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=200)
+    parser.add_argument("--lines", type=int, default=5)
+    args = parser.parse_args()
+
+    report = {
+        "orders": args.orders,
+        "lines": args.lines,
+        "legacy": run(legacy_create_order, args.orders, args.lines),
+        "current": run(crud.create_order, args.orders, args.lines),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""Lunch-peak load test: many kiosks replaying the useOrderSession.ts flow.
+
+Each kiosk logs in once (POST /token), then runs ordering sessions back to
+back: GET /items, POST /orders, sometimes POST /orders/{id}/items, polls
+GET /orders/{id}, POST /orders/{id}/checkout, and polls once more for the
+final status. Think times between steps are exponentially distributed.
+
+In-process (default) the app runs on a fresh, seeded temporary SQLite file
+built with --profile. With --url the kiosks hit a running server instead,
+which must already have the --store-code store and a menu:
+
+    python -m backend.benchmarks.lunch_peak --kiosks 50 --sessions 5 --think 0.2
+    uvicorn backend.main:app & python -m backend.benchmarks.lunch_peak --url http://127.0.0.1:8000
+
+The JSON report (stdout, or --output) holds per-endpoint throughput, error
+counts and latency percentiles, plus the git commit, for comparing runs.
+"""
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+import httpx
+
+from backend import auth, models
+from backend.benchmarks import make_session_factory, summarize, temp_sqlite_engine
+from backend.database import DB_PROFILES, recent_writes
+
+STORE_CODE = "loadtest"
+STORE_PASSWORD = "loadtest"
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    async def call(self, client, endpoint, method, url, **kwargs):
+        # endpoint is the route template, so every order id lands in one bucket
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.errors[endpoint] += 1
+            return None
+        self.samples[endpoint].append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            self.errors[endpoint] += 1
+            return None
+        return response
+
+    def report(self, elapsed):
+        endpoints = {}
+        for endpoint in sorted(set(self.samples) | set(self.errors)):
+            samples = self.samples[endpoint]
+            endpoints[endpoint] = {
+                "requests_per_s": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+                "errors": self.errors[endpoint],
+                **summarize(samples),
+            }
+        return endpoints
+
+
+async def think(rng, mean):
+    if mean > 0:
+        await asyncio.sleep(rng.expovariate(1 / mean))
+
+
+async def kiosk(client, recorder, rng, args, completed):
+    token = None
+    for attempt in range(3):
+        response = await recorder.call(
+            client, "POST /token", "POST", "/token",
+            data={"username": args.store_code, "password": args.password},
+        )
+        if response is not None:
+            token = response.json()["access_token"]
+            break
+        await asyncio.sleep(0.1 * (attempt + 1)) # The hashing pool sheds load with 503s
+    if token is None:
+        return
+    client.headers["Authorization"] = f"Bearer {token}"
+
+    etag = None
+    menu = []
+    for _ in range(args.sessions):
+        # The browser revalidates the cached menu with If-None-Match
+        headers = {"If-None-Match": etag} if etag else {}
+        response = await recorder.call(client, "GET /items", "GET", "/items", headers=headers)
+        if response is not None and response.status_code == 200:
+            menu = [item for item in response.json() if item["stock"] > 0]
+            etag = response.headers.get("ETag")
+        if not menu:
+            continue
+        await think(rng, args.think)
+
+        def cart():
+            return [
+                {
+                    "item_id": item["id"],
+                    "quantity": rng.randint(1, 2),
+                    "option_ids": [option["id"] for option in item["options"][:rng.randint(0, 1)]],
+                }
+                for item in rng.sample(menu, min(len(menu), rng.randint(1, 3)))
+            ]
+
+        response = await recorder.call(
+            client, "POST /orders", "POST", "/orders",
+            json={"items": cart(), "age_group": rng.choice(["20s", "30s", "40s"]), "gender": rng.choice(["male", "female"])},
+        )
+        if response is None:
+            continue
+        order_id = response.json()["id"]
+        await think(rng, args.think)
+
+        if rng.random() < args.add_items_ratio:
+            await recorder.call(client, "POST /orders/{id}/items", "POST", f"/orders/{order_id}/items", json={"items": cart()})
+            await think(rng, args.think)
+
+        for _ in range(args.polls):
+            await recorder.call(client, "GET /orders/{id}", "GET", f"/orders/{order_id}")
+            await think(rng, args.think)
+
+        response = await recorder.call(
+            client, "POST /orders/{id}/checkout", "POST", f"/orders/{order_id}/checkout",
+            json={"payment_method": rng.choice(["CARD", "CASH"])},
+        )
+        await recorder.call(client, "GET /orders/{id}", "GET", f"/orders/{order_id}")
+        if response is not None:
+            completed.append(order_id)
+        await think(rng, args.think)
+
+
+def seed(db, items):
+    store = models.Store(name=STORE_CODE, code=STORE_CODE, hashed_password=auth.get_password_hash(STORE_PASSWORD))
+    db.add(store)
+    db.flush()
+    options = [models.Option(name=f"option{i}", price_adjustment=100 * i) for i in range(3)]
+    menu = [
+        models.Item(name=f"item{i}", price=500 + 50 * i, stock=10**9, category=f"category{i % 4}", store_id=store.id)
+        for i in range(items)
+    ]
+    db.add_all(options + menu)
+    db.flush()
+    db.add_all(models.ItemOption(item_id=item.id, option_id=option.id) for item in menu for option in options)
+    db.commit()
+
+
+@contextmanager
+def in_process_app(profile, items):
+    # Imported here so --url runs never build the app's own engine
+    from backend.main import app, get_db, get_read_db
+    from backend.menu_cache import menu_cache
+    from backend.pricing import price_table
+    from backend.principal_cache import principal_cache
+
+    with temp_sqlite_engine(profile=profile) as engine:
+        SessionLocal = make_session_factory(engine)
+        with SessionLocal() as db:
+            seed(db, items)
+
+        def override_get_db():
+            with SessionLocal() as db:
+                yield db
+
+        app.dependency_overrides[get_db] = override_get_db
+        app.dependency_overrides[get_read_db] = override_get_db
+        for cache in (menu_cache, price_table):
+            cache.invalidate()
+        principal_cache.clear()
+        recent_writes.clear()
+        try:
+            yield app
+        finally:
+            app.dependency_overrides.clear()
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args, transport=None):
+    recorder = Recorder()
+    completed = []
+    limits = httpx.Limits(max_connections=args.kiosks)
+    start = time.perf_counter()
+    clients = [
+        httpx.AsyncClient(base_url=args.url or "http://kiosk", transport=transport, limits=limits, timeout=args.timeout)
+        for _ in range(args.kiosks)
+    ]
+    try:
+        await asyncio.gather(*(
+            kiosk(client, recorder, random.Random(args.seed + index), args, completed)
+            for index, client in enumerate(clients)
+        ))
+    finally:
+        for client in clients:
+            await client.aclose()
+    elapsed = time.perf_counter() - start
+
+    total_requests = sum(len(samples) for samples in recorder.samples.values())
+    return {
+        "commit": git_commit(),
+        "target": args.url or f"in-process ({args.profile} profile)",
+        "config": {
+            "kiosks": args.kiosks, "sessions": args.sessions, "think_s": args.think,
+            "polls": args.polls, "add_items_ratio": args.add_items_ratio, "seed": args.seed,
+        },
+        "elapsed_s": round(elapsed, 3),
+        "paid_orders": len(completed),
+        "paid_orders_per_s": round(len(completed) / elapsed, 2) if elapsed else 0.0,
+        "requests_per_s": round(total_requests / elapsed, 2) if elapsed else 0.0,
+        "endpoints": recorder.report(elapsed),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="base URL of a running server; in-process when omitted")
+    parser.add_argument("--kiosks", type=int, default=20, help="concurrent kiosks")
+    parser.add_argument("--sessions", type=int, default=5, help="ordering sessions per kiosk")
+    parser.add_argument("--think", type=float, default=0.1, help="mean think time between steps, seconds")
+    parser.add_argument("--polls", type=int, default=2, help="status polls before checkout")
+    parser.add_argument("--add-items-ratio", type=float, default=0.3, help="share of sessions that add items")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--profile", default="production", choices=DB_PROFILES, help="in-process database profile")
+    parser.add_argument("--items", type=int, default=20, help="menu size for the in-process database")
+    parser.add_argument("--store-code", default=STORE_CODE)
+    parser.add_argument("--password", default=STORE_PASSWORD)
+    parser.add_argument("--output", help="write the JSON report to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.url:
+        report = asyncio.run(run(args))
+    else:
+        with in_process_app(args.profile, args.items) as app:
+            report = asyncio.run(run(args, transport=httpx.ASGITransport(app=app)))
+
+    body = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(body + "\n")
+    print(body)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Cost of encoding a GET /orders page: response_model path vs serialization.py.
+
+    python -m backend.benchmarks.serialization --orders 100 --lines 5
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from typing import List
+
+from pydantic import TypeAdapter
+
+from backend import crud, models, schemas, serialization
+from backend.benchmarks import make_session_factory, temp_sqlite_engine
+
+orders_adapter = TypeAdapter(List[schemas.Order])
+
+
+def response_model_path(orders) -> bytes:
+    # What FastAPI does for response_model=List[schemas.Order]: validate, dump, JSONResponse
+    validated = orders_adapter.validate_python(orders, from_attributes=True)
+    content = orders_adapter.dump_python(validated, mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def fast_path(orders) -> bytes:
+    return serialization.render_orders(orders)
+
+
+def seed(db, orders, lines):
+    store = models.Store(name="bench", code="bench", hashed_password="x")
+    db.add(store)
+    db.flush()
+    options = [models.Option(name=f"opt{i}", price_adjustment=100) for i in range(2)]
+    items = [models.Item(name=f"item{i}", price=500, stock=10**9, store_id=store.id, category="bench") for i in range(lines)]
+    db.add_all(options + items)
+    db.flush()
+    db.add_all(models.ItemOption(item_id=i.id, option_id=o.id) for i in items for o in options)
+    db.commit()
+    payload = schemas.OrderCreate(items=[
+        schemas.OrderItemCreate(item_id=i.id, quantity=1, option_ids=[o.id for o in options]) for i in items
+    ])
+    for _ in range(orders):
+        crud.create_order(db, payload)
+
+
+def measure(fn, orders, repeat):
+    fn(orders) # warm-up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        body = fn(orders)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    fn(orders)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "us_per_order": round(elapsed / repeat / len(orders) * 1e6, 2),
+        "peak_kib": round(peak / 1024, 1),
+        "body_bytes": len(body),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=100)
+    parser.add_argument("--lines", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    with temp_sqlite_engine() as engine:
+        SessionLocal = make_session_factory(engine)
+        with SessionLocal() as db:
+            seed(db, args.orders, args.lines)
+        with SessionLocal() as db:
+            orders = crud.get_orders(db, limit=args.orders)
+            # Touch every relationship so neither path pays for lazy loads
+            serialization.render_orders(orders)
+            report = {
+                "orders": len(orders),
+                "lines": args.lines,
+                "encoder": "orjson" if serialization.orjson is not None else "json",
+                "response_model": measure(response_model_path, orders, args.repeat),
+                "fast_path": measure(fast_path, orders, args.repeat),
+            }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
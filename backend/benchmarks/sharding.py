@@ -0,0 +1,78 @@
+"""Write throughput of concurrent stores on 1 vs N SQLite shards.
+
+Each writer process is one store (like one API worker per store) creating and
+checking out orders on its store's shard. With one shard every writer queues
+on the same database lock; with N shards only stores mapped to the same shard
+contend.
+
+    python -m backend.benchmarks.sharding --shards 4 --stores 8 --orders 100
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from multiprocessing import Pool
+
+from backend import crud, models, schemas, sharding
+from backend.benchmarks import summarize
+
+
+def writer(urls, item_id, orders):
+    router = sharding.ShardRouter.from_urls(urls)
+    payload = schemas.OrderCreate(items=[schemas.OrderItemCreate(item_id=item_id, quantity=1)])
+    samples = []
+    for _ in range(orders):
+        start = time.perf_counter()
+        with router.session_for_items([item_id]) as db:
+            order = crud.create_order(db, payload)
+            crud.checkout_order(db, order.id, "CARD")
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def run(shards, stores, orders):
+    directory = tempfile.mkdtemp(prefix="bench_shards_")
+    urls = [f"sqlite:///{os.path.join(directory, f'shard{i}.db')}" for i in range(shards)]
+    router = sharding.ShardRouter.from_urls(urls)
+    try:
+        router.create_all()
+        item_ids = {}
+        for store_id in range(1, stores + 1):
+            with router.session_for_store(store_id) as db:
+                item = models.Item(name=f"item{store_id}", price=500, stock=10**9, store_id=store_id)
+                db.add(item)
+                db.commit()
+                item_ids[store_id] = item.id
+
+        start = time.perf_counter()
+        with Pool(len(item_ids)) as pool:
+            results = pool.starmap(writer, [(urls, item_id, orders) for item_id in item_ids.values()])
+        elapsed = time.perf_counter() - start
+        latencies = [sample for samples in results for sample in samples]
+        return {"orders_per_s": round(len(latencies) / elapsed, 1), **summarize(latencies)}
+    finally:
+        for engine in router.engines:
+            engine.dispose()
+        shutil.rmtree(directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--stores", type=int, default=8)
+    parser.add_argument("--orders", type=int, default=100, help="orders per store")
+    args = parser.parse_args()
+
+    report = {
+        "stores": args.stores,
+        "orders_per_store": args.orders,
+        "single": run(1, args.stores, args.orders),
+        f"sharded_{args.shards}": run(args.shards, args.stores, args.orders),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
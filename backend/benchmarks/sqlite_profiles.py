@@ -0,0 +1,109 @@
+"""Concurrent kiosk writers against POST /orders and /checkout, per engine profile.
+
+Every writer thread drives the real FastAPI app (TestClient) through
+create order -> checkout on a file-backed SQLite database built with one of
+the database.py profiles. Reports throughput, latency per endpoint and how
+many requests failed, which with SQLite means "database is locked".
+
+    python -m backend.benchmarks.sqlite_profiles --writers 8 --orders 50
+"""
+import argparse
+import json
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+from backend import models
+from backend.benchmarks import make_session_factory, summarize, temp_sqlite_engine
+from backend.database import DB_PROFILES, recent_writes
+from backend.main import app, get_db, get_read_db
+from backend.menu_cache import menu_cache
+from backend.pricing import price_table
+
+
+def seed(db):
+    items = [models.Item(name=f"item{i}", price=500, stock=10**9, category="bench") for i in range(3)]
+    db.add_all(items)
+    db.commit()
+    return [item.id for item in items]
+
+
+def writer(item_ids, orders, results, lock):
+    client = TestClient(app, raise_server_exceptions=False)
+    samples = {"create_order": [], "checkout": []}
+    errors = {"create_order": 0, "checkout": 0}
+    payload = {"items": [{"item_id": item_id, "quantity": 1} for item_id in item_ids]}
+    for _ in range(orders):
+        start = time.perf_counter()
+        response = client.post("/orders", json=payload)
+        samples["create_order"].append(time.perf_counter() - start)
+        if response.status_code != 200:
+            errors["create_order"] += 1
+            continue
+        start = time.perf_counter()
+        response = client.post(f"/orders/{response.json()['id']}/checkout", json={"payment_method": "CARD"})
+        samples["checkout"].append(time.perf_counter() - start)
+        if response.status_code != 200:
+            errors["checkout"] += 1
+    with lock:
+        for endpoint in samples:
+            results["samples"][endpoint].extend(samples[endpoint])
+            results["errors"][endpoint] += errors[endpoint]
+
+
+def run(profile, writers, orders):
+    with temp_sqlite_engine(profile=profile) as engine:
+        SessionLocal = make_session_factory(engine)
+        with SessionLocal() as db:
+            item_ids = seed(db)
+
+        def override_get_db():
+            with SessionLocal() as db:
+                yield db
+
+        app.dependency_overrides[get_db] = override_get_db
+        app.dependency_overrides[get_read_db] = override_get_db
+        menu_cache.invalidate()
+        price_table.invalidate()
+        recent_writes.clear()
+        results = {
+            "samples": {"create_order": [], "checkout": []},
+            "errors": {"create_order": 0, "checkout": 0},
+        }
+        lock = threading.Lock()
+        threads = [threading.Thread(target=writer, args=(item_ids, orders, results, lock)) for _ in range(writers)]
+        try:
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+        finally:
+            app.dependency_overrides.clear()
+
+        with SessionLocal() as db:
+            paid = db.query(models.Order).filter(models.Order.payment_method.is_not(None)).count()
+    return {
+        "paid_orders_per_s": round(paid / elapsed, 1),
+        "lock_errors": results["errors"],
+        **{endpoint: summarize(samples) for endpoint, samples in results["samples"].items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--orders", type=int, default=50, help="orders per writer")
+    parser.add_argument("--profiles", nargs="+", default=list(DB_PROFILES), choices=DB_PROFILES)
+    args = parser.parse_args()
+
+    report = {"writers": args.writers, "orders_per_writer": args.orders}
+    for profile in args.profiles:
+        report[profile] = run(profile, args.writers, args.orders)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
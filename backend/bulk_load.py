@@ -0,0 +1,80 @@
+"""Set-based loading for seed scripts and fixtures.
+
+Instead of a lookup per row, the keys already in the table are read once,
+new rows are deduplicated in memory and inserted with executemany in
+batches of BULK_LOAD_BATCH_SIZE. Where the table has a unique key the
+insert is also ON CONFLICT DO NOTHING, so a concurrent loader can't make it
+fail.
+"""
+import os
+from typing import Dict, Iterable, List, Sequence
+
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+BULK_LOAD_BATCH_SIZE = int(os.getenv("BULK_LOAD_BATCH_SIZE", 5000))
+
+
+def _key(row: dict, key_columns: Sequence[str]) -> tuple:
+    return tuple(row[column] for column in key_columns)
+
+
+def existing_keys(db: Session, model, key_columns: Sequence[str]) -> set:
+    columns = [getattr(model, column) for column in key_columns]
+    return set(db.execute(select(*columns)).tuples())
+
+
+def key_map(db: Session, model, key_columns: Sequence[str], value_column: str = "id") -> Dict[tuple, object]:
+    """{key: id} for every row, e.g. to resolve parent ids before loading children."""
+    columns = [getattr(model, column) for column in key_columns]
+    return {tuple(row[:-1]): row[-1] for row in db.execute(select(*columns, getattr(model, value_column)))}
+
+
+def insert_statement(db: Session, model, conflict_columns: Sequence[str] = None):
+    """INSERT for executemany; ON CONFLICT DO NOTHING on conflict_columns when given."""
+    dialect = db.get_bind().dialect.name
+    if conflict_columns and dialect in ("sqlite", "postgresql"):
+        dialect_insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        return dialect_insert(model).on_conflict_do_nothing(index_elements=list(conflict_columns))
+    return model.__table__.insert()
+
+
+def upsert_statement(db: Session, model, conflict_columns: Sequence[str], update_columns: Sequence[str]):
+    """INSERT ... ON CONFLICT (conflict_columns) DO UPDATE SET update_columns, for executemany."""
+    dialect_insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+    stmt = dialect_insert(model)
+    return stmt.on_conflict_do_update(
+        index_elements=list(conflict_columns),
+        set_={column: stmt.excluded[column] for column in update_columns},
+    )
+
+
+def load_missing(
+    db: Session, model, rows: Iterable[dict], key_columns: Sequence[str],
+    conflict_columns: Sequence[str] = None, batch_size: int = None,
+) -> int:
+    """Insert the rows whose key_columns aren't in the table yet; returns how many.
+
+    Rows repeating a key keep the first occurrence. conflict_columns names a
+    unique key of the table to skip on conflict as well. Doesn't commit.
+    """
+    seen = existing_keys(db, model, key_columns)
+    missing: List[dict] = []
+    for row in rows:
+        key = _key(row, key_columns)
+        if key not in seen:
+            seen.add(key)
+            missing.append(row)
+    insert_rows(db, model, missing, conflict_columns=conflict_columns, batch_size=batch_size)
+    return len(missing)
+
+
+def insert_rows(db: Session, model, rows: List[dict], conflict_columns: Sequence[str] = None, batch_size: int = None):
+    batch_size = batch_size or BULK_LOAD_BATCH_SIZE
+    if not rows:
+        return
+    stmt = insert_statement(db, model, conflict_columns)
+    for start in range(0, len(rows), batch_size):
+        db.execute(stmt, rows[start:start + batch_size])
+
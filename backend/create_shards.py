@@ -0,0 +1,19 @@
+from backend import sharding
+from backend.database import SessionLocal
+
+# Creates the schema on every DATABASE_SHARD_URLS shard, gives each shard its id
+# range and copies stores/options from the primary. Safe to re-run after adding
+# stores or options.
+def create_shards():
+    router = sharding.router
+    if router is None:
+        print("DATABASE_SHARD_URLS is not set. Nothing to do.")
+        return
+    router.create_all()
+    print(f"Schema ready on {len(router)} shards.")
+    with SessionLocal() as db:
+        router.copy_reference_data(db)
+    print("Stores and options copied to every shard.")
+
+if __name__ == "__main__":
+    create_shards()
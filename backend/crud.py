@@ -1,14 +1,42 @@
-from typing import List
-from . import models, schemas, auth
-from sqlalchemy.orm import Session, joinedload
+from datetime import datetime
+from typing import Dict, List, Optional
+from . import models, schemas, auth, events, analytics, pricing
+from .database import recent_writes
+from .menu_cache import menu_cache
+from .pagination import Cursor
+from sqlalchemy import and_, case, delete, func, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, joinedload, selectinload
 
-def get_items(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Item).options(joinedload(models.Item.options)).offset(skip).limit(limit).all()
+def get_items(db: Session, skip: int = 0, limit: int = 100, store_id: Optional[int] = None, category: Optional[str] = None):
+    # store_id: one store's menu (ix_items_store_id_category_id) instead of the whole chain's
+    query = db.query(models.Item).options(joinedload(models.Item.options))
+    if store_id is not None:
+        query = query.filter(models.Item.store_id == store_id)
+    if category is not None:
+        query = query.filter(models.Item.category == category)
+    return query.order_by(models.Item.id).offset(skip).limit(limit).all()
+
+class DuplicateItemError(Exception):
+    def __init__(self, name: str):
+        self.name = name
+        super().__init__(f"The menu already has an item named {name}")
+
+def _commit_item(db: Session, name: str):
+    # uq_items_store_id_name: one item per name on a store's menu
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise DuplicateItemError(name)
 
 def create_item(db: Session, item: schemas.ItemCreate, store_id: int):
     db_item = models.Item(**item.dict(), store_id=store_id)
     db.add(db_item)
-    db.commit()
+    _commit_item(db, item.name)
+    menu_cache.invalidate([store_id])
+    pricing.price_table.invalidate()
+    recent_writes.mark("menu") # Reload the menu from the primary, not a lagging replica
     db.refresh(db_item)
     return db_item
 
@@ -18,10 +46,109 @@ def update_item(db: Session, item_id: int, item: schemas.ItemCreate):
         return None
     for key, value in item.dict().items():
         setattr(db_item, key, value)
-    db.commit()
+    _commit_item(db, item.name)
+    menu_cache.invalidate([db_item.store_id])
+    pricing.price_table.invalidate()
+    recent_writes.mark("menu") # Reload the menu from the primary, not a lagging replica
     db.refresh(db_item)
     return db_item
 
+def import_menu_rows(db: Session, rows, default_store_id: int):
+    """Upsert a batch of (line number, MenuImportRow) with a fixed number of statements.
+
+    Rows may only name the importing store. Commits the batch but leaves cache
+    invalidation to the caller, once per import. Returns (created, updated,
+    [(line, error)]).
+    """
+    for attempt in range(2):
+        try:
+            return _import_menu_rows(db, rows, default_store_id)
+        except IntegrityError:
+            # A concurrent write created one of the batch's new items first (uq_items_store_id_name);
+            # the retry sees it and updates it instead
+            db.rollback()
+    return 0, 0, [(line, f"Item {row.name} was changed concurrently, import it again") for line, row in rows]
+
+def _import_menu_rows(db: Session, rows, default_store_id: int):
+    errors = []
+    codes = {row.store_code for _, row in rows if row.store_code is not None}
+    store_ids = dict(db.query(models.Store.code, models.Store.id).filter(models.Store.code.in_(codes)).all()) if codes else {}
+    option_names = {name for _, row in rows for name in row.options or ()}
+    option_ids = dict(
+        db.query(models.Option.name, func.min(models.Option.id))
+        .filter(models.Option.name.in_(option_names))
+        .group_by(models.Option.name)
+        .all()
+    ) if option_names else {}
+
+    # Later rows for the same item win field by field; null fields are left alone
+    merged = {}
+    for line, row in rows:
+        store_id = default_store_id if row.store_code is None else store_ids.get(row.store_code)
+        if store_id is None:
+            errors.append((line, f"Unknown store {row.store_code}"))
+            continue
+        if store_id != default_store_id:
+            errors.append((line, f"Cannot import items for another store ({row.store_code})"))
+            continue
+        unknown_options = sorted(set(row.options or ()) - option_ids.keys())
+        if unknown_options:
+            errors.append((line, f"Unknown options {unknown_options}"))
+            continue
+        fields = row.model_dump(exclude_none=True, exclude={"name", "store_code"})
+        entry = merged.setdefault((store_id, row.name), {"line": line, "fields": {}})
+        entry["fields"].update(fields)
+
+    existing = {}
+    if merged:
+        for item_id, store_id, name in (
+            db.query(models.Item.id, models.Item.store_id, models.Item.name)
+            .filter(
+                models.Item.store_id.in_({store_id for store_id, _ in merged}),
+                models.Item.name.in_({name for _, name in merged}),
+            )
+        ):
+            existing[(store_id, name)] = item_id
+
+    new_rows, updates = [], {}
+    for (store_id, name), entry in merged.items():
+        fields = entry["fields"]
+        columns = {key: value for key, value in fields.items() if key != "options"}
+        if (store_id, name) in existing:
+            if columns:
+                # Grouped by the columns they set, so each group is one executemany
+                updates.setdefault(frozenset(columns), []).append({"id": existing[(store_id, name)], **columns})
+        elif fields.get("price") is None:
+            errors.append((entry["line"], f"New item {name} needs a price"))
+        else:
+            new_rows.append({
+                "store_id": store_id, "name": name, "price": fields["price"],
+                "category": fields.get("category"), "image_url": fields.get("image_url"),
+                "stock": 10 if fields.get("stock") is None else fields["stock"],
+            })
+
+    item_ids = dict(existing)
+    if new_rows:
+        item_ids.update(_insert_returning_keys(db, models.Item, new_rows, ["store_id", "name"]))
+    for group in updates.values():
+        db.execute(update(models.Item), group)
+
+    relinked = {
+        item_ids[key]: entry["fields"]["options"] for key, entry in merged.items()
+        if "options" in entry["fields"] and key in item_ids
+    }
+    if relinked:
+        db.execute(delete(models.ItemOption).where(models.ItemOption.item_id.in_(relinked)))
+        links = [
+            {"item_id": item_id, "option_id": option_ids[name]}
+            for item_id, names in relinked.items()
+            for name in dict.fromkeys(names)
+        ]
+        if links:
+            db.execute(insert(models.ItemOption), links)
+    db.commit()
+    return len(new_rows), sum(key in existing for key in merged), errors
+
 def get_store_by_name(db: Session, name: str):
     return db.query(models.Store).filter(models.Store.name == name).first()
 
@@ -36,59 +163,274 @@ def create_store(db: Session, store: schemas.StoreCreate):
     db.refresh(db_store)
     return db_store
 
+def _order_line_rows(order_id: int, items: List[schemas.OrderItemCreate], prices):
+    return [
+        {
+            "order_id": order_id, "item_id": item.item_id, "quantity": item.quantity,
+            "unit_price": unit_price, "line_total": line_total,
+        }
+        for item, (unit_price, line_total) in zip(items, prices)
+    ]
+
+def _option_links(line_ids, items: List[schemas.OrderItemCreate]):
+    return [
+        {"order_item_id": line_id, "option_id": option_id}
+        for line_id, item in zip(line_ids, items)
+        for option_id in item.option_ids
+    ]
+
+def _line_ids_statement(order_ids):
+    return (
+        select(models.OrderItem.order_id, models.OrderItem.id)
+        .where(models.OrderItem.order_id.in_(set(order_ids)))
+        .order_by(models.OrderItem.id)
+    )
+
+def _new_line_ids(line_rows, found) -> List[int]:
+    # Ids for line_rows, just inserted in one executemany, from _line_ids_statement in
+    # the same transaction. Ids ascend in insert order and the order row is locked by
+    # whoever adds lines to it, so an order's last n lines are its n new ones: matched
+    # up without RETURNING, whose row order no backend promises
+    by_order = {}
+    for order_id, line_id in found:
+        by_order.setdefault(order_id, []).append(line_id)
+    counts = {}
+    for row in line_rows:
+        counts[row["order_id"]] = counts.get(row["order_id"], 0) + 1
+    new_ids = {order_id: iter(by_order[order_id][-count:]) for order_id, count in counts.items()}
+    return [next(new_ids[row["order_id"]]) for row in line_rows]
+
+def _insert_lines(db: Session, line_rows, items):
+    # One INSERT for every line, one SELECT for their ids, one INSERT for the options:
+    # a constant number of statements however many lines
+    db.execute(insert(models.OrderItem), line_rows)
+    if not any(item.option_ids for item in items):
+        return # No option links, so no ids needed
+    found = db.execute(_line_ids_statement(row["order_id"] for row in line_rows)).all()
+    option_links = _option_links(_new_line_ids(line_rows, found), items)
+    if option_links:
+        db.execute(insert(models.OrderItemOption), option_links)
+
+def _insert_returning_keys(db: Session, model, rows, key_columns: List[str]) -> Dict[tuple, int]:
+    # {unique key: id} from one multi-row INSERT ... RETURNING on any backend: matched
+    # on the key, so the order RETURNING reports rows in doesn't matter
+    columns = [getattr(model, column) for column in key_columns]
+    return {tuple(row[1:]): row[0] for row in db.execute(insert(model).returning(model.id, *columns), rows)}
+
+def _add_order_items(db: Session, order_id: int, items: List[schemas.OrderItemCreate], prices):
+    # All lines in one statement, then the options in one executemany
+    if not items:
+        return
+    _insert_lines(db, _order_line_rows(order_id, items, prices), items)
+
+def _store_for_items(db: Session, item_ids) -> Optional[int]:
+    # Kiosks don't send their store; every item on the menu they order from belongs to it
+    store_ids = db.query(models.Item.store_id).filter(models.Item.id.in_(set(item_ids))).distinct().limit(2).all()
+    return store_ids[0][0] if len(store_ids) == 1 else None
+
 def create_order(db: Session, order: schemas.OrderCreate):
+    prices = pricing.price_lines(db, order.items)
     db_order = models.Order(
         status=models.OrderStatus.PENDING,
         age_group=order.age_group,
-        gender=order.gender
+        gender=order.gender,
+        total=sum(line_total for _, line_total in prices),
+        store_id=_store_for_items(db, (item.item_id for item in order.items))
     )
     db.add(db_order)
+    db.flush() # Get db_order.id without committing
+
+    _add_order_items(db, db_order.id, order.items, prices)
+
+    order_id = db_order.id # Read before commit expires it
+    # Single commit for the order, its lines and their options
     db.commit()
-    db.refresh(db_order)
+    recent_writes.mark(("order", order_id))
+    return get_order(db, order_id)
 
-    for item in order.items:
-        db_order_item = models.OrderItem(
-            order_id=db_order.id,
-            item_id=item.item_id,
-            quantity=item.quantity
-        )
-        db.add(db_order_item)
-        db.commit() # Commit to get db_order_item.id
-        db.refresh(db_order_item)
-
-        for option_id in item.option_ids:
-            db_order_item_option = models.OrderItemOption(
-                order_item_id=db_order_item.id,
-                option_id=option_id
+def ingest_order_batch(db: Session, orders: List[schemas.OfflineOrder]) -> List[schemas.OrderBatchResult]:
+    """Insert orders replayed by a kiosk after an outage, in one transaction.
+
+    Orders whose client_order_id was already ingested (or repeats within the
+    batch) are reported as duplicates; orders with unknown items or options
+    are rejected. Results come back in request order.
+    """
+    for attempt in range(2):
+        try:
+            return _ingest_order_batch(db, orders)
+        except IntegrityError:
+            # A concurrent replay of the same orders won the unique client_order_id;
+            # the retry reports them as duplicates
+            db.rollback()
+            if attempt:
+                raise
+
+def _ingest_order_batch(db: Session, orders: List[schemas.OfflineOrder]) -> List[schemas.OrderBatchResult]:
+    client_ids = {order.client_order_id for order in orders}
+    existing = dict(
+        db.query(models.Order.client_order_id, models.Order.id).filter(models.Order.client_order_id.in_(client_ids)).all()
+    )
+    # First occurrence of each client id not ingested yet
+    new_orders, new_ids = [], set()
+    for order in orders:
+        if order.client_order_id not in existing and order.client_order_id not in new_ids:
+            new_ids.add(order.client_order_id)
+            new_orders.append(order)
+    results = {}
+
+    priced = pricing.price_orders(db, [order.items for order in new_orders])
+    item_stores = dict(
+        db.query(models.Item.id, models.Item.store_id)
+        .filter(models.Item.id.in_({item.item_id for order in new_orders for item in order.items}))
+        .all()
+    )
+    accepted = []
+    for order, prices in zip(new_orders, priced):
+        if isinstance(prices, pricing.UnknownPriceError):
+            results[order.client_order_id] = schemas.OrderBatchResult(
+                client_order_id=order.client_order_id, result="rejected", detail=str(prices)
             )
-            db.add(db_order_item_option)
-    
-    db.commit()
-    db.refresh(db_order)
-    return db_order
+        elif not order.items:
+            results[order.client_order_id] = schemas.OrderBatchResult(
+                client_order_id=order.client_order_id, result="rejected", detail="Order has no items"
+            )
+        else:
+            accepted.append((order, prices))
+
+    if accepted:
+        now = datetime.utcnow()
+        order_rows = []
+        for order, prices in accepted:
+            stores = {item_stores[item.item_id] for item in order.items}
+            order_rows.append({
+                "client_order_id": order.client_order_id,
+                "created_at": order.created_at,
+                "updated_at": now, # Surfaces in the admin feed's changes since its cursor
+                "status": models.OrderStatus.COMPLETED if order.payment_method else models.OrderStatus.PENDING,
+                "payment_method": order.payment_method,
+                "age_group": order.age_group,
+                "gender": order.gender,
+                "total": sum(line_total for _, line_total in prices),
+                "store_id": stores.pop() if len(stores) == 1 else None,
+            })
+        client_ids = _insert_returning_keys(db, models.Order, order_rows, ["client_order_id"])
+        order_ids = [client_ids[(order.client_order_id,)] for order, _ in accepted]
 
-def get_orders(db: Session, skip: int = 0, limit: int = 100):
+        line_rows, lines = [], []
+        for order_id, (order, prices) in zip(order_ids, accepted):
+            line_rows.extend(_order_line_rows(order_id, order.items, prices))
+            lines.extend(order.items)
+        if line_rows:
+            _insert_lines(db, line_rows, lines)
+
+        paid_ids, quantities = [], {}
+        for order_id, (order, _) in zip(order_ids, accepted):
+            if order.payment_method:
+                paid_ids.append(order_id)
+                for item in order.items:
+                    quantities[item.item_id] = quantities.get(item.item_id, 0) + item.quantity
+        if quantities:
+            # The food was already sold offline, so stock is taken even if it goes negative
+            needed = case(quantities, value=models.Item.id)
+            stocked_stores = db.execute(
+                update(models.Item)
+                .where(models.Item.id.in_(quantities))
+                .values(stock=models.Item.stock - needed)
+                .returning(models.Item.store_id)
+                .execution_options(synchronize_session=False)
+            ).scalars().all()
+            analytics.record_checkouts(db, paid_ids)
+        db.commit()
+        if quantities:
+            menu_cache.invalidate(stocked_stores)
+        for order_id, (order, _) in zip(order_ids, accepted):
+            recent_writes.mark(("order", order_id))
+            results[order.client_order_id] = schemas.OrderBatchResult(
+                client_order_id=order.client_order_id, result="created", order_id=order_id
+            )
+
+    batch_results = []
+    seen = set()
+    for order in orders:
+        client_id = order.client_order_id
+        if client_id in existing or client_id in seen:
+            order_id = existing[client_id] if client_id in existing else results[client_id].order_id
+            batch_results.append(schemas.OrderBatchResult(client_order_id=client_id, result="duplicate", order_id=order_id))
+        else:
+            seen.add(client_id)
+            batch_results.append(results[client_id])
+    return batch_results
+
+def _order_with_items_query(db: Session):
+    # Everything the Order schema renders, in a fixed number of queries however many
+    # orders or lines: collections by selectin, the line's item by join
     return db.query(models.Order).options(
-        joinedload(models.Order.items).joinedload(models.OrderItem.item),
-        joinedload(models.Order.items).joinedload(models.OrderItem.options)
-    ).order_by(models.Order.created_at.desc()).offset(skip).limit(limit).all()
+        selectinload(models.Order.items).joinedload(models.OrderItem.item).selectinload(models.Item.options),
+        selectinload(models.Order.items).selectinload(models.OrderItem.options)
+    )
+
+def get_orders(db: Session, skip: int = 0, limit: int = 100, before: Optional[Cursor] = None):
+    query = _order_with_items_query(db)
+    if before is not None:
+        # Keyset pagination on (created_at, id), served by ix_orders_created_at_id
+        created_at, order_id = before
+        query = query.filter(or_(
+            models.Order.created_at < created_at,
+            and_(models.Order.created_at == created_at, models.Order.id < order_id)
+        ))
+    return query.order_by(models.Order.created_at.desc(), models.Order.id.desc()).offset(skip).limit(limit).all()
+
+def get_orders_changed_since(db: Session, since: Cursor, limit: int = 100):
+    # Orders created or modified after the (updated_at, id) cursor, oldest change first.
+    # updated_at is the writer's wall clock taken before its commit, not commit order: a
+    # write that commits after a reader took its cursor but stamped an earlier time is
+    # missed, so the feed is only exact while writes commit within clock resolution of
+    # their stamp. Admin clients reconcile with a full GET /orders from time to time.
+    updated_at, order_id = since
+    return _order_with_items_query(db).filter(or_(
+        models.Order.updated_at > updated_at,
+        and_(models.Order.updated_at == updated_at, models.Order.id > order_id)
+    )).order_by(models.Order.updated_at.asc(), models.Order.id.asc()).limit(limit).all()
+
+def get_latest_order_change(db: Session) -> Optional[Cursor]:
+    row = db.query(models.Order.updated_at, models.Order.id).order_by(
+        models.Order.updated_at.desc(), models.Order.id.desc()
+    ).first()
+    return (row.updated_at, row.id) if row else None
+
+def get_order_history(db: Session, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                      store_id: Optional[int] = None, limit: int = 100):
+    # Newest first within [start, end); archive.get_order_history adds the archived ones
+    query = _order_with_items_query(db)
+    if start is not None:
+        query = query.filter(models.Order.created_at >= start)
+    if end is not None:
+        query = query.filter(models.Order.created_at < end)
+    if store_id is not None:
+        query = query.filter(models.Order.store_id == store_id)
+    return query.order_by(models.Order.created_at.desc(), models.Order.id.desc()).limit(limit).all()
 
 def add_items_to_order(db: Session, order_id: int, items: List[schemas.OrderItemCreate]):
     db_order = db.query(models.Order).filter(models.Order.id == order_id).first()
     if not db_order:
         return None
-    
-    for item in items:
-        db_order_item = models.OrderItem(
-            order_id=db_order.id,
-            item_id=item.item_id,
-            quantity=item.quantity
-        )
-        db.add(db_order_item)
-    
+
+    prices = pricing.price_lines(db, items)
+    # Incremented in SQL so concurrent additions to the same order can't lose a line. Flushed
+    # first: the row lock keeps other additions out until the new lines' ids are read back
+    db_order.total = func.coalesce(models.Order.total, 0) + sum(line_total for _, line_total in prices)
+    db_order.updated_at = datetime.utcnow() # New lines count as a change for the admin feed
+    db.flush()
+    _add_order_items(db, db_order.id, items, prices)
+
     db.commit()
-    db.refresh(db_order)
-    return db_order
+    recent_writes.mark(("order", order_id))
+    return get_order(db, order_id)
+
+class InsufficientStockError(Exception):
+    def __init__(self, item_ids: List[int]):
+        self.item_ids = item_ids
+        super().__init__(f"Insufficient stock for items: {item_ids}")
 
 def checkout_order(db: Session, order_id: int, payment_method: str):
     db_order = db.query(models.Order).filter(models.Order.id == order_id).first()
@@ -97,22 +439,59 @@ def checkout_order(db: Session, order_id: int, payment_method: str):
     
     # Prevent double processing (Check payment_method instead of status)
     if db_order.payment_method is not None:
-        return db_order
-    
-    # Sort items by ID to avoid deadlocks when locking rows
-    sorted_items = sorted(db_order.items, key=lambda x: x.item_id)
-    
-    for order_item in sorted_items:
-        # Acquire lock for the item to safely update stock
-        # Note: with_for_update might be ignored by SQLite but is good practice for concurrency
-        item = db.query(models.Item).filter(models.Item.id == order_item.item_id).with_for_update().first()
-        if item:
-            item.stock -= order_item.quantity
-
-    db_order.payment_method = payment_method
-    db_order.status = models.OrderStatus.COMPLETED
+        return get_order(db, order_id)
+
+    # Claim the order first; a concurrent checkout of the same order matches no row
+    claimed = db.execute(
+        update(models.Order)
+        .where(models.Order.id == order_id, models.Order.payment_method.is_(None))
+        .values(
+            payment_method=payment_method,
+            status=models.OrderStatus.COMPLETED,
+            updated_at=datetime.utcnow(),
+            # Final total from the persisted line totals
+            total=select(func.coalesce(func.sum(models.OrderItem.line_total), 0))
+            .where(models.OrderItem.order_id == order_id)
+            .scalar_subquery(),
+        )
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not claimed:
+        db.rollback()
+        return get_order(db, order_id)
+
+    quantities = dict(
+        db.query(models.OrderItem.item_id, func.sum(models.OrderItem.quantity))
+        .filter(models.OrderItem.order_id == order_id)
+        .group_by(models.OrderItem.item_id)
+        .all()
+    )
+    if quantities:
+        # One conditional UPDATE for every line: rows without enough stock are left untouched
+        needed = case(quantities, value=models.Item.id)
+        stocked_stores = db.execute(
+            update(models.Item)
+            .where(models.Item.id.in_(quantities), models.Item.stock >= needed)
+            .values(stock=models.Item.stock - needed)
+            .returning(models.Item.store_id)
+            .execution_options(synchronize_session=False)
+        ).scalars().all()
+        if len(stocked_stores) != len(quantities):
+            db.rollback()
+            stocks = dict(db.query(models.Item.id, models.Item.stock).filter(models.Item.id.in_(quantities)).all())
+            raise InsufficientStockError(sorted(
+                item_id for item_id, quantity in quantities.items()
+                if stocks.get(item_id) is None or stocks[item_id] < quantity
+            ))
+
+    analytics.record_checkout(db, order_id)
     db.commit()
-    db.refresh(db_order)
+    recent_writes.mark(("order", order_id))
+    if quantities:
+        # Stock is part of the menu payload; only these stores' menus changed
+        menu_cache.invalidate(stocked_stores)
+    db_order = get_order(db, order_id)
+    events.publish_order_status(db_order)
     return db_order
 
 def update_order_status(db: Session, order_id: int, status: str):
@@ -122,11 +501,10 @@ def update_order_status(db: Session, order_id: int, status: str):
     
     db_order.status = status
     db.commit()
-    db.refresh(db_order)
+    recent_writes.mark(("order", order_id))
+    db_order = get_order(db, order_id)
+    events.publish_order_status(db_order)
     return db_order
 
 def get_order(db: Session, order_id: int):
-    return db.query(models.Order).options(
-        joinedload(models.Order.items).joinedload(models.OrderItem.item),
-        joinedload(models.Order.items).joinedload(models.OrderItem.options)
-    ).filter(models.Order.id == order_id).first()
+    return _order_with_items_query(db).filter(models.Order.id == order_id).first()
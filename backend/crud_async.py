@@ -0,0 +1,98 @@
+"""AsyncSession versions of the hot CRUD paths used by async_routes.
+
+They mirror the behaviour of the functions of the same name in crud.py.
+Relationships are loaded eagerly because lazy loads are not possible on an
+AsyncSession.
+"""
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+
+from . import models, pricing, schemas
+from .crud import _line_ids_statement, _new_line_ids, _option_links, _order_line_rows
+from .database import recent_writes
+
+
+def _order_with_items_statement():
+    return select(models.Order).options(
+        joinedload(models.Order.items).joinedload(models.OrderItem.item).joinedload(models.Item.options),
+        joinedload(models.Order.items).joinedload(models.OrderItem.options)
+    )
+
+async def get_items(db: AsyncSession, skip: int = 0, limit: int = 100, store_id: Optional[int] = None, category: Optional[str] = None):
+    stmt = select(models.Item).options(joinedload(models.Item.options))
+    if store_id is not None:
+        stmt = stmt.filter(models.Item.store_id == store_id)
+    if category is not None:
+        stmt = stmt.filter(models.Item.category == category)
+    result = await db.execute(stmt.order_by(models.Item.id).offset(skip).limit(limit))
+    return result.unique().scalars().all()
+
+async def get_store_by_code(db: AsyncSession, code: str):
+    result = await db.execute(select(models.Store).filter(models.Store.code == code))
+    return result.scalars().first()
+
+async def get_order(db: AsyncSession, order_id: int):
+    result = await db.execute(
+        _order_with_items_statement()
+        .filter(models.Order.id == order_id)
+        .execution_options(populate_existing=True)
+    )
+    return result.unique().scalars().first()
+
+async def _add_order_items(db: AsyncSession, order_id: int, items: List[schemas.OrderItemCreate], prices):
+    if not items:
+        return
+    # As crud._insert_lines: one INSERT, one SELECT for the new ids, one INSERT for the options
+    rows = _order_line_rows(order_id, items, prices)
+    await db.execute(insert(models.OrderItem), rows)
+    if not any(item.option_ids for item in items):
+        return # No option links, so no ids needed
+    found = (await db.execute(_line_ids_statement([order_id]))).all()
+    option_links = _option_links(_new_line_ids(rows, found), items)
+    if option_links:
+        await db.execute(insert(models.OrderItemOption), option_links)
+
+async def _store_for_items(db: AsyncSession, item_ids):
+    result = await db.execute(
+        select(models.Item.store_id).filter(models.Item.id.in_(set(item_ids))).distinct().limit(2)
+    )
+    store_ids = result.scalars().all()
+    return store_ids[0] if len(store_ids) == 1 else None
+
+async def create_order(db: AsyncSession, order: schemas.OrderCreate):
+    # The price table works on a sync Session; run_sync keeps its queries on the async driver
+    prices = await db.run_sync(pricing.price_lines, order.items)
+    db_order = models.Order(
+        status=models.OrderStatus.PENDING,
+        age_group=order.age_group,
+        gender=order.gender,
+        total=sum(line_total for _, line_total in prices),
+        store_id=await _store_for_items(db, (item.item_id for item in order.items))
+    )
+    db.add(db_order)
+    await db.flush()
+
+    await _add_order_items(db, db_order.id, order.items, prices)
+
+    await db.commit()
+    recent_writes.mark(("order", db_order.id))
+    return await get_order(db, db_order.id)
+
+async def add_items_to_order(db: AsyncSession, order_id: int, items: List[schemas.OrderItemCreate]):
+    db_order = await db.get(models.Order, order_id)
+    if not db_order:
+        return None
+
+    prices = await db.run_sync(pricing.price_lines, items)
+    db_order.total = func.coalesce(models.Order.total, 0) + sum(line_total for _, line_total in prices)
+    db_order.updated_at = datetime.utcnow()
+    await db.flush() # Locks the order row before its new lines' ids are read back
+    await _add_order_items(db, db_order.id, items, prices)
+
+    await db.commit()
+    recent_writes.mark(("order", db_order.id))
+    return await get_order(db, db_order.id)
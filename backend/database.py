@@ -1,27 +1,197 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 
 import os
+import threading
+import time
+from itertools import cycle
 
 from dotenv import load_dotenv
+from starlette.requests import Request
+from starlette.responses import Response
+
+from . import metrics
 
 load_dotenv()
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 # Default to sqlite relative URL if not set
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", f"sqlite:///{os.path.join(BASE_DIR, 'sql_app.db')}")
-# check_same_thread is needed for SQLite
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+
+# Engine profiles. "default" keeps driver defaults (rollback journal,
+# synchronous=FULL, default pool). "production" runs SQLite in WAL mode so
+# readers never block the writer, waits for locks instead of failing, and
+# sizes the pool explicitly.
+DB_PROFILE = os.getenv("DB_PROFILE", "default")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 10))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))
+SQLITE_PRODUCTION_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL", # Durable across app crashes; a power loss may drop the last commits
+    "busy_timeout": SQLITE_BUSY_TIMEOUT_MS,
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)),
+    "cache_size": -int(os.getenv("SQLITE_CACHE_SIZE_KIB", 64 * 1024)), # Negative: KiB rather than pages
+    "temp_store": "MEMORY",
+}
+DB_PROFILES = ("default", "production")
+
+def _is_sqlite_memory(url: str) -> bool:
+    path = url.partition("://")[2].lstrip("/")
+    return path in ("", ":memory:") or "mode=memory" in url
+
+def _apply_sqlite_pragmas(engine, pragmas):
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+def engine_options(url: str, profile: str = None) -> dict:
+    profile = profile or DB_PROFILE
+    if profile not in DB_PROFILES:
+        raise ValueError(f"Unknown DB_PROFILE {profile!r}; expected one of {DB_PROFILES}")
+    sqlite = url.startswith("sqlite")
+    # check_same_thread is needed for SQLite
+    options = {"connect_args": {"check_same_thread": False}} if sqlite and "aiosqlite" not in url else {}
+    if profile == "production" and not (sqlite and _is_sqlite_memory(url)):
+        options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+        if sqlite:
+            # The driver waits this long for a lock before raising "database is locked"
+            options.setdefault("connect_args", {})["timeout"] = SQLITE_BUSY_TIMEOUT_MS / 1000
+        else:
+            options["pool_pre_ping"] = True
+    return options
+
+def configure_engine(engine, profile: str = None, label: str = None):
+    """Per-connection setup for a profile; takes the sync engine of async engines.
+
+    label names the engine's role in the metrics ("primary", "replica-0", "shard-1").
+    """
+    metrics.instrument_engine(engine, label)
+    if (profile or DB_PROFILE) == "production" and engine.dialect.name == "sqlite" and not _is_sqlite_memory(str(engine.url)):
+        _apply_sqlite_pragmas(engine, SQLITE_PRODUCTION_PRAGMAS)
+    return engine
+
+def create_db_engine(url: str, profile: str = None, label: str = None, **kwargs):
+    options = engine_options(url, profile)
+    options.update(kwargs)
+    parsed = make_url(url)
+    label = label or metrics.engine_label(parsed)
+    if "poolclass" not in options:
+        options["poolclass"] = metrics.timed_pool_class(parsed.get_dialect().get_pool_class(parsed), label)
+    return configure_engine(create_engine(url, **options), profile, label)
+
+engine = create_db_engine(SQLALCHEMY_DATABASE_URL, label="primary")
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Read replicas (comma separated). Unset: reads use the primary engine
+DATABASE_READ_URLS = [url.strip() for url in os.getenv("DATABASE_READ_URLS", "").split(",") if url.strip()]
+# How long after a write the writer's reads stay on the primary (covers replica lag)
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", 5))
+read_engines = [create_db_engine(url, label=f"replica-{index}") for index, url in enumerate(DATABASE_READ_URLS)]
+_read_engine_cycle = cycle(read_engines) if read_engines else None
+
+class ReadOnlySession(Session):
+    def flush(self, objects=None):
+        if self.new or self.dirty or self.deleted:
+            raise RuntimeError("Read replica sessions are read-only")
+        super().flush(objects)
+
+ReadSessionLocal = sessionmaker(class_=ReadOnlySession, autocommit=False, autoflush=False)
+
+def new_read_session() -> Session:
+    if _read_engine_cycle is None:
+        return SessionLocal()
+    # Round-robin across replicas
+    return ReadSessionLocal(bind=next(_read_engine_cycle))
+
+class RecentWrites:
+    """Keys written by this process in the last `window` seconds.
+
+    Reads of a recently written key go to the primary so a kiosk always sees
+    the order it just created or paid, even if the replica is behind. Other
+    workers do not see these marks; mark_client_write covers them.
+    """
+
+    def __init__(self, window: float = READ_YOUR_WRITES_SECONDS):
+        self.window = window
+        self._lock = threading.Lock()
+        self._until = {}
+
+    def mark(self, key):
+        now = time.monotonic()
+        with self._lock:
+            self._until[key] = now + self.window
+            if len(self._until) > 10000:
+                self._until = {k: t for k, t in self._until.items() if t > now}
+
+    def is_recent(self, key) -> bool:
+        with self._lock:
+            until = self._until.get(key)
+        return until is not None and until > time.monotonic()
+
+    def clear(self):
+        with self._lock:
+            self._until.clear()
+
+recent_writes = RecentWrites()
+
+# RecentWrites only covers writes made by this worker. Order writes also hand
+# the client a marker holding the write time, which it sends back (cookie, or
+# header for non-browser kiosks) so any worker can route its reads to the primary.
+WRITE_MARKER_COOKIE = "last_write"
+WRITE_MARKER_HEADER = "X-Last-Write"
+
+def mark_client_write(response: Response):
+    """Dependency for order write routes: hands the client the write time."""
+    marker = f"{time.time():.3f}"
+    response.headers[WRITE_MARKER_HEADER] = marker
+    response.set_cookie(WRITE_MARKER_COOKIE, marker, max_age=int(READ_YOUR_WRITES_SECONDS) + 1, httponly=True, samesite="lax")
+
+def client_wrote_recently(request: Request) -> bool:
+    marker = request.headers.get(WRITE_MARKER_HEADER) or request.cookies.get(WRITE_MARKER_COOKIE)
+    try:
+        age = time.time() - float(marker)
+    except (TypeError, ValueError):
+        return False
+    return 0 <= age < READ_YOUR_WRITES_SECONDS
+
 Base = declarative_base()
 
+def to_async_url(url: str) -> str:
+    # sqlite:///app.db -> sqlite+aiosqlite:///app.db, postgresql://... -> postgresql+asyncpg://...
+    scheme, sep, rest = url.partition("://")
+    if "+" in scheme:
+        return url
+    if scheme == "sqlite":
+        return f"sqlite+aiosqlite{sep}{rest}"
+    if scheme in ("postgresql", "postgres"):
+        return f"postgresql+asyncpg{sep}{rest}"
+    return url
+
+# Optional async engine for the hot request paths (requires aiosqlite / asyncpg)
+USE_ASYNC_DB = os.getenv("USE_ASYNC_DB", "false").lower() in ("1", "true", "yes")
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", to_async_url(SQLALCHEMY_DATABASE_URL))
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL)) if USE_ASYNC_DB else None
+if async_engine is not None:
+    configure_engine(async_engine.sync_engine, label="primary-async")
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+) if async_engine is not None else None
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,120 @@
+import asyncio
+import json
+import threading
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from typing import AsyncIterator, Optional
+
+# Seconds between SSE comments that keep idle connections open through proxies
+HEARTBEAT_INTERVAL = 15
+
+
+class Subscription:
+    """A single listener for one order's events, bound to the event loop that created it."""
+
+    def __init__(self, broker: "OrderEventBroker", order_id: int):
+        self.broker = broker
+        self.order_id = order_id
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    def deliver(self, event: dict):
+        # publish() is called from worker threads, so hand the event to the owning loop
+        try:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, event)
+        except RuntimeError:
+            pass # Loop already closed; the subscriber is gone
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class OrderEventBroker(ABC):
+    """Interface for fanning order status changes out to subscribers.
+
+    The in-process implementation below is enough for a single API process.
+    A Redis/NATS-backed broker only needs to implement the same three methods
+    and be installed with set_broker(); one missing a method can't be created.
+    """
+
+    @abstractmethod
+    def publish(self, order_id: int, event: dict):
+        ...
+
+    @abstractmethod
+    def subscribe(self, order_id: int) -> Subscription:
+        ...
+
+    @abstractmethod
+    def unsubscribe(self, subscription: Subscription):
+        ...
+
+
+class InProcessOrderEventBroker(OrderEventBroker):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def publish(self, order_id: int, event: dict):
+        with self._lock:
+            subscribers = list(self._subscribers.get(order_id, ()))
+        for subscription in subscribers:
+            subscription.deliver(event)
+
+    def subscribe(self, order_id: int) -> Subscription:
+        subscription = Subscription(self, order_id)
+        with self._lock:
+            self._subscribers[order_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.order_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.order_id]
+
+    def subscriber_count(self, order_id: int) -> int:
+        with self._lock:
+            return len(self._subscribers.get(order_id, ()))
+
+
+broker: OrderEventBroker = InProcessOrderEventBroker()
+
+
+def set_broker(new_broker: OrderEventBroker):
+    global broker
+    broker = new_broker
+
+
+def order_event(db_order) -> dict:
+    return {
+        "order_id": db_order.id,
+        "status": db_order.status,
+        "payment_method": db_order.payment_method,
+    }
+
+
+def publish_order_status(db_order):
+    broker.publish(db_order.id, order_event(db_order))
+
+
+def format_sse(event: dict, event_name: str = "status") -> str:
+    return f"event: {event_name}\ndata: {json.dumps(event)}\n\n"
+
+
+async def stream_order_events(subscription: Subscription, initial: Optional[dict] = None) -> AsyncIterator[str]:
+    """Yield SSE frames for a subscription until the client disconnects."""
+    try:
+        if initial is not None:
+            yield format_sse(initial)
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), timeout=HEARTBEAT_INTERVAL)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield format_sse(event)
+    finally:
+        subscription.close()
@@ -1,57 +1,88 @@
-from sqlalchemy.orm import Session
-from backend.database import SessionLocal, engine
-from backend import models
+from typing import Dict, Sequence
 
-def fix_duplicates():
-    db = SessionLocal()
-    
-    # Target duplicate name
-    target_name = "少なめ"
-    
-    options = db.query(models.Option).filter(models.Option.name == target_name).all()
-    
-    if len(options) <= 1:
-        print(f"No duplicates found for '{target_name}'. Count: {len(options)}")
-        return
+from sqlalchemy import and_, case, delete, exists, func, insert, select, update
+from sqlalchemy.orm import Session, aliased
+from backend.database import SessionLocal
+from backend import analytics, models
 
-    print(f"Found {len(options)} duplicate options for '{target_name}'. Fixing...")
-    
-    # Kepp the first one (usually the oldest id, or just the first in list)
-    # Ideally we keep the one that was 'correct' or has more links, but here they are likely identical in content
-    primary_option = options[0]
-    duplicates = options[1:]
-    
-    print(f"Keeping Option ID: {primary_option.id}")
-    
-    for dup in duplicates:
-        print(f"Processing Duplicate Option ID: {dup.id}")
-        
-        # 1. Update ItemOption links
-        item_links = db.query(models.ItemOption).filter(models.ItemOption.option_id == dup.id).all()
-        for link in item_links:
-            # Check if primary already has this link
-            existing_link = db.query(models.ItemOption).filter_by(item_id=link.item_id, option_id=primary_option.id).first()
-            if not existing_link:
-                # Re-link to primary
-                new_link = models.ItemOption(item_id=link.item_id, option_id=primary_option.id)
-                db.add(new_link)
-            # Delete old link
-            db.delete(link)
-            
-        # 2. Update OrderItemOption links
-        order_links = db.query(models.OrderItemOption).filter(models.OrderItemOption.option_id == dup.id).all()
-        for link in order_links:
-            # Just update the option_id to primary
-            # (Assuming one order item doesn't have the same option twice, which shouldn't happen normally)
-            link.option_id = primary_option.id
-            db.add(link)
-            
-        # 3. Delete the duplicate option
-        db.delete(dup)
-        
-    db.commit()
-    print("Duplicates fixed.")
-    db.close()
+# What to merge, and the tables pointing at it: link tables (whose primary key includes
+# the reference, so copies are merged rather than re-pointed) and plain foreign keys
+DUPLICATE_KEYS = {
+    models.Option: {
+        "key": ["name"],
+        "links": [(models.ItemOption, "option_id", "item_id"), (models.OrderItemOption, "option_id", "order_item_id")],
+        "references": [],
+    },
+    models.Item: {
+        "key": ["store_id", "name"],
+        "links": [(models.ItemOption, "item_id", "option_id")],
+        "references": [(models.OrderItem, "item_id")],
+    },
+}
+
+def duplicate_ids(db: Session, model, key: Sequence[str]) -> Dict[int, int]:
+    """{duplicate id: id kept} where the oldest row of each key is kept. NULLs match."""
+    columns = [getattr(model, column) for column in key]
+    keepers = (
+        select(*columns, func.min(model.id).label("keeper_id"))
+        .group_by(*columns)
+        .having(func.count() > 1)
+        .subquery()
+    )
+    return dict(db.execute(
+        select(model.id, keepers.c.keeper_id)
+        .join(keepers, and_(*(column.is_not_distinct_from(keepers.c[column.key]) for column in columns)))
+        .where(model.id != keepers.c.keeper_id)
+    ).all())
+
+def _merge_links(db: Session, link_model, column: str, other: str, remap: Dict[int, int]):
+    # Copy each duplicate's links to its keeper unless the keeper already has them,
+    # then drop the duplicate's links: two statements whatever the row counts
+    ref, other_col = getattr(link_model, column), getattr(link_model, other)
+    existing = aliased(link_model)
+    keeper = case(remap, value=ref)
+    rows = (
+        select(other_col, keeper)
+        .where(ref.in_(remap))
+        .where(~exists().where(getattr(existing, other) == other_col, getattr(existing, column) == keeper))
+        .distinct()
+    )
+    db.execute(insert(link_model).from_select([other, column], rows))
+    db.execute(delete(link_model).where(ref.in_(remap)))
+
+def merge_duplicates(db: Session, model) -> int:
+    """Merge rows of model sharing its DUPLICATE_KEYS key into the oldest one. Doesn't commit."""
+    spec = DUPLICATE_KEYS[model]
+    remap = duplicate_ids(db, model, spec["key"])
+    if not remap:
+        return 0
+    for link_model, column, other in spec["links"]:
+        _merge_links(db, link_model, column, other, remap)
+    for ref_model, column in spec["references"]:
+        ref = getattr(ref_model, column)
+        db.execute(
+            update(ref_model).where(ref.in_(remap)).values({column: case(remap, value=ref)})
+            .execution_options(synchronize_session=False)
+        )
+    db.execute(delete(model).where(model.id.in_(remap)))
+    return len(remap)
+
+def fix_duplicates(db: Session = None):
+    own_session = db is None
+    db = db or SessionLocal()
+    try:
+        merged = {model.__tablename__: merge_duplicates(db, model) for model in DUPLICATE_KEYS}
+        db.commit()
+        for table, count in merged.items():
+            print(f"{table}: {count} duplicates merged.")
+        if merged["items"]:
+            # Sales rollups are keyed by item; recompute them onto the kept items
+            analytics.rebuild(db)
+            print("Sales rollups rebuilt.")
+        return merged
+    finally:
+        if own_session:
+            db.close()
 
 if __name__ == "__main__":
     fix_duplicates()
@@ -0,0 +1,201 @@
+"""Idempotency-Key support for order creation and checkout.
+
+A kiosk that times out retries with the same Idempotency-Key header. The
+first response is kept for IDEMPOTENCY_TTL seconds and a retry gets it back
+as-is, answered by the middleware before routing: no session is opened and
+the order tables are never read. A retry that arrives while the first
+request is still running gets 409, and reusing a key for a different body
+gets 422. 5xx responses are not kept, so the retry runs again.
+
+Like the other caches here the store is in process: retries are only
+deduplicated on the worker that served the first attempt, and the checks in
+crud.checkout_order remain the backstop across workers.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", 3600))
+IDEMPOTENCY_STORE_SIZE = int(os.getenv("IDEMPOTENCY_STORE_SIZE", 100_000))
+MAX_KEY_LENGTH = 255
+HEADER = b"idempotency-key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+IDEMPOTENT_ROUTES = (
+    ("POST", re.compile(r"^/orders$")),
+    ("POST", re.compile(r"^/orders/\d+/checkout$")),
+)
+
+
+class StoredResponse:
+    __slots__ = ("expires_at", "fingerprint", "status", "headers", "body")
+
+    def __init__(self, expires_at: float, fingerprint: bytes):
+        self.expires_at = expires_at
+        self.fingerprint = fingerprint # Digest of the request body
+        self.status: Optional[int] = None # None while the first request is running
+        self.headers: List[Tuple[bytes, bytes]] = []
+        self.body = b""
+
+
+class IdempotencyStore:
+    """Responses by (method, path, key) with a fixed TTL.
+
+    Every entry lives for the same TTL, so insertion order is expiry order and
+    eviction only ever looks at the oldest entries.
+    """
+
+    def __init__(self, ttl: float = IDEMPOTENCY_TTL, max_size: int = IDEMPOTENCY_STORE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[tuple, StoredResponse]" = OrderedDict()
+        self.replays = 0
+        self.conflicts = 0
+
+    def begin(self, key: tuple, fingerprint: bytes) -> Optional[StoredResponse]:
+        """Return the entry already held for key, or reserve it and return None."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at > now:
+                if entry.status is not None and entry.fingerprint == fingerprint:
+                    self.replays += 1
+                else:
+                    self.conflicts += 1
+                return entry
+            self._entries.pop(key, None)
+            self._evict(now)
+            self._entries[key] = StoredResponse(now + self.ttl, fingerprint)
+            return None
+
+    def complete(self, key: tuple, status: int, headers, body: bytes):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.status, entry.headers, entry.body = status, headers, body
+
+    def release(self, key: tuple):
+        # The request failed; let a retry run it again
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.status is None:
+                del self._entries[key]
+
+    def _evict(self, now: float):
+        entries = self._entries
+        while entries:
+            oldest = next(iter(entries.values()))
+            if oldest.expires_at > now and len(entries) < self.max_size:
+                break
+            entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.replays = self.conflicts = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._entries), "replays": self.replays, "conflicts": self.conflicts}
+
+
+idempotency_store = IdempotencyStore()
+
+
+def _is_idempotent_route(scope) -> bool:
+    return any(scope["method"] == method and pattern.match(scope["path"]) for method, pattern in IDEMPOTENT_ROUTES)
+
+
+async def _send_json(send, status: int, detail: str, headers=()):
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()), *headers],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class IdempotencyMiddleware:
+    """Pure ASGI middleware replaying stored responses for IDEMPOTENT_ROUTES."""
+
+    def __init__(self, app, store: IdempotencyStore = None):
+        self.app = app
+        self.store = store
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _is_idempotent_route(scope):
+            await self.app(scope, receive, send)
+            return
+        idempotency_key = dict(scope["headers"]).get(HEADER)
+        if idempotency_key is None:
+            await self.app(scope, receive, send)
+            return
+        if len(idempotency_key) > MAX_KEY_LENGTH:
+            await _send_json(send, 400, f"Idempotency-Key longer than {MAX_KEY_LENGTH} characters")
+            return
+
+        # The body is small (an order); read it whole to fingerprint it, then hand it on
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                return # Client went away before sending the body
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        body = b"".join(chunks)
+
+        store = self.store or idempotency_store
+        key = (scope["method"], scope["path"], idempotency_key)
+        fingerprint = hashlib.sha256(body).digest()
+        entry = store.begin(key, fingerprint)
+        if entry is not None:
+            if entry.fingerprint != fingerprint:
+                await _send_json(send, 422, "Idempotency-Key was already used for a different request")
+            elif entry.status is None:
+                await _send_json(send, 409, "A request with this Idempotency-Key is in progress", [(b"retry-after", b"1")])
+            else:
+                await send({
+                    "type": "http.response.start",
+                    "status": entry.status,
+                    "headers": entry.headers + [(REPLAYED_HEADER.lower().encode(), b"true")],
+                })
+                await send({"type": "http.response.body", "body": entry.body})
+            return
+
+        body_sent = False
+
+        async def replay_body():
+            nonlocal body_sent
+            if body_sent:
+                return await receive()
+            body_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        status = 500
+        headers, response_chunks = [], []
+
+        async def capture(message):
+            nonlocal status, headers
+            if message["type"] == "http.response.start":
+                status, headers = message["status"], list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                response_chunks.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, replay_body, capture)
+        except BaseException:
+            store.release(key)
+            raise
+        if status >= 500:
+            store.release(key)
+        else:
+            store.complete(key, status, headers, b"".join(response_chunks))
@@ -1,18 +1,16 @@
+from sqlalchemy import or_, update
 from sqlalchemy.orm import Session
 from backend.database import SessionLocal, engine, Base
-from backend.database import SessionLocal, engine, Base
-from backend import models, schemas, crud
+from backend import bulk_load, models, schemas, crud
 
 # Create tables
 Base.metadata.create_all(bind=engine)
 
-def init_db():
-    db = SessionLocal()
-    
+def seed(db: Session):
     # Create default store if not exists
     store = crud.get_store_by_name(db, name="admin")
     if not store:
-        crud.create_store(db, schemas.StoreCreate(name="admin", password="password123"))
+        store = crud.create_store(db, schemas.StoreCreate(name="admin", password="password123"))
         print("Seeded default store user.")
 
     # Define Items Data
@@ -27,61 +25,46 @@ def init_db():
         {"name": "ライス", "price": 150, "image_url": "https://placehold.co/400x300?text=Rice", "category": "ご飯もの"},
     ]
 
-    for item_data in items_data:
-        existing_item = db.query(models.Item).filter(models.Item.name == item_data["name"]).first()
-        if existing_item:
-            # Update existing item image_url and category
-            print(f"Updating item: {existing_item.name}")
-            existing_item.image_url = item_data["image_url"]
-            existing_item.category = item_data["category"]
-        else:
-            # Create new item
-            print(f"Creating item {item_data['name']}")
-            new_item = models.Item(**item_data)
-            db.add(new_item)
-    
+    store_id = store.id
+    # Seed items from before they belonged to a store join the admin menu
+    db.execute(
+        update(models.Item)
+        .where(models.Item.store_id.is_(None), models.Item.name.in_([item["name"] for item in items_data]))
+        .values(store_id=store_id)
+    )
+    # Existing items get the current image and category, missing ones are created
+    db.execute(
+        bulk_load.upsert_statement(db, models.Item, ["store_id", "name"], ["image_url", "category"]),
+        [{**item, "store_id": store_id} for item in items_data],
+    )
     db.commit()
     print("Items synced.")
 
     # Seed Options
     options = [
-        models.Option(name="大盛", price_adjustment=100),
-        models.Option(name="特盛", price_adjustment=200),
-        models.Option(name="少なめ", price_adjustment=-50),
+        {"name": "大盛", "price_adjustment": 100},
+        {"name": "特盛", "price_adjustment": 200},
+        {"name": "少なめ", "price_adjustment": -50},
     ]
-
-    for option in options:
-        existing_option = db.query(models.Option).filter(models.Option.name == option.name).first()
-        if not existing_option:
-            db.add(option)
-    
-    db.commit()
+    db.execute(bulk_load.insert_statement(db, models.Option, ["name"]), options)
 
     # Link Options to Items (Example: Ramen gets Large/Extra Large/Small options)
-    # Re-query items and options to get IDs
-    ramen_items = db.query(models.Item).filter(models.Item.name.like("%ラーメン%")).all()
-    rice_item = db.query(models.Item).filter(models.Item.name == "ライス").first()
-    炒飯_item = db.query(models.Item).filter(models.Item.name == "チャーハン").first()
-    
-    all_options = db.query(models.Option).all()
-    print(f"Found options: {len(all_options)}")
+    target_items = db.query(models.Item.id).filter(or_(
+        models.Item.name.like("%ラーメン%"), models.Item.name.in_(["ライス", "チャーハン"])
+    ))
+    option_ids = [option_id for option_id, in db.query(models.Option.id)]
+    links = [{"item_id": item_id, "option_id": option_id} for item_id, in target_items for option_id in option_ids]
+    bulk_load.insert_rows(db, models.ItemOption, links, conflict_columns=["item_id", "option_id"])
 
-    target_items = ramen_items + ([rice_item] if rice_item else []) + ([炒飯_item] if 炒飯_item else [])
-    print(f"Target items count: {len(target_items)}")
-    for i in target_items:
-        print(f"Target: {i.name}")
-
-    for item in target_items:
-        for option in all_options:
-            # Check if link exists
-            link = db.query(models.ItemOption).filter_by(item_id=item.id, option_id=option.id).first()
-            if not link:
-                item_option = models.ItemOption(item_id=item.id, option_id=option.id)
-                db.add(item_option)
-    
     db.commit()
     print("Seeded items and options.")
-    db.close()
+
+def init_db():
+    db = SessionLocal()
+    try:
+        seed(db)
+    finally:
+        db.close()
 
 if __name__ == "__main__":
     init_db()
@@ -1,12 +1,16 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
-from typing import List
+from datetime import datetime
+from typing import List, Optional
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 
-from . import crud, models, schemas, auth
-from .database import SessionLocal, engine
+from . import crud, models, schemas, auth, events, pagination, async_routes, analytics, pricing, serialization, sharding, metrics, idempotency, menu_import, archive, export
+from .database import SessionLocal, engine, async_engine, new_read_session, recent_writes, WRITE_MARKER_HEADER, mark_client_write, client_wrote_recently
+from .menu_cache import menu_cache
+from .principal_cache import principal_cache
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from jose import JWTError, jwt
 from fastapi import status
 
 # Create tables if they don't exist (though init_db.py will handle seeding)
@@ -15,6 +19,8 @@ models.Base.metadata.create_all(bind=engine)
 app = FastAPI()
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+# For routes kiosks may also call without logging in
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
 
 # Dependency
 def get_db():
@@ -24,25 +30,74 @@ def get_db():
     finally:
         db.close()
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+# Read replica when DATABASE_READ_URLS is set, the primary otherwise
+def get_read_db():
+    db = new_read_session()
+    try:
+        yield db
+    finally:
+        db.close()
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-        token_data = schemas.TokenData(username=username)
-    except JWTError:
+    claims = auth.decode_token(token)
+    if claims is None:
         raise credentials_exception
-    user = crud.get_store_by_code(db, code=token_data.username)
+    token_data = schemas.TokenData(username=claims[0], store_id=claims[1])
+    if auth.EMBED_STORE_ID_IN_TOKEN and token_data.store_id is not None:
+        principal_cache.record_token_hit()
+        return schemas.StorePrincipal(id=token_data.store_id, code=token_data.username)
+    user = principal_cache.get_or_load(token_data.username, lambda: crud.get_store_by_code(db, code=token_data.username))
     if user is None:
         raise credentials_exception
     return user
 
+def get_optional_user(token: Optional[str] = Depends(optional_oauth2_scheme), db: Session = Depends(get_db)):
+    # The caller's store when it sent a valid token, None otherwise (never a 401)
+    if token is None:
+        return None
+    try:
+        return get_current_user(token, db)
+    except HTTPException:
+        return None
+
+# Shard routing (see sharding.py); each falls back to the plain session when unsharded
+def _shard_session(row_id: int, db: Session, not_found: str):
+    if sharding.router is None:
+        yield db
+        return
+    try:
+        shard_db = sharding.router.session_for_id(row_id)
+    except sharding.ShardRoutingError:
+        raise HTTPException(status_code=404, detail=not_found)
+    try:
+        yield shard_db
+    finally:
+        shard_db.close()
+
+def get_order_db(order_id: int, db: Session = Depends(get_db)):
+    yield from _shard_session(order_id, db, "Order not found")
+
+def get_orders_read_db(request: Request, db: Session = Depends(get_db), read_db: Session = Depends(get_read_db)):
+    # The primary for a client that wrote within the window, so no replica lag hides its order
+    return db if client_wrote_recently(request) else read_db
+
+def get_order_read_db(order_id: int, db: Session = Depends(get_orders_read_db)):
+    # Shards have no replicas: sharded reads use the order's shard
+    yield from _shard_session(order_id, db, "Order not found")
+
+def get_store_db(current_user: schemas.StorePrincipal = Depends(get_current_user), db: Session = Depends(get_db)):
+    # Menu writes go to the authenticated store's shard
+    if sharding.router is None:
+        yield db
+        return
+    with sharding.router.session_for_store(current_user.id) as shard_db:
+        yield shard_db
+
 # CORS configuration
 origins = [
     "http://localhost:5173", # Vite default
@@ -50,21 +105,35 @@ origins = [
     "http://localhost:3000",
 ]
 
+# Inside CORS, so replayed responses still get its headers
+app.add_middleware(idempotency.IdempotencyMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor", "X-Since-Cursor", WRITE_MARKER_HEADER, idempotency.REPLAYED_HEADER],
 )
+# Outermost, so CORS preflights and errors are timed too
+app.add_middleware(metrics.MetricsMiddleware)
 
 # get_db moved up
 
+if async_engine is not None:
+    # Async hot paths (token, menu, kiosk orders) shadow the sync routes registered below
+    async_routes.check_supported()
+    app.include_router(async_routes.router)
+
 @app.post("/token", response_model=schemas.Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     # Authenticate by CODE (username field in form_data will hold the code)
-    user = crud.get_store_by_code(db, form_data.username)
-    if not user or not auth.verify_password(form_data.password, user.hashed_password):
+    user = await run_in_threadpool(crud.get_store_by_code, db, form_data.username)
+    try:
+        password_ok = user is not None and await auth.password_pool.verify(form_data.password, user.hashed_password)
+    except auth.PasswordPoolBusyError:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Login busy, retry shortly", headers={"Retry-After": "1"})
+    if not password_ok:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -72,59 +141,220 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
         )
     access_token_expires = auth.timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = auth.create_access_token(
-        data={"sub": user.code}, expires_delta=access_token_expires
+        data=auth.store_token_claims(user), expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.get("/items", response_model=List[schemas.Item])
-def read_items(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    items = crud.get_items(db, skip=skip, limit=limit)
-    return items
+def read_items(request: Request, skip: int = 0, limit: int = 100, category: Optional[str] = None, db: Session = Depends(get_db), read_db: Session = Depends(get_read_db), current_user: schemas.StorePrincipal = Depends(get_current_user)):
+    # The kiosk's own store's menu, served from the menu snapshot; the DB is only hit after a menu write
+    source = db if recent_writes.is_recent("menu") else read_db
+    with sharding.fan_out(source, crud) as (api, source):
+        snapshot = menu_cache.get(
+            (category, skip, limit),
+            lambda: api.get_items(source, skip=skip, limit=limit, store_id=current_user.id, category=category),
+            store_id=current_user.id,
+        )
+    headers = {"ETag": snapshot.etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == snapshot.etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=snapshot.body, media_type="application/json", headers=headers)
 
 @app.post("/items/", response_model=schemas.Item)
-def create_item(item: schemas.ItemCreate, db: Session = Depends(get_db), current_user: schemas.Store = Depends(get_current_user)):
-    return crud.create_item(db=db, item=item, store_id=current_user.id)
+def create_item(item: schemas.ItemCreate, db: Session = Depends(get_store_db), current_user: schemas.StorePrincipal = Depends(get_current_user)):
+    try:
+        return crud.create_item(db=db, item=item, store_id=current_user.id)
+    except crud.DuplicateItemError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
 
 @app.put("/items/{item_id}", response_model=schemas.Item)
-def update_item(item_id: int, item: schemas.ItemCreate, db: Session = Depends(get_db), current_user: schemas.Store = Depends(get_current_user)):
-    db_item = crud.update_item(db=db, item_id=item_id, item=item)
+def update_item(item_id: int, item: schemas.ItemCreate, db: Session = Depends(get_store_db), current_user: schemas.StorePrincipal = Depends(get_current_user)):
+    try:
+        db_item = crud.update_item(db=db, item_id=item_id, item=item)
+    except crud.DuplicateItemError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
     if db_item is None:
         raise HTTPException(status_code=404, detail="Item not found")
     return db_item
 
-@app.post("/orders", response_model=schemas.Order)
-def create_order(order: schemas.OrderCreate, db: Session = Depends(get_db)):
-    return crud.create_order(db=db, order=order)
+@app.post("/items/import", response_model=schemas.MenuImportSummary)
+async def import_menu(request: Request, db: Session = Depends(get_db), current_user: schemas.StorePrincipal = Depends(get_current_user)):
+    # Streams a CSV/NDJSON body into batched upserts into the caller's own store's menu
+    try:
+        return await menu_import.import_menu(request.stream(), request.headers.get("content-type"), db, current_user.id)
+    except menu_import.UnsupportedFormatError as e:
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail=str(e))
+
+@app.post("/orders", response_model=schemas.Order, dependencies=[Depends(mark_client_write)])
+def create_order(order: schemas.OrderCreate, db: Session = Depends(get_db), current_user: Optional[schemas.StorePrincipal] = Depends(get_optional_user)):
+    try:
+        if sharding.router is None:
+            return crud.create_order(db=db, order=order)
+        if order.items:
+            # The shard is the one the ordered items were allocated on
+            shard_db = sharding.router.session_for_items(item.item_id for item in order.items)
+        else:
+            # An empty order (lines follow via POST /orders/{id}/items) opens on the kiosk's store's shard
+            shard_db = sharding.router.session_for_store(current_user.id if current_user is not None else None)
+        with shard_db:
+            return schemas.Order.model_validate(crud.create_order(db=shard_db, order=order))
+    except (pricing.UnknownPriceError, sharding.ShardRoutingError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/orders/batch", response_model=List[schemas.OrderBatchResult], dependencies=[Depends(mark_client_write)])
+def ingest_orders(batch: schemas.OrderBatch, db: Session = Depends(get_db)):
+    # Store-and-forward replay: orders a kiosk took offline, deduplicated on client_order_id
+    if sharding.router is None:
+        return crud.ingest_order_batch(db=db, orders=batch.orders)
+    try:
+        # A kiosk replays its own store's orders, so the whole batch lives on one shard
+        shard_db = sharding.router.session_for_items(item.item_id for order in batch.orders for item in order.items)
+    except sharding.ShardRoutingError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    with shard_db:
+        return crud.ingest_order_batch(db=shard_db, orders=batch.orders)
 
-@app.post("/orders/{order_id}/items", response_model=schemas.Order)
-def add_items(order_id: int, order_items: schemas.OrderAddItems, db: Session = Depends(get_db)):
-    db_order = crud.add_items_to_order(db=db, order_id=order_id, items=order_items.items)
+@app.post("/orders/{order_id}/items", response_model=schemas.Order, dependencies=[Depends(mark_client_write)])
+def add_items(order_id: int, order_items: schemas.OrderAddItems, db: Session = Depends(get_order_db)):
+    try:
+        db_order = crud.add_items_to_order(db=db, order_id=order_id, items=order_items.items)
+    except pricing.UnknownPriceError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if db_order is None:
         raise HTTPException(status_code=404, detail="Order not found")
     return db_order
 
-@app.post("/orders/{order_id}/checkout", response_model=schemas.Order)
-def checkout(order_id: int, checkout_data: schemas.OrderCheckout, db: Session = Depends(get_db)):
-    db_order = crud.checkout_order(db=db, order_id=order_id, payment_method=checkout_data.payment_method)
+@app.post("/orders/{order_id}/checkout", response_model=schemas.Order, dependencies=[Depends(mark_client_write)])
+def checkout(order_id: int, checkout_data: schemas.OrderCheckout, db: Session = Depends(get_order_db)):
+    try:
+        db_order = crud.checkout_order(db=db, order_id=order_id, payment_method=checkout_data.payment_method)
+    except crud.InsufficientStockError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail={"message": "Insufficient stock", "item_ids": e.item_ids})
     if db_order is None:
         raise HTTPException(status_code=404, detail="Order not found")
     return db_order
 
-@app.put("/orders/{order_id}/status", response_model=schemas.Order)
-def update_order_status(order_id: int, status_update: schemas.OrderStatusUpdate, db: Session = Depends(get_db), current_user: schemas.Store = Depends(get_current_user)):
+@app.put("/orders/{order_id}/status", response_model=schemas.Order, dependencies=[Depends(mark_client_write)])
+def update_order_status(order_id: int, status_update: schemas.OrderStatusUpdate, db: Session = Depends(get_order_db), current_user: schemas.StorePrincipal = Depends(get_current_user)):
     db_order = crud.update_order_status(db=db, order_id=order_id, status=status_update.status)
     if db_order is None:
         raise HTTPException(status_code=404, detail="Order not found")
     return db_order
 
+@app.get("/orders/history", response_model=List[schemas.Order])
+def read_order_history(start: Optional[datetime] = None, end: Optional[datetime] = None, store_id: Optional[int] = None, limit: int = 100, db: Session = Depends(get_read_db), current_user: schemas.StorePrincipal = Depends(get_current_user)):
+    # Live and archived orders created in [start, end), newest first
+    with sharding.fan_out(db, archive) as (api, source):
+        return api.get_order_history(source, start=start, end=end, store_id=store_id, limit=limit)
+
+@app.get("/orders/export")
+def export_orders(format: str = "ndjson", start: Optional[datetime] = None, end: Optional[datetime] = None, store_id: Optional[int] = None, db: Session = Depends(get_read_db), current_user: schemas.StorePrincipal = Depends(get_current_user)):
+    # One row per order line, streamed batch by batch instead of loaded up front like GET /orders
+    if format not in export.FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(export.FORMATS)}")
+    return StreamingResponse(
+        export.stream_export(db, format, start=start, end=end, store_id=store_id),
+        media_type=export.FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="orders.{format}"'},
+    )
+
 @app.get("/orders/{order_id}", response_model=schemas.Order)
-def read_order(order_id: int, db: Session = Depends(get_db)):
-    db_order = crud.get_order(db, order_id=order_id)
+def read_order(order_id: int, db: Session = Depends(get_order_db), read_db: Session = Depends(get_order_read_db)):
+    db_order = None
+    if not recent_writes.is_recent(("order", order_id)):
+        db_order = crud.get_order(read_db, order_id=order_id)
+    if db_order is None:
+        # Written moments ago, or created on another worker and not replicated yet
+        db_order = crud.get_order(db, order_id=order_id)
+    if db_order is None:
+        db_order = archive.get_archived_order(db, order_id=order_id)
     if db_order is None:
         raise HTTPException(status_code=404, detail="Order not found")
     return db_order
 
+@app.get("/stats")
+def read_stats():
+    # Cache and pool counters for monitoring
+    return {
+        "principal_cache": principal_cache.stats(),
+        "password_pool": auth.password_pool.stats(),
+        "menu_cache": menu_cache.stats(),
+        "idempotency_store": idempotency.idempotency_store.stats(),
+    }
+
+@metrics.registry.add_collector
+def _app_stats():
+    # The /stats counters, for scraping alongside the request metrics
+    for prefix, stats in (
+        ("password_pool", auth.password_pool.stats()),
+        ("principal_cache", principal_cache.stats()),
+        ("menu_cache", menu_cache.stats()),
+        ("idempotency_store", idempotency.idempotency_store.stats()),
+    ):
+        for key, value in stats.items():
+            yield (f"{prefix}_{key}", f"{prefix} {key} (see /stats).", "gauge", [({}, value)])
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def read_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/orders/{order_id}/events")
+async def order_events(order_id: int, db: Session = Depends(get_order_db)):
+    # Subscribe before reading the current state so no change can slip in between
+    subscription = events.broker.subscribe(order_id)
+
+    def load_initial_event():
+        try:
+            db_order = crud.get_order(db, order_id=order_id)
+            return events.order_event(db_order) if db_order else None
+        finally:
+            db.close() # Don't hold a pooled connection for the lifetime of the stream
+
+    initial = await run_in_threadpool(load_initial_event)
+    if initial is None:
+        subscription.close()
+        raise HTTPException(status_code=404, detail="Order not found")
+    return StreamingResponse(
+        events.stream_order_events(subscription, initial),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.get("/orders", response_model=List[schemas.Order])
-def read_orders(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    orders = crud.get_orders(db, skip=skip, limit=limit)
-    return orders
+def read_orders(skip: int = 0, limit: int = 100, cursor: Optional[str] = None, since: Optional[str] = None, db: Session = Depends(get_orders_read_db)):
+    # cursor: page to orders older than X-Next-Cursor
+    # since: only orders created or changed after X-Since-Cursor
+    try:
+        before = pagination.decode_cursor(cursor) if cursor else None
+        changed_since = pagination.decode_cursor(since) if since else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    headers = {}
+    with sharding.fan_out(db, crud) as (api, source):
+        if changed_since is not None:
+            orders = api.get_orders_changed_since(source, since=changed_since, limit=limit)
+            latest = (orders[-1].updated_at, orders[-1].id) if orders else changed_since
+        else:
+            # Latest change first, in the same transaction: an order written between the two
+            # queries is then after the since cursor instead of silently behind it
+            latest = api.get_latest_order_change(source)
+            orders = api.get_orders(source, skip=skip, limit=limit, before=before)
+            if len(orders) == limit:
+                headers["X-Next-Cursor"] = pagination.encode_cursor(orders[-1].created_at, orders[-1].id)
+
+        if latest is not None:
+            headers["X-Since-Cursor"] = pagination.encode_cursor(*latest)
+        # Encoded directly from the ORM rows instead of re-validating through response_model
+        return Response(content=serialization.render_orders(orders), media_type="application/json", headers=headers)
+
+@app.get("/analytics/sales/items", response_model=List[schemas.SalesItemRollup])
+def read_item_sales(store_id: Optional[int] = None, start: Optional[datetime] = None, end: Optional[datetime] = None, db: Session = Depends(get_db), current_user: schemas.StorePrincipal = Depends(get_current_user)):
+    # Reads only the hourly rollups, never the raw order tables
+    with sharding.fan_out(db, analytics) as (api, source):
+        return api.get_item_sales(source, store_id=store_id, start=start, end=end)
+
+@app.get("/analytics/sales/demographics", response_model=List[schemas.SalesDemographicRollup])
+def read_demographic_sales(store_id: Optional[int] = None, start: Optional[datetime] = None, end: Optional[datetime] = None, db: Session = Depends(get_db), current_user: schemas.StorePrincipal = Depends(get_current_user)):
+    with sharding.fan_out(db, analytics) as (api, source):
+        return api.get_demographic_sales(source, store_id=store_id, start=start, end=end)
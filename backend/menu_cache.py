@@ -0,0 +1,170 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from typing import Awaitable, Callable, Hashable, Iterable, Optional
+
+from .serialization import render_items
+
+MENU_CACHE_TTL = float(os.getenv("MENU_CACHE_TTL", 30))
+MENU_CACHE_SIZE = int(os.getenv("MENU_CACHE_SIZE", 4096))
+
+
+class MenuSnapshot:
+    """Pre-serialized GET /items response body for one store's menu version."""
+
+    __slots__ = ("versions", "expires_at", "body", "etag")
+
+    def __init__(self, versions: tuple, expires_at: float, body: bytes):
+        self.versions = versions
+        self.expires_at = expires_at
+        self.body = body
+        # Content hash keeps the ETag stable across workers with different version counters
+        self.etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+class MenuCache:
+    """Versioned, TTL + LRU in-process cache of serialized menu responses.
+
+    Snapshots are keyed by store: a menu write or a checkout only drops the
+    snapshots of the stores it touched, invalidate() without stores drops
+    all of them. Writes made by other workers are only seen once a snapshot
+    expires, after ttl seconds, as with pricing.PriceTable. Concurrent misses
+    for one key share a single load, and a snapshot built from a read that
+    raced with a write is never stored.
+    """
+
+    def __init__(self, ttl: float = MENU_CACHE_TTL, max_size: int = MENU_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._version = 0 # Bumped by every invalidation
+        self._generation = 0 # Bumped when every store is invalidated
+        self._store_versions = {}
+        self._snapshots = OrderedDict() # (store_id, key) -> MenuSnapshot
+        self._loading = {} # (store_id, key) -> [lock, users], one load per key at a time
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def get(self, key: Hashable, loader: Callable[[], list], store_id: Optional[int] = None) -> MenuSnapshot:
+        cache_key = (store_id, key)
+        snapshot = self._lookup(cache_key)
+        if snapshot is not None:
+            return snapshot
+        with self._single_flight(cache_key, threading.Lock):
+            # Loaded by the request this one waited for
+            snapshot = self._lookup(cache_key, count=False)
+            if snapshot is not None:
+                return snapshot
+            versions = self._versions(store_id)
+            return self._store(cache_key, versions, loader())
+
+    async def aget(self, key: Hashable, loader: Callable[[], Awaitable[list]], store_id: Optional[int] = None) -> MenuSnapshot:
+        cache_key = (store_id, key)
+        snapshot = self._lookup(cache_key)
+        if snapshot is not None:
+            return snapshot
+        async with self._async_single_flight(cache_key):
+            snapshot = self._lookup(cache_key, count=False)
+            if snapshot is not None:
+                return snapshot
+            versions = self._versions(store_id)
+            return self._store(cache_key, versions, await loader())
+
+    def _versions(self, store_id) -> tuple:
+        with self._lock:
+            return self._generation, self._store_versions.get(store_id, 0)
+
+    def _lookup(self, cache_key, count: bool = True) -> Optional[MenuSnapshot]:
+        with self._lock:
+            snapshot = self._snapshots.get(cache_key)
+            if snapshot is not None and snapshot.expires_at <= time.monotonic():
+                del self._snapshots[cache_key]
+                snapshot = None
+            if snapshot is not None:
+                self._snapshots.move_to_end(cache_key)
+                self.hits += count
+                return snapshot
+            self.misses += count
+        return None
+
+    def _store(self, cache_key, versions: tuple, items: list) -> MenuSnapshot:
+        snapshot = MenuSnapshot(versions, time.monotonic() + self.ttl, render_items(items))
+        with self._lock:
+            self.loads += 1
+            if versions == (self._generation, self._store_versions.get(cache_key[0], 0)):
+                self._snapshots[cache_key] = snapshot
+                self._snapshots.move_to_end(cache_key)
+                while len(self._snapshots) > self.max_size:
+                    self._snapshots.popitem(last=False)
+        return snapshot
+
+    def _flight(self, cache_key, lock_type):
+        with self._lock:
+            entry = self._loading.get(cache_key)
+            if entry is None:
+                entry = self._loading[cache_key] = [lock_type(), 0]
+            entry[1] += 1
+        return entry
+
+    def _land(self, cache_key, entry):
+        with self._lock:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._loading[cache_key]
+
+    @contextmanager
+    def _single_flight(self, cache_key, lock_type):
+        entry = self._flight(cache_key, lock_type)
+        try:
+            with entry[0]:
+                yield
+        finally:
+            self._land(cache_key, entry)
+
+    @asynccontextmanager
+    async def _async_single_flight(self, cache_key):
+        entry = self._flight(cache_key, asyncio.Lock)
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            self._land(cache_key, entry)
+
+    def invalidate(self, store_ids: Optional[Iterable[Optional[int]]] = None):
+        """Drop the snapshots of store_ids, or of every store when None."""
+        with self._lock:
+            self._version += 1
+            if store_ids is None:
+                self._generation += 1
+                self._store_versions.clear()
+                self._snapshots.clear()
+                return
+            store_ids = set(store_ids)
+            for store_id in store_ids:
+                self._store_versions[store_id] = self._store_versions.get(store_id, 0) + 1
+            for cache_key in [k for k in self._snapshots if k[0] in store_ids]:
+                del self._snapshots[cache_key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "version": self._version,
+                "size": len(self._snapshots),
+                "hits": self.hits,
+                "misses": self.misses,
+                "loads": self.loads,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+menu_cache = MenuCache()
@@ -0,0 +1,136 @@
+"""Bulk menu import: CSV or NDJSON rows streamed into batched upserts.
+
+Rows are parsed as the request body arrives and applied MENU_IMPORT_BATCH_SIZE
+at a time by crud.import_menu_rows, each batch in its own transaction. The
+menu and price caches are invalidated once, after the last batch. A kiosk
+only imports into its own store: rows naming another store are rejected.
+
+CSV has a header row naming MenuImportRow fields, one item per line; empty
+cells leave the field unchanged and `options` lists option names separated
+by "|". NDJSON has one MenuImportRow object per line.
+"""
+import codecs
+import csv
+import json
+import os
+from typing import AsyncIterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from . import crud, pricing, schemas, sharding
+from .database import recent_writes
+from .menu_cache import menu_cache
+
+MENU_IMPORT_BATCH_SIZE = int(os.getenv("MENU_IMPORT_BATCH_SIZE", 1000))
+MAX_REPORTED_ERRORS = 100
+CSV_OPTION_SEPARATOR = "|"
+FORMATS = {"text/csv": "csv", "application/x-ndjson": "ndjson", "application/jsonl": "ndjson"}
+
+
+class UnsupportedFormatError(Exception):
+    pass
+
+
+def import_format(content_type: Optional[str]) -> str:
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    if media_type not in FORMATS:
+        raise UnsupportedFormatError(f"Send text/csv or application/x-ndjson, not {media_type or 'no content type'}")
+    return FORMATS[media_type]
+
+
+async def _lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+def _csv_row(header: List[str], line: str) -> dict:
+    values = next(csv.reader([line]))
+    row = {name: value for name, value in zip(header, values) if value != ""}
+    if "options" in row:
+        row["options"] = [name.strip() for name in row["options"].split(CSV_OPTION_SEPARATOR) if name.strip()]
+    return row
+
+
+class _Parser:
+    def __init__(self, fmt: str):
+        self.format = fmt
+        self.header = None
+
+    def parse(self, line: str) -> Optional[dict]:
+        """The line's raw row, None for blank lines and the CSV header."""
+        if not line.strip():
+            return None
+        if self.format == "ndjson":
+            return json.loads(line)
+        if self.header is None:
+            self.header = [name.strip() for name in next(csv.reader([line]))]
+            return None
+        return _csv_row(self.header, line)
+
+
+def _apply(db: Session, batch: List[Tuple[int, schemas.MenuImportRow]], default_store_id: int):
+    if sharding.router is None:
+        return crud.import_menu_rows(db, batch, default_store_id)
+    # Rows only ever name the importing store, so the batch lives on its shard
+    with sharding.router.session_for_store(default_store_id) as shard_db:
+        return crud.import_menu_rows(shard_db, batch, default_store_id)
+
+
+async def import_menu(
+    chunks: AsyncIterator[bytes], content_type: Optional[str], db: Session, default_store_id: int
+) -> schemas.MenuImportSummary:
+    parser = _Parser(import_format(content_type))
+    summary = schemas.MenuImportSummary()
+    errors = []
+    batch = []
+
+    async def flush():
+        created, updated, batch_errors = await run_in_threadpool(_apply, db, batch, default_store_id)
+        summary.created += created
+        summary.updated += updated
+        errors.extend(batch_errors)
+        batch.clear()
+
+    line_number = 0
+    async for line in _lines(chunks):
+        line_number += 1
+        try:
+            raw = parser.parse(line)
+            if raw is None:
+                continue
+            row = schemas.MenuImportRow.model_validate(raw)
+        except ValidationError as e:
+            summary.rows += 1
+            errors.append((line_number, "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())))
+            continue
+        except (ValueError, csv.Error) as e:
+            summary.rows += 1
+            errors.append((line_number, str(e)))
+            continue
+        summary.rows += 1
+        batch.append((line_number, row))
+        if len(batch) >= MENU_IMPORT_BATCH_SIZE:
+            await flush()
+    if batch:
+        await flush()
+
+    if summary.created or summary.updated:
+        # Once for the whole import, not per item, and only the importing store's menu
+        menu_cache.invalidate([default_store_id])
+        pricing.price_table.invalidate()
+        recent_writes.mark("menu")
+    summary.rejected = len(errors)
+    summary.errors = [
+        schemas.MenuImportError(line=line, detail=detail) for line, detail in sorted(errors)[:MAX_REPORTED_ERRORS]
+    ]
+    return summary
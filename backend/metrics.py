@@ -0,0 +1,340 @@
+"""Request and database metrics in Prometheus text format.
+
+MetricsMiddleware times every HTTP request by route template. SQL time and
+query counts come from cursor events and are charged to the request running
+them through a context variable, which FastAPI copies into the threadpool for
+sync endpoints. Pool checkout wait is timed by the pool class database.py builds engines with.
+
+Recording is a dict lookup and a few additions under a lock, so it is cheap
+enough to leave on; the exposition text is only built when /metrics is
+scraped.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+UNMATCHED_ROUTE = "<unmatched>"
+EXCLUDED_PATHS = ("/metrics",)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, labels: Tuple = (), amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels: Tuple = ()) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labels, labels)} {_format_value(value)}" for labels, value in values
+        ]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._values: Dict[Tuple, list] = {}
+
+    def observe(self, labels: Tuple, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def count(self, labels: Tuple = ()) -> int:
+        entry = self._values.get(labels)
+        return entry[2] if entry else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted((labels, (list(e[0]), e[1], e[2])) for labels, e in self._values.items())
+        lines = self.header()
+        names = self.labels + ("le",)
+        for labels, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(names, labels + (_format_value(bound),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, labels)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Metric] = []
+        # Called at scrape time; each returns (name, help, kind, [(labels dict, value)])
+        self.collectors: List[Callable[[], Iterable[Tuple[str, str, str, list]]]] = []
+
+    def counter(self, *args, **kwargs) -> Counter:
+        metric = Counter(*args, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        metric = Histogram(*args, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+        return collector
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for collector in self.collectors:
+            for name, help, kind, samples in collector():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    names = tuple(labels)
+                    lines.append(f"{name}{_format_labels(names, tuple(labels[n] for n in names))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUESTS = registry.counter("http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+LATENCY = registry.histogram("http_request_duration_seconds", "HTTP request latency.", ("method", "route"))
+REQUEST_DB_TIME = registry.histogram(
+    "http_request_db_seconds", "Time spent in SQL per request.", ("method", "route"), buckets=DB_BUCKETS
+)
+REQUEST_QUERIES = registry.counter("http_request_db_queries_total", "SQL statements run by requests.", ("method", "route"))
+QUERIES = registry.counter("db_queries_total", "SQL statements executed.", ("db",))
+QUERY_TIME = registry.counter("db_query_seconds_total", "Time spent executing SQL.", ("db",))
+CHECKOUTS = registry.counter("db_pool_checkouts_total", "Connections checked out of the pool.", ("db",))
+CHECKOUT_WAIT = registry.histogram(
+    "db_pool_checkout_wait_seconds", "Time to get a connection from the pool.", ("db",), buckets=DB_BUCKETS
+)
+
+
+class RequestStats:
+    __slots__ = ("scope", "db_seconds", "queries")
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.db_seconds = 0.0
+        self.queries = 0
+
+
+_current_request: ContextVar[Optional[RequestStats]] = ContextVar("metrics_request", default=None)
+_active_requests: Dict[int, RequestStats] = {}
+
+
+def route_label(scope) -> str:
+    # The router stores the matched route in the scope; templates keep the label set bounded
+    route = scope.get("route")
+    return getattr(route, "path", None) or UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: no per-request task or body buffering."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in EXCLUDED_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope)
+        token = _current_request.set(stats)
+        _active_requests[id(stats)] = stats
+        status_code = 500 # If the app raises before responding
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            _active_requests.pop(id(stats), None)
+            _current_request.reset(token)
+            labels = (scope["method"], route_label(scope))
+            REQUESTS.inc(labels + (str(status_code),))
+            LATENCY.observe(labels, elapsed)
+            REQUEST_DB_TIME.observe(labels, stats.db_seconds)
+            if stats.queries:
+                REQUEST_QUERIES.inc(labels, stats.queries)
+
+
+@registry.add_collector
+def _in_flight():
+    counts: Dict[Tuple[str, str], int] = {}
+    for stats in list(_active_requests.values()):
+        key = (stats.scope["method"], route_label(stats.scope))
+        counts[key] = counts.get(key, 0) + 1
+    yield (
+        "http_requests_in_flight", "Requests currently being served.", "gauge",
+        [({"method": method, "route": route}, count) for (method, route), count in sorted(counts.items())],
+    )
+
+
+# Engine instrumentation
+
+_pools: List[Tuple[str, object]] = [] # (label, engine); labels may repeat
+
+class _TimedCheckout:
+    """Mixed into a pool class to time each checkout, waits included."""
+
+    metrics_label = "db"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            CHECKOUT_WAIT.observe((self.metrics_label,), time.perf_counter() - start)
+
+
+def engine_label(engine_or_url) -> str:
+    """Fallback label for engines created without a role: host:port/database, or the SQLite path."""
+    url = getattr(engine_or_url, "url", engine_or_url)
+    database = url.database
+    if not database or database == ":memory:":
+        return "memory"
+    if url.host:
+        return f"{url.host}:{url.port}/{database}" if url.port else f"{url.host}/{database}"
+    return os.path.abspath(database)
+
+
+def timed_pool_class(pool_class, label: str):
+    # Passed as poolclass: a subclass (not a wrapper) so pools recreated by dispose() keep the timing
+    return type(f"Timed{pool_class.__name__}", (_TimedCheckout, pool_class), {"metrics_label": label})
+
+
+def instrument_engine(engine, label: str = None):
+    """Record query counts/time and pool checkouts for engine."""
+    label = label or engine_label(engine)
+    if any(known is engine and known_label == label for known_label, known in _pools):
+        return engine
+    _pools.append((label, engine))
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._metrics_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_metrics_start", None)
+        elapsed = time.perf_counter() - started if started is not None else 0.0
+        QUERIES.inc((label,))
+        QUERY_TIME.inc((label,), elapsed)
+        stats = _current_request.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_seconds += elapsed
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        CHECKOUTS.inc((label,))
+
+    return engine
+
+
+@registry.add_collector
+def _pool_status():
+    counts = {}
+    for label, engine in _pools:
+        count = getattr(engine.pool, "checkedout", None)
+        if count is not None:
+            counts[label] = counts.get(label, 0) + count()
+    checked_out = [({"db": label}, count) for label, count in sorted(counts.items())]
+    yield ("db_pool_checked_out", "Connections currently checked out.", "gauge", checked_out)
+
+
+class QueryCounter:
+    """Records the statements run on an engine inside a with block.
+
+        with QueryCounter(engine) as queries:
+            crud.get_orders(db)
+        assert queries.count <= 4, queries.statements
+
+    executemany batches count once, as they reach the database as one call.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements: List[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        self.statements = []
+        event.listen(self.engine, "before_cursor_execute", self._record)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._record)
+        return False
+
+
+def render() -> str:
+    return registry.render()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Enum
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
@@ -15,12 +15,21 @@ class Item(Base):
     name = Column(String, index=True)
     price = Column(Integer)
     image_url = Column(String, nullable=True)
-    category = Column(String, nullable=True, index=True)
+    category = Column(String, nullable=True)
     stock = Column(Integer, default=10) # Default stock for existing items
     store_id = Column(Integer, ForeignKey("stores.id"))
     
     store = relationship("Store")
 
+    # One item per name on a store's menu (fix_duplicates.py merges older copies).
+    # GET /items reads one store's menu, optionally one category, in id order.
+    # AUTOINCREMENT lets sharding.py start each shard's ids in its own range
+    __table_args__ = (
+        Index("uq_items_store_id_name", "store_id", "name", unique=True),
+        Index("ix_items_store_id_category_id", "store_id", "category", "id"),
+        {"sqlite_autoincrement": True},
+    )
+
 class Store(Base):
     __tablename__ = "stores"
 
@@ -35,13 +44,24 @@ class Order(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     status = Column(String, default=OrderStatus.PENDING)
     payment_method = Column(String, nullable=True)
     age_group = Column(String, nullable=True)
     gender = Column(String, nullable=True)
+    total = Column(Integer, default=0) # Sum of line_total, set by pricing.py
+    store_id = Column(Integer, nullable=True, index=True) # Shard key; no FK so orders can live apart from stores
+    client_order_id = Column(String, nullable=True, unique=True, index=True) # Kiosk-generated, for offline replays
     
     items = relationship("OrderItem", back_populates="order")
 
+    # Keyset pagination for the admin feed: newest first, and changes since a cursor
+    __table_args__ = (
+        Index("ix_orders_created_at_id", "created_at", "id"),
+        Index("ix_orders_updated_at_id", "updated_at", "id"),
+        {"sqlite_autoincrement": True},
+    )
+
 class OrderItem(Base):
     __tablename__ = "order_items"
 
@@ -49,16 +69,20 @@ class OrderItem(Base):
     order_id = Column(Integer, ForeignKey("orders.id"))
     item_id = Column(Integer, ForeignKey("items.id"))
     quantity = Column(Integer)
+    unit_price = Column(Integer, nullable=True) # Item price + option adjustments at order time
+    line_total = Column(Integer, nullable=True) # unit_price * quantity
 
     order = relationship("Order", back_populates="items")
     item = relationship("Item")
     options = relationship("Option", secondary="order_item_options")
 
+    __table_args__ = {"sqlite_autoincrement": True}
+
 class Option(Base):
     __tablename__ = "options"
 
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, index=True)
+    name = Column(String, unique=True, index=True)
     price_adjustment = Column(Integer) # Can be negative for discounts
 
 class ItemOption(Base):
@@ -93,3 +117,45 @@ class City(Base):
 
 # Add relationship to Item
 Item.options = relationship("Option", secondary="item_options")
+
+
+# Sales rollups maintained incrementally at checkout (see analytics.py)
+class SalesItemHourly(Base):
+    __tablename__ = "sales_item_hourly"
+
+    store_id = Column(Integer, primary_key=True)
+    item_id = Column(Integer, primary_key=True)
+    hour = Column(DateTime, primary_key=True)
+    quantity = Column(Integer, default=0, nullable=False)
+    revenue = Column(Integer, default=0, nullable=False)
+
+class SalesDemographicHourly(Base):
+    __tablename__ = "sales_demographic_hourly"
+
+    store_id = Column(Integer, primary_key=True)
+    hour = Column(DateTime, primary_key=True)
+    age_group = Column(String, primary_key=True) # "unknown" when not captured
+    gender = Column(String, primary_key=True)
+    orders = Column(Integer, default=0, nullable=False)
+    quantity = Column(Integer, default=0, nullable=False)
+    revenue = Column(Integer, default=0, nullable=False)
+
+
+# Catalog of archived order segments (see archive.py)
+class OrderArchiveSegment(Base):
+    __tablename__ = "order_archive_segments"
+
+    id = Column(Integer, primary_key=True, index=True)
+    path = Column(String, unique=True, nullable=False) # File name under ARCHIVE_DIR
+    first_order_id = Column(Integer, nullable=False)
+    last_order_id = Column(Integer, nullable=False)
+    first_created_at = Column(DateTime, nullable=False)
+    last_created_at = Column(DateTime, nullable=False)
+    order_count = Column(Integer, nullable=False)
+    line_count = Column(Integer, nullable=False)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_order_archive_segments_order_ids", "first_order_id", "last_order_id"),
+        Index("ix_order_archive_segments_created_at", "last_created_at", "first_created_at"),
+    )
@@ -0,0 +1,102 @@
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy.orm import Session
+
+from . import models, schemas
+
+# Bounds how long another worker's price change can go unnoticed
+PRICE_CACHE_TTL = float(os.getenv("PRICE_CACHE_TTL", 30))
+
+
+class UnknownPriceError(Exception):
+    def __init__(self, item_ids: List[int] = (), option_ids: List[int] = ()):
+        self.item_ids = list(item_ids)
+        self.option_ids = list(option_ids)
+        super().__init__(f"Unknown items {self.item_ids} / options {self.option_ids}")
+
+
+class PriceTable:
+    """Read-through cache of item prices and option adjustments.
+
+    Only the ids an order actually references are loaded, one query per kind,
+    so the table never holds more than the working set of the chain's menus.
+    """
+
+    def __init__(self, ttl: float = PRICE_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._items: Dict[int, Tuple[float, int]] = {}
+        self._options: Dict[int, Tuple[float, int]] = {}
+
+    def item_prices(self, db: Session, item_ids: Iterable[int]) -> Dict[int, int]:
+        return self._get(db, self._items, models.Item.id, models.Item.price, item_ids)
+
+    def option_adjustments(self, db: Session, option_ids: Iterable[int]) -> Dict[int, int]:
+        return self._get(db, self._options, models.Option.id, models.Option.price_adjustment, option_ids)
+
+    def _get(self, db: Session, entries, id_column, price_column, ids: Iterable[int]) -> Dict[int, int]:
+        now = time.monotonic()
+        found, missing = {}, set()
+        with self._lock:
+            for key in set(ids):
+                entry = entries.get(key)
+                if entry is not None and entry[0] > now:
+                    found[key] = entry[1]
+                else:
+                    missing.add(key)
+        if missing:
+            rows = db.query(id_column, price_column).filter(id_column.in_(missing)).all()
+            with self._lock:
+                for key, price in rows:
+                    price = price or 0
+                    entries[key] = (now + self.ttl, price)
+                    found[key] = price
+        return found
+
+    def invalidate(self):
+        with self._lock:
+            self._items.clear()
+            self._options.clear()
+
+
+price_table = PriceTable()
+
+
+def _price(items: List[schemas.OrderItemCreate], item_prices, option_prices) -> List[Tuple[int, int]]:
+    unknown_items = sorted({item.item_id for item in items} - item_prices.keys())
+    unknown_options = sorted({o for item in items for o in item.option_ids} - option_prices.keys())
+    if unknown_items or unknown_options:
+        raise UnknownPriceError(unknown_items, unknown_options)
+
+    lines = []
+    for item in items:
+        unit_price = item_prices[item.item_id] + sum(option_prices[o] for o in item.option_ids)
+        lines.append((unit_price, unit_price * item.quantity))
+    return lines
+
+
+def price_lines(db: Session, items: List[schemas.OrderItemCreate]) -> List[Tuple[int, int]]:
+    """Return (unit_price, line_total) for each requested line, options included."""
+    item_prices = price_table.item_prices(db, (item.item_id for item in items))
+    option_prices = price_table.option_adjustments(db, (o for item in items for o in item.option_ids))
+    return _price(items, item_prices, option_prices)
+
+
+def price_orders(db: Session, carts: List[List[schemas.OrderItemCreate]]) -> list:
+    """price_lines for many orders with one lookup per kind.
+
+    Each entry is the order's lines, or the UnknownPriceError pricing it raised.
+    """
+    lines = [item for cart in carts for item in cart]
+    item_prices = price_table.item_prices(db, (item.item_id for item in lines))
+    option_prices = price_table.option_adjustments(db, (o for item in lines for o in item.option_ids))
+    priced = []
+    for cart in carts:
+        try:
+            priced.append(_price(cart, item_prices, option_prices))
+        except UnknownPriceError as e:
+            priced.append(e)
+    return priced
@@ -0,0 +1,96 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy import event, inspect
+
+from . import models, schemas
+
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", 60))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", 4096))
+
+
+class PrincipalCache:
+    """TTL + LRU cache of authenticated store principals keyed by the token's `sub`."""
+
+    def __init__(self, ttl: float = PRINCIPAL_CACHE_TTL, max_size: int = PRINCIPAL_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict() # code -> (expires_at, principal)
+        self.hits = 0
+        self.misses = 0
+        self.token_hits = 0
+
+    def get_or_load(self, code: str, loader: Callable[[], Optional[models.Store]]) -> Optional[schemas.StorePrincipal]:
+        principal = self._lookup(code)
+        if principal is not None:
+            return principal
+        return self._store(code, loader())
+
+    async def aget_or_load(self, code: str, loader: Callable[[], Awaitable[Optional[models.Store]]]) -> Optional[schemas.StorePrincipal]:
+        principal = self._lookup(code)
+        if principal is not None:
+            return principal
+        return self._store(code, await loader())
+
+    def _lookup(self, code: str) -> Optional[schemas.StorePrincipal]:
+        with self._lock:
+            entry = self._entries.get(code)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(code)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        return None
+
+    def _store(self, code: str, store: Optional[models.Store]) -> Optional[schemas.StorePrincipal]:
+        if store is None:
+            return None # Unknown codes are not cached
+        principal = schemas.StorePrincipal.model_validate(store)
+        with self._lock:
+            self._entries[code] = (time.monotonic() + self.ttl, principal)
+            self._entries.move_to_end(code)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return principal
+
+    def record_token_hit(self):
+        # Principal taken straight from the token claims, no cache or DB needed
+        with self._lock:
+            self.token_hits += 1
+
+    def invalidate(self, code: str):
+        with self._lock:
+            self._entries.pop(code, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.token_hits = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses + self.token_hits
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "token_hits": self.token_hits,
+                "hit_ratio": round((self.hits + self.token_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+
+principal_cache = PrincipalCache()
+
+
+@event.listens_for(models.Store, "after_update")
+@event.listens_for(models.Store, "after_delete")
+def _invalidate_store(mapper, connection, target):
+    # Any ORM write to a store (password, code, deletion) drops its cached principal,
+    # under both the current and, if it was renamed, the previous code
+    principal_cache.invalidate(target.code)
+    for previous_code in inspect(target).attrs.code.history.deleted:
+        principal_cache.invalidate(previous_code)
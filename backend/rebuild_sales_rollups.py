@@ -0,0 +1,22 @@
+from backend.database import SessionLocal, engine
+from backend.models import Base
+from backend import analytics
+
+# Create tables if they don't exist
+Base.metadata.create_all(bind=engine)
+
+def rebuild_sales_rollups():
+    db = SessionLocal()
+    try:
+        print("Rebuilding sales rollups from checked-out orders...")
+        item_buckets, demographic_buckets = analytics.rebuild(db)
+        print(f"Item/hour buckets: {item_buckets}")
+        print(f"Demographic/hour buckets: {demographic_buckets}")
+    except Exception as e:
+        print(f"Error during rebuild: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    rebuild_sales_rollups()
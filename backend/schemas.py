@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 from datetime import datetime
 from pydantic import BaseModel
@@ -9,6 +9,7 @@ class Token(BaseModel):
 
 class TokenData(BaseModel):
     username: str | None = None
+    store_id: int | None = None
 
 class StoreBase(BaseModel):
     name: str
@@ -22,6 +23,15 @@ class Store(StoreBase):
     class Config:
         from_attributes = True
 
+class StorePrincipal(BaseModel):
+    # What get_current_user hands to routes; name is absent when built from token claims
+    id: int
+    code: str
+    name: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
 class OptionBase(BaseModel):
     name: str
     price_adjustment: int
@@ -52,16 +62,42 @@ class Item(ItemBase):
     class Config:
         from_attributes = True
 
+class MenuImportRow(BaseModel):
+    # Identified by (store, name); fields left out are not changed on existing items
+    name: str
+    store_code: Optional[str] = None # Must be the importing store; the importing store when omitted
+    price: Optional[int] = None # Required for new items
+    category: Optional[str] = None
+    stock: Optional[int] = None
+    image_url: Optional[str] = None
+    options: Optional[List[str]] = None # Option names; replaces the item's options when given
+
+class MenuImportError(BaseModel):
+    line: int
+    detail: str
+
+class MenuImportSummary(BaseModel):
+    rows: int = 0
+    created: int = 0
+    updated: int = 0
+    rejected: int = 0
+    errors: List[MenuImportError] = []
+
 class OrderItemBase(BaseModel):
     item_id: int
     quantity: int
 
 class OrderItemCreate(OrderItemBase):
+    # Every way lines come in (orders, added items, offline batches, async routes).
+    # A zero or negative line would put stock back at checkout and price below zero
+    quantity: int = Field(gt=0)
     option_ids: List[int] = []
 
 class OrderItem(OrderItemBase):
     id: int
     order_id: int
+    unit_price: Optional[int] = None
+    line_total: Optional[int] = None
     item: Item
     options: List[Option] = []
 
@@ -76,6 +112,23 @@ class OrderCreate(OrderBase):
     age_group: Optional[str] = None
     gender: Optional[str] = None
 
+class OfflineOrder(OrderCreate):
+    # Taken while the kiosk was offline and replayed later with POST /orders/batch
+    client_order_id: str
+    created_at: datetime
+    payment_method: Optional[str] = None
+
+MAX_ORDER_BATCH = 500
+
+class OrderBatch(BaseModel):
+    orders: List[OfflineOrder] = Field(max_length=MAX_ORDER_BATCH)
+
+class OrderBatchResult(BaseModel):
+    client_order_id: str
+    result: str # "created", "duplicate" or "rejected"
+    order_id: Optional[int] = None
+    detail: Optional[str] = None
+
 class OrderCheckout(BaseModel):
     payment_method: str
 
@@ -92,7 +145,32 @@ class Order(OrderBase):
     payment_method: Optional[str] = None
     age_group: Optional[str] = None
     gender: Optional[str] = None
+    total: Optional[int] = None
+    store_id: Optional[int] = None
+    client_order_id: Optional[str] = None
     items: List[OrderItem] = []
 
     class Config:
         from_attributes = True
+
+class SalesItemRollup(BaseModel):
+    store_id: int
+    item_id: int
+    hour: datetime
+    quantity: int
+    revenue: int
+
+    class Config:
+        from_attributes = True
+
+class SalesDemographicRollup(BaseModel):
+    store_id: int
+    hour: datetime
+    age_group: str
+    gender: str
+    orders: int
+    quantity: int
+    revenue: int
+
+    class Config:
+        from_attributes = True
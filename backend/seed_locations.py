@@ -1,51 +1,47 @@
-import httpx
+import json
+import os
+import sys
+
 from sqlalchemy.orm import Session
+from backend import bulk_load
 from backend.database import SessionLocal, engine
 from backend.models import Base, Prefecture, City
 
 # Create tables if they don't exist
 Base.metadata.create_all(bind=engine)
 
-def seed_locations():
+# {prefecture: [city, ...]} as published by Geolonia; download once, then seed offline
+DATASET_URL = "https://geolonia.github.io/japanese-addresses/api/ja.json"
+LOCATIONS_FILE = os.getenv("LOCATIONS_FILE", os.path.join(os.path.dirname(__file__), "data", "ja.json"))
+
+def load_locations(db: Session, data: dict):
+    """Insert the prefectures and cities of data that are missing, set-based. Doesn't commit."""
+    prefectures = bulk_load.load_missing(
+        db, Prefecture, ({"name": name} for name in data), ["name"], conflict_columns=["name"]
+    )
+    prefecture_ids = {name: pref_id for (name,), pref_id in bulk_load.key_map(db, Prefecture, ["name"]).items()}
+    cities = bulk_load.load_missing(
+        db, City,
+        ({"name": city, "prefecture_id": prefecture_ids[pref]} for pref, names in data.items() for city in names),
+        ["prefecture_id", "name"],
+    )
+    return prefectures, cities
+
+def seed_locations(path: str = LOCATIONS_FILE):
+    if not os.path.exists(path):
+        sys.exit(f"{path} not found. Download it once with:\n  curl --create-dirs -o {path} {DATASET_URL}")
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+
     db = SessionLocal()
     try:
-        # Check if data already exists
-        if db.query(Prefecture).count() > 0:
-            print("Prefectures already seeded. Skipping.")
-            return
-
-        print("Fetching data from Geolonia...")
-        url = "https://geolonia.github.io/japanese-addresses/api/ja.json"
-        response = httpx.get(url)
-        response.raise_for_status()
-        data = response.json()
-
-        print("Data fetched. Processing...")
-        
-        for pref_name, cities in data.items():
-            # Prefecture processing
-            pref = db.query(Prefecture).filter(Prefecture.name == pref_name).first()
-            if not pref:
-                pref = Prefecture(name=pref_name)
-                db.add(pref)
-                db.flush() # Insert and get ID
-                print(f"Added Prefecture: {pref_name}")
-
-            # City processing
-            for city_name in cities:
-                existing_city = db.query(City).filter(City.name == city_name, City.prefecture_id == pref.id).first()
-                if not existing_city:
-                    city = City(name=city_name, prefecture_id=pref.id)
-                    db.add(city)
-        
+        prefectures, cities = load_locations(db, data)
         db.commit()
-        print("Seeding completed successfully!")
+        print(f"Seeding completed: {prefectures} prefectures and {cities} cities added.")
 
         # Verification
-        pref_count = db.query(Prefecture).count()
-        city_count = db.query(City).count()
-        print(f"Total Prefectures: {pref_count}")
-        print(f"Total Cities: {city_count}")
+        print(f"Total Prefectures: {db.query(Prefecture).count()}")
+        print(f"Total Cities: {db.query(City).count()}")
 
     except Exception as e:
         print(f"Error during seeding: {e}")
@@ -54,4 +50,4 @@ def seed_locations():
         db.close()
 
 if __name__ == "__main__":
-    seed_locations()
+    seed_locations(*sys.argv[1:])
@@ -0,0 +1,71 @@
+import json
+from datetime import datetime
+from operator import attrgetter
+from typing import Callable, Dict, Iterable, Tuple
+
+try:
+    import orjson
+except ImportError: # pragma: no cover - optional speedup
+    orjson = None
+
+from . import schemas
+
+# Fast path for list endpoints: ORM rows are turned straight into dicts by
+# adapters generated from the response schemas, then encoded in one call.
+# This skips the per-object pydantic validation FastAPI runs for response_model
+# while producing the same JSON.
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(payload) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+def build_adapter(schema, nested: Dict[str, Tuple[Callable, bool]] = None) -> Callable:
+    """Return obj -> dict for a from_attributes schema.
+
+    nested maps a field name to (adapter, is_list) for relationship fields;
+    every other schema field is copied as a plain attribute.
+    """
+    nested = nested or {}
+    scalar_fields = tuple(name for name in schema.model_fields if name not in nested)
+    getter = attrgetter(*scalar_fields)
+    single = len(scalar_fields) == 1
+    nested_fields = tuple((name, adapter, is_list) for name, (adapter, is_list) in nested.items())
+
+    def adapt(obj) -> dict:
+        values = getter(obj)
+        data = dict(zip(scalar_fields, (values,) if single else values))
+        for name, adapter, is_list in nested_fields:
+            value = getattr(obj, name)
+            if is_list:
+                data[name] = [adapter(v) for v in value] if value is not None else []
+            else:
+                data[name] = adapter(value) if value is not None else None
+        return data
+
+    return adapt
+
+
+option_to_dict = build_adapter(schemas.Option)
+item_to_dict = build_adapter(schemas.Item, {"options": (option_to_dict, True)})
+order_item_to_dict = build_adapter(schemas.OrderItem, {
+    "item": (item_to_dict, False),
+    "options": (option_to_dict, True),
+})
+order_to_dict = build_adapter(schemas.Order, {"items": (order_item_to_dict, True)})
+
+
+def render_items(items: Iterable) -> bytes:
+    return dumps([item_to_dict(item) for item in items])
+
+
+def render_orders(orders: Iterable) -> bytes:
+    return dumps([order_to_dict(order) for order in orders])
@@ -0,0 +1,205 @@
+"""Store-keyed sharding.
+
+Each shard is a complete database holding the items and orders of the stores
+mapped to it (store_id % shard count), so an order, its lines, its items'
+stock and its sales rollups are always written on one shard. Ids of items,
+orders and order lines are allocated from a per-shard range, which lets any
+id be routed without a lookup table: a kiosk only knows item and order ids.
+
+The stores and options tables are reference data: the primary database stays
+authoritative (logins read it) and copy_reference_data pushes them to every
+shard.
+
+HQ-wide reads fan out to every shard concurrently and merge the results. The
+ShardRouter read methods mirror the crud/analytics/archive functions of the same name
+but take the list of shard sessions in place of a single session.
+"""
+import heapq
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import chain, islice
+from typing import Iterable, List, Optional
+
+from sqlalchemy import select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, sessionmaker
+
+from . import analytics, archive, crud, models
+from .database import Base, create_db_engine
+from .pagination import Cursor
+
+# Comma separated, shard 0 first. Unset: no sharding, everything uses DATABASE_URL
+DATABASE_SHARD_URLS = [url.strip() for url in os.getenv("DATABASE_SHARD_URLS", "").split(",") if url.strip()]
+# Shard n allocates ids from n * ID_STRIDE; stays below 2**53 for JSON clients
+ID_STRIDE = 10**9
+SHARDED_ID_TABLES = ("items", "orders", "order_items")
+REFERENCE_MODELS = (models.Store, models.Option)
+
+
+class ShardRoutingError(Exception):
+    pass
+
+
+def _reserve_id_range(engine, index: int):
+    # Only for shards that haven't allocated anything yet: existing ids stay put
+    start = index * ID_STRIDE
+    if start == 0:
+        return
+    with engine.begin() as conn:
+        for table in SHARDED_ID_TABLES:
+            if conn.execute(text(f"SELECT max(id) FROM {table}")).scalar() is not None:
+                continue
+            if engine.dialect.name == "sqlite":
+                conn.execute(text("DELETE FROM sqlite_sequence WHERE name = :name"), {"name": table})
+                conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :seq)"), {"name": table, "seq": start})
+            elif engine.dialect.name == "postgresql":
+                conn.execute(text("SELECT setval(pg_get_serial_sequence(:name, 'id'), :seq)"), {"name": table, "seq": start})
+
+
+class ShardRouter:
+    def __init__(self, engines):
+        self.engines = list(engines)
+        if not self.engines:
+            raise ValueError("ShardRouter needs at least one engine")
+        self._sessionmakers = [sessionmaker(autocommit=False, autoflush=False, bind=engine) for engine in self.engines]
+        # One thread per shard for scatter-gather reads
+        self._pool = ThreadPoolExecutor(max_workers=len(self.engines), thread_name_prefix="shard")
+
+    @classmethod
+    def from_urls(cls, urls: Iterable[str]):
+        return cls(create_db_engine(url, label=f"shard-{index}") for index, url in enumerate(urls))
+
+    def __len__(self):
+        return len(self.engines)
+
+    def create_all(self):
+        for index, engine in enumerate(self.engines):
+            Base.metadata.create_all(bind=engine)
+            _reserve_id_range(engine, index)
+
+    def copy_reference_data(self, source: Session):
+        """Upsert stores and options from the primary into every shard."""
+        for model in REFERENCE_MODELS:
+            table = model.__table__
+            rows = [dict(row) for row in source.execute(select(table)).mappings()]
+            if not rows:
+                continue
+            for engine in self.engines:
+                dialect_insert = postgresql.insert if engine.dialect.name == "postgresql" else sqlite.insert
+                stmt = dialect_insert(table)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=["id"],
+                    set_={column.name: stmt.excluded[column.name] for column in table.columns if not column.primary_key},
+                )
+                with engine.begin() as conn:
+                    conn.execute(stmt, rows)
+
+    # Routing
+
+    def shard_for_store(self, store_id: Optional[int]) -> int:
+        return (store_id or 0) % len(self.engines)
+
+    def shard_for_id(self, row_id: int) -> int:
+        index = row_id // ID_STRIDE
+        if not 0 <= index < len(self.engines):
+            raise ShardRoutingError(f"Id {row_id} belongs to no configured shard")
+        return index
+
+    def shard_for_items(self, item_ids: Iterable[int]) -> int:
+        indexes = {self.shard_for_id(item_id) for item_id in item_ids}
+        if len(indexes) != 1:
+            raise ShardRoutingError("An order's items must all come from one store")
+        return indexes.pop()
+
+    def session(self, index: int) -> Session:
+        return self._sessionmakers[index]()
+
+    def session_for_store(self, store_id: Optional[int]) -> Session:
+        return self.session(self.shard_for_store(store_id))
+
+    def session_for_id(self, row_id: int) -> Session:
+        return self.session(self.shard_for_id(row_id))
+
+    def session_for_items(self, item_ids: Iterable[int]) -> Session:
+        return self.session(self.shard_for_items(item_ids))
+
+    @contextmanager
+    def sessions(self):
+        # Sessions connect lazily, so opening one per shard is free until queried
+        sessions = [factory() for factory in self._sessionmakers]
+        try:
+            yield sessions
+        finally:
+            for session in sessions:
+                session.close()
+
+    def scatter(self, sessions: List[Session], fn, *args, **kwargs) -> list:
+        """Run fn(session, *args, **kwargs) on every shard concurrently; results in shard order."""
+        futures = [self._pool.submit(fn, session, *args, **kwargs) for session in sessions]
+        return [future.result() for future in futures]
+
+    # Scatter-gather reads
+
+    def get_items(self, sessions, skip: int = 0, limit: int = 100, store_id: Optional[int] = None, category: Optional[str] = None):
+        if store_id is not None:
+            # A store's menu is all on its shard
+            shard_db = sessions[self.shard_for_store(store_id)]
+            return crud.get_items(shard_db, skip=skip, limit=limit, store_id=store_id, category=category)
+        # Every shard returns its first skip + limit items; the global page is cut from the merge
+        results = self.scatter(sessions, crud.get_items, skip=0, limit=skip + limit, category=category)
+        merged = heapq.merge(*results, key=lambda item: item.id)
+        return list(islice(merged, skip, skip + limit))
+
+    def get_orders(self, sessions, skip: int = 0, limit: int = 100, before: Optional[Cursor] = None):
+        results = self.scatter(sessions, crud.get_orders, skip=0, limit=skip + limit, before=before)
+        merged = heapq.merge(*results, key=lambda order: (order.created_at, order.id), reverse=True)
+        return list(islice(merged, skip, skip + limit))
+
+    def get_orders_changed_since(self, sessions, since: Cursor, limit: int = 100):
+        results = self.scatter(sessions, crud.get_orders_changed_since, since=since, limit=limit)
+        merged = heapq.merge(*results, key=lambda order: (order.updated_at, order.id))
+        return list(islice(merged, limit))
+
+    def get_latest_order_change(self, sessions) -> Optional[Cursor]:
+        changes = [change for change in self.scatter(sessions, crud.get_latest_order_change) if change is not None]
+        return max(changes) if changes else None
+
+    def get_order_history(self, sessions, start=None, end=None, store_id: Optional[int] = None, limit: int = 100):
+        results = self.scatter(sessions, archive.get_order_history, start=start, end=end, store_id=store_id, limit=limit)
+        merged = heapq.merge(*results, key=lambda order: (order.created_at, order.id), reverse=True)
+        return list(islice(merged, limit))
+
+    def get_item_sales(self, sessions, store_id: Optional[int] = None, start=None, end=None):
+        # A store's rollups are all on its shard, so shards never hold overlapping rows
+        results = self.scatter(sessions, analytics.get_item_sales, store_id=store_id, start=start, end=end)
+        return sorted(chain.from_iterable(results), key=lambda row: (row.hour, row.store_id, row.item_id))
+
+    def get_demographic_sales(self, sessions, store_id: Optional[int] = None, start=None, end=None):
+        results = self.scatter(sessions, analytics.get_demographic_sales, store_id=store_id, start=start, end=end)
+        return sorted(
+            chain.from_iterable(results),
+            key=lambda row: (row.hour, row.store_id, row.age_group, row.gender),
+        )
+
+
+router = ShardRouter.from_urls(DATABASE_SHARD_URLS) if DATABASE_SHARD_URLS else None
+
+
+def set_router(new_router: Optional[ShardRouter]):
+    global router
+    router = new_router
+
+
+@contextmanager
+def fan_out(db: Session, module):
+    """Yield (api, source) for a read that may span shards.
+
+    Unsharded that is (module, db); sharded it is (router, one session per
+    shard). Both expose the same read functions, called as api.fn(source, ...).
+    """
+    if router is None:
+        yield module, db
+        return
+    with router.sessions() as sessions:
+        yield router, sessions
@@ -1,10 +1,22 @@
+import os
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
 import pytest
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from fastapi.testclient import TestClient
 from backend.database import Base
-from backend.main import app, get_db
-from backend import models # Import models to ensure they are registered in Base
+from backend.main import app, get_db, get_read_db
+from backend.database import recent_writes
+from backend import analytics, archive, auth, crud, models, schemas, sharding # models: registers the tables in Base
+from backend.idempotency import idempotency_store
+from backend.metrics import QueryCounter
+from backend.menu_cache import menu_cache
+from backend.principal_cache import principal_cache
+from backend.pricing import price_table
 
 from sqlalchemy.pool import StaticPool
 
@@ -20,6 +32,11 @@ TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engin
 @pytest.fixture(scope="function")
 def db_session():
     Base.metadata.create_all(bind=engine)
+    menu_cache.invalidate() # Snapshots from the previous test's database
+    principal_cache.clear()
+    price_table.invalidate()
+    recent_writes.clear()
+    idempotency_store.clear()
     db = TestingSessionLocal()
     try:
         yield db
@@ -36,5 +53,131 @@ def client(db_session):
             pass # db_session is closed in db_session fixture
     
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
     yield TestClient(app)
     app.dependency_overrides.clear()
+
+@pytest.fixture
+def count_queries(db_session):
+    """Factory for QueryCounters on the test engine: with count_queries() as q: ..."""
+    return lambda: QueryCounter(engine)
+
+# Shared helpers, as fixtures so test modules don't import them from each other
+
+@pytest.fixture
+def login(client):
+    """login(code="admin") -> Authorization headers for that store's kiosk."""
+    def login(code="admin", password="pass"):
+        token = client.post("/token", data={"username": code, "password": password}).json()["access_token"]
+        return {"Authorization": f"Bearer {token}"}
+    return login
+
+@pytest.fixture
+def store(db_session):
+    """The "admin" store (password "pass") most tests log in as."""
+    return crud.create_store(db_session, schemas.StoreCreate(name="admin", password="pass"))
+
+@pytest.fixture
+def menu(db_session, store):
+    """The admin store's menu: Ramen 800 and Rice 150 (100 in stock), options Large +100 and Small -50."""
+    ramen = crud.create_item(db_session, schemas.ItemCreate(name="Ramen", price=800, stock=100), store_id=store.id)
+    rice = crud.create_item(db_session, schemas.ItemCreate(name="Rice", price=150, stock=100), store_id=store.id)
+    large = models.Option(name="Large", price_adjustment=100)
+    small = models.Option(name="Small", price_adjustment=-50)
+    db_session.add_all([large, small])
+    db_session.commit()
+    return SimpleNamespace(store=store, ramen=ramen, rice=rice, large=large, small=small)
+
+def _place(db, lines, age_group=None, gender=None):
+    order = crud.create_order(db, schemas.OrderCreate(items=[
+        schemas.OrderItemCreate(item_id=item_id, quantity=quantity, option_ids=option_ids)
+        for item_id, quantity, option_ids in lines
+    ], age_group=age_group, gender=gender))
+    crud.checkout_order(db, order.id, "cash")
+    return order
+
+@pytest.fixture
+def place():
+    """place(db, [(item_id, quantity, option_ids), ...]) -> a paid order."""
+    return _place
+
+def _rollup_snapshot(db):
+    items = [(r.store_id, r.item_id, r.hour, r.quantity, r.revenue) for r in analytics.get_item_sales(db)]
+    demographics = [(r.store_id, r.hour, r.age_group, r.gender, r.orders, r.quantity, r.revenue) for r in analytics.get_demographic_sales(db)]
+    return items, demographics
+
+@pytest.fixture
+def rollup_snapshot():
+    """rollup_snapshot(db) -> every item and demographic rollup row, for comparisons."""
+    return _rollup_snapshot
+
+def _age(db, orders, days):
+    for order in orders:
+        db.query(models.Order).filter(models.Order.id == order.id).update(
+            {"created_at": datetime.utcnow() - timedelta(days=days)}
+        )
+    db.commit()
+
+@pytest.fixture
+def age():
+    """age(db, orders, days) backdates the orders' created_at."""
+    return _age
+
+@pytest.fixture
+def archive_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", str(tmp_path))
+    archive.load_segment.cache_clear()
+    return tmp_path
+
+@pytest.fixture
+def sharded():
+    # A primary for stores/logins plus two shard files
+    directory = tempfile.mkdtemp()
+    primary = create_engine(f"sqlite:///{os.path.join(directory, 'primary.db')}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=primary)
+    PrimarySession = sessionmaker(autocommit=False, autoflush=False, bind=primary)
+    router = sharding.ShardRouter.from_urls(
+        f"sqlite:///{os.path.join(directory, f'shard{i}.db')}" for i in range(2)
+    )
+    router.create_all()
+
+    with PrimarySession() as db:
+        stores = [
+            models.Store(name=name, code=name, hashed_password=auth.get_password_hash("pass"))
+            for name in ("shinjuku", "shibuya")
+        ]
+        db.add_all(stores + [models.Option(name="Large", price_adjustment=100)])
+        db.commit()
+        router.copy_reference_data(db)
+        store_ids = [store.id for store in stores]
+
+    item_ids = {}
+    for store_id in store_ids:
+        with router.session_for_store(store_id) as db:
+            item = models.Item(name=f"Ramen {store_id}", price=800, stock=5, category="Noodles", store_id=store_id)
+            db.add(item)
+            db.commit()
+            item_ids[store_id] = item.id
+
+    def override_get_db():
+        with PrimarySession() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+    sharding.set_router(router)
+    menu_cache.invalidate()
+    price_table.invalidate()
+    principal_cache.clear()
+    recent_writes.clear()
+    yield TestClient(app), router, store_ids, item_ids
+    sharding.set_router(None)
+    app.dependency_overrides.clear()
+    menu_cache.invalidate()
+    price_table.invalidate()
+    principal_cache.clear()
+    primary.dispose()
+    for engine in router.engines:
+        engine.dispose()
+    shutil.rmtree(directory)
+
@@ -0,0 +1,41 @@
+from backend import analytics, crud, schemas
+
+
+def test_checkout_updates_rollups_incrementally(db_session, menu, place):
+    place(db_session, [(menu.ramen.id, 2, [menu.large.id]), (menu.rice.id, 1, [])], age_group="30s", gender="male")
+    place(db_session, [(menu.ramen.id, 1, [])], age_group="30s", gender="male")
+    place(db_session, [(menu.rice.id, 3, [])])
+
+    items = {r.item_id: r for r in analytics.get_item_sales(db_session, store_id=menu.store.id)}
+    assert (items[menu.ramen.id].quantity, items[menu.ramen.id].revenue) == (3, 2 * 900 + 800)
+    assert (items[menu.rice.id].quantity, items[menu.rice.id].revenue) == (4, 600)
+
+    demographics = {(r.age_group, r.gender): r for r in analytics.get_demographic_sales(db_session)}
+    assert demographics[("30s", "male")].orders == 2
+    assert demographics[("30s", "male")].revenue == 2 * 900 + 150 + 800
+    assert demographics[(analytics.UNKNOWN, analytics.UNKNOWN)].quantity == 3
+
+def test_unpaid_orders_are_not_counted(db_session, menu):
+    crud.create_order(db_session, schemas.OrderCreate(items=[schemas.OrderItemCreate(item_id=menu.ramen.id, quantity=1)]))
+    assert analytics.get_item_sales(db_session) == []
+
+def test_rebuild_matches_incremental(db_session, menu, place, rollup_snapshot):
+    place(db_session, [(menu.ramen.id, 2, [menu.large.id]), (menu.rice.id, 1, [])], age_group="20s", gender="female")
+    place(db_session, [(menu.ramen.id, 1, [menu.large.id])], age_group="40s", gender="male")
+    incremental = rollup_snapshot(db_session)
+
+    assert analytics.rebuild(db_session) == (2, 2)
+    assert rollup_snapshot(db_session) == incremental
+
+def test_analytics_endpoints(client, db_session, menu, place):
+    place(db_session, [(menu.ramen.id, 1, [])], age_group="20s", gender="female")
+    token = client.post("/token", data={"username": "admin", "password": "pass"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    assert client.get("/analytics/sales/items").status_code == 401
+    res = client.get("/analytics/sales/items", params={"store_id": menu.store.id}, headers=headers)
+    assert res.json()[0]["revenue"] == 800
+    res = client.get("/analytics/sales/demographics", headers=headers)
+    assert res.json()[0]["age_group"] == "20s"
+    res = client.get("/analytics/sales/items", params={"start": "2000-01-01T00:00:00", "end": "2000-01-02T00:00:00"}, headers=headers)
+    assert res.json() == []
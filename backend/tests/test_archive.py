@@ -0,0 +1,70 @@
+import os
+from datetime import datetime, timedelta
+
+from backend import analytics, archive, archive_orders, crud, models
+
+
+def test_archived_orders_read_like_live_ones(client, db_session, archive_dir, menu, place, rollup_snapshot, age):
+    old = [place(db_session, [(menu.ramen.id, 2, [menu.large.id]), (menu.rice.id, 1, [])], age_group="30s") for _ in range(3)]
+    age(db_session, old, days=200)
+    recent = place(db_session, [(menu.rice.id, 1, [])])
+    unpaid = crud.create_order(db_session, crud.schemas.OrderCreate(items=[crud.schemas.OrderItemCreate(item_id=menu.ramen.id, quantity=1)]))
+    age(db_session, [unpaid], days=200)
+    old_id, recent_id, unpaid_id = old[0].id, recent.id, unpaid.id
+    before = client.get(f"/orders/{old_id}").json()
+    analytics.rebuild(db_session)
+    rollups = rollup_snapshot(db_session)
+
+    assert archive.archive_orders(db_session, segment_size=2) == (2, 3)
+    assert sorted(os.listdir(archive_dir)) == sorted(s.path for s in db_session.query(models.OrderArchiveSegment))
+    # Only the old checked-out orders moved; their lines went with them
+    assert {o.id for o in db_session.query(models.Order)} == {recent_id, unpaid_id}
+    assert db_session.query(models.OrderItemOption).count() == 0
+
+    # The menu changing afterwards doesn't change archived orders
+    menu.ramen.name = "Shoyu Ramen"
+    db_session.commit()
+    assert client.get(f"/orders/{old_id}").json() == before
+    assert client.get("/orders/999999").status_code == 404
+
+    assert archive.archive_orders(db_session) == (0, 0)
+    analytics.rebuild(db_session)
+    assert rollup_snapshot(db_session) == rollups
+
+
+def test_history_merges_live_and_archived(client, db_session, archive_dir, menu, place, age):
+    orders = [place(db_session, [(menu.rice.id, 1, [])]) for _ in range(5)]
+    ids = [order.id for order in reversed(orders)]
+    for days, order in enumerate(orders):
+        age(db_session, [order], days=100 * (len(orders) - days))
+    archive.archive_orders(db_session, older_than=timedelta(days=250), segment_size=1)
+    assert db_session.query(models.OrderArchiveSegment).count() == 3
+
+    assert [o.id for o in archive.get_order_history(db_session)] == ids
+    assert [o.id for o in archive.get_order_history(db_session, limit=3)] == ids[:3]
+    start, end = datetime.utcnow() - timedelta(days=350), datetime.utcnow() - timedelta(days=150)
+    assert [o.id for o in archive.get_order_history(db_session, start=start, end=end)] == ids[1:3] # One live, one archived
+    assert archive.get_order_history(db_session, store_id=menu.store.id + 1) == []
+
+    token = client.post("/token", data={"username": "admin", "password": "pass"}).json()["access_token"]
+    assert client.get("/orders/history").status_code == 401
+    res = client.get("/orders/history", params={"limit": 4}, headers={"Authorization": f"Bearer {token}"})
+    assert [o["id"] for o in res.json()] == ids[:4]
+    assert res.json()[-1]["items"][0]["item"]["name"] == "Rice"
+
+
+def test_archive_script_covers_every_shard(sharded, archive_dir, age):
+    client, router, store_ids, item_ids = sharded
+    orders = [client.post("/orders", json={"items": [{"item_id": item_ids[store_id], "quantity": 1}]}).json() for store_id in store_ids]
+    for order in orders:
+        client.post(f"/orders/{order['id']}/checkout", json={"payment_method": "CARD"})
+        with router.session_for_id(order["id"]) as db:
+            age(db, [db.get(models.Order, order["id"])], days=200)
+    before = [client.get(f"/orders/{order['id']}").json() for order in orders]
+
+    assert archive_orders.archive_orders() == (2, 2)
+    for index in range(len(router)):
+        with router.session(index) as db:
+            assert db.query(models.Order).count() == 0
+            assert db.query(models.OrderArchiveSegment).count() == 1
+    assert [client.get(f"/orders/{order['id']}").json() for order in orders] == before
@@ -0,0 +1,112 @@
+import asyncio
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend import archive, async_routes, auth, models
+from backend.database import Base, get_async_db
+from backend.menu_cache import menu_cache
+from backend.pricing import price_table
+
+
+@pytest.fixture
+def async_client():
+    # Both engines point at the same file: seed with the sync engine, serve with the async one
+    path = os.path.join(tempfile.mkdtemp(), "async.db")
+    sync_engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=sync_engine)
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    AsyncTestingSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+    async def override_get_async_db():
+        async with AsyncTestingSessionLocal() as db:
+            yield db
+
+    app = FastAPI()
+    app.include_router(async_routes.router)
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    menu_cache.invalidate()
+    price_table.invalidate()
+
+    SyncSession = sessionmaker(bind=sync_engine)
+    with SyncSession() as db:
+        store = models.Store(name="admin", code="admin", hashed_password=auth.get_password_hash("pass"))
+        db.add(store)
+        db.flush()
+        item = models.Item(name="Ramen", price=800, stock=10, store_id=store.id)
+        option = models.Option(name="Large", price_adjustment=100)
+        db.add_all([item, option])
+        db.flush()
+        db.add(models.ItemOption(item_id=item.id, option_id=option.id))
+        db.commit()
+        ids = {"item": item.id, "option": option.id}
+
+    yield TestClient(app), ids, SyncSession
+
+    asyncio.run(async_engine.dispose())
+    sync_engine.dispose()
+    os.remove(path)
+
+def test_async_login(async_client):
+    client, _, _ = async_client
+    assert client.post("/token", data={"username": "admin", "password": "pass"}).status_code == 200
+    assert client.post("/token", data={"username": "admin", "password": "wrong"}).status_code == 401
+
+def test_async_read_items(async_client):
+    client, ids, _ = async_client
+    assert client.get("/items").status_code == 401
+    token = client.post("/token", data={"username": "admin", "password": "pass"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    res = client.get("/items", headers=headers)
+    assert res.status_code == 200
+    assert res.json()[0]["options"][0]["id"] == ids["option"]
+    assert client.get("/items", headers={**headers, "If-None-Match": res.headers["etag"]}).status_code == 304
+    assert client.get("/items", params={"category": "Drinks"}, headers=headers).json() == []
+
+def test_async_order_flow(async_client):
+    client, ids, _ = async_client
+    res = client.post("/orders", json={
+        "items": [{"item_id": ids["item"], "quantity": 2, "option_ids": [ids["option"]]}],
+        "age_group": "30s"
+    })
+    assert res.status_code == 200
+    order_id = res.json()["id"]
+    assert res.json()["items"][0]["options"][0]["name"] == "Large"
+
+    res = client.post(f"/orders/{order_id}/items", json={"items": [{"item_id": ids["item"], "quantity": 1}]})
+    assert len(res.json()["items"]) == 2
+
+    res = client.get(f"/orders/{order_id}")
+    assert res.status_code == 200
+    assert res.json()["status"] == "pending"
+    assert client.get("/orders/999").status_code == 404
+    assert client.post("/orders/999/items", json={"items": []}).status_code == 404
+
+def test_async_read_order_falls_back_to_archive(async_client, archive_dir):
+    client, ids, SyncSession = async_client
+    order_id = client.post("/orders", json={"items": [{"item_id": ids["item"], "quantity": 1}]}).json()["id"]
+    with SyncSession() as db:
+        db.query(models.Order).filter(models.Order.id == order_id).update(
+            {"status": models.OrderStatus.COMPLETED, "created_at": datetime.utcnow() - timedelta(days=200)}
+        )
+        db.commit()
+        before = client.get(f"/orders/{order_id}").json()
+        assert archive.archive_orders(db) == (1, 1)
+        assert db.get(models.Order, order_id) is None
+
+    assert client.get(f"/orders/{order_id}").json() == before
+
+def test_refuses_sharded_configuration(monkeypatch):
+    from backend import sharding
+    monkeypatch.setattr(sharding, "router", object())
+    with pytest.raises(RuntimeError, match="DATABASE_SHARD_URLS"):
+        async_routes.check_supported()
+    monkeypatch.setattr(sharding, "router", None)
+    async_routes.check_supported()
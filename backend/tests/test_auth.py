@@ -10,3 +10,36 @@ def test_password_hash():
 def test_create_access_token_default_expiry():
     token = auth.create_access_token({"sub": "test"})
     assert isinstance(token, str)
+
+def test_password_pool_hash_and_verify():
+    import asyncio
+    pool = auth.PasswordHashPool(max_workers=2, max_queue=4)
+
+    async def scenario():
+        hashed = await pool.hash("secret")
+        return await asyncio.gather(pool.verify("secret", hashed), pool.verify("wrong", hashed))
+
+    assert asyncio.run(scenario()) == [True, False]
+    stats = pool.stats()
+    assert stats["completed"] == 3
+    assert stats["queued"] == 0 and stats["running"] == 0
+
+def test_password_pool_rejects_when_saturated():
+    import asyncio
+    import threading
+    import pytest
+    pool = auth.PasswordHashPool(max_workers=1, max_queue=1)
+    release = threading.Event()
+
+    async def scenario():
+        running = asyncio.ensure_future(pool.run(release.wait))
+        queued = asyncio.ensure_future(pool.run(release.wait))
+        await asyncio.sleep(0.05)
+        with pytest.raises(auth.PasswordPoolBusyError):
+            await pool.verify("secret", auth.get_password_hash("secret"))
+        assert pool.stats()["peak_queued"] == 1
+        release.set()
+        await asyncio.gather(running, queued)
+
+    asyncio.run(scenario())
+    assert pool.stats()["rejected"] == 1
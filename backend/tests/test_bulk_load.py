@@ -0,0 +1,38 @@
+import time
+
+from backend import bulk_load, models
+from backend.init_db import seed
+from backend.seed_locations import load_locations
+
+
+def test_load_missing_skips_existing_and_repeated_keys(db_session, count_queries):
+    db_session.add(models.Option(name="Large", price_adjustment=100))
+    db_session.commit()
+    rows = [{"name": name, "price_adjustment": 0} for name in ("Large", "Small", "Small", "Spicy")]
+    with count_queries() as queries:
+        assert bulk_load.load_missing(db_session, models.Option, rows, ["name"], batch_size=1) == 2
+    assert queries.count == 3 # One key read, then one executemany per batch
+    assert sorted(name for name, in db_session.query(models.Option.name)) == ["Large", "Small", "Spicy"]
+
+
+def test_load_locations_is_set_based_and_rerunnable(db_session, count_queries):
+    data = {f"Prefecture {p}": [f"City {c}" for c in range(40)] for p in range(47)}
+    data["Prefecture 0"].append("City 0") # Repeated in the source
+    start = time.perf_counter()
+    with count_queries() as queries:
+        assert load_locations(db_session, data) == (47, 47 * 40)
+    assert time.perf_counter() - start < 1
+    assert queries.count == 5
+    db_session.commit()
+
+    data["Prefecture 0"].append("New town")
+    assert load_locations(db_session, data) == (0, 1)
+    assert db_session.query(models.City).count() == 47 * 40 + 1
+
+
+def test_init_db_seed_is_idempotent(db_session):
+    seed(db_session)
+    counts = [db_session.query(model).count() for model in (models.Item, models.Option, models.ItemOption)]
+    assert counts == [8, 3, 12] # 2 ramen + rice + fried rice, each with every option
+    seed(db_session)
+    assert [db_session.query(model).count() for model in (models.Item, models.Option, models.ItemOption)] == counts
@@ -90,3 +90,94 @@ def test_add_items_to_order(db_session):
     
     assert len(order.items) == 1
     assert order.items[0].quantity == 3
+
+def test_add_items_to_order_keeps_options(db_session):
+    store = create_dummy_store(db_session)
+    item = crud.create_item(db_session, schemas.ItemCreate(name="Ramen", price=800), store_id=store.id)
+    option = models.Option(name="Large", price_adjustment=100)
+    db_session.add(option)
+    db_session.commit()
+    order = crud.create_order(db_session, schemas.OrderCreate(items=[]))
+
+    order = crud.add_items_to_order(db_session, order.id, [
+        schemas.OrderItemCreate(item_id=item.id, quantity=1, option_ids=[option.id])
+    ])
+
+    assert [o.name for o in order.items[0].options] == ["Large"]
+
+def test_create_order_commits_once(db_session):
+    from sqlalchemy import event
+    store = create_dummy_store(db_session)
+    items = [crud.create_item(db_session, schemas.ItemCreate(name=f"I{i}", price=100), store_id=store.id) for i in range(5)]
+    option = models.Option(name="Large", price_adjustment=100)
+    db_session.add(option)
+    db_session.commit()
+
+    commits = []
+    engine = db_session.get_bind()
+    listener = lambda conn: commits.append(conn)
+    event.listen(engine, "commit", listener)
+    try:
+        order = crud.create_order(db_session, schemas.OrderCreate(items=[
+            schemas.OrderItemCreate(item_id=i.id, quantity=2, option_ids=[option.id]) for i in items
+        ]))
+    finally:
+        event.remove(engine, "commit", listener)
+
+    assert len(commits) == 1
+    assert len(order.items) == 5
+    assert all(len(line.options) == 1 for line in order.items)
+
+def test_checkout_order_rejects_insufficient_stock(db_session):
+    import pytest
+    store = create_dummy_store(db_session)
+    plenty = crud.create_item(db_session, schemas.ItemCreate(name="Rice", price=150, stock=10), store_id=store.id)
+    scarce = crud.create_item(db_session, schemas.ItemCreate(name="Gyoza", price=400, stock=2), store_id=store.id)
+    order = crud.create_order(db_session, schemas.OrderCreate(items=[
+        schemas.OrderItemCreate(item_id=plenty.id, quantity=1, option_ids=[]),
+        schemas.OrderItemCreate(item_id=scarce.id, quantity=2, option_ids=[]),
+        schemas.OrderItemCreate(item_id=scarce.id, quantity=1, option_ids=[]),
+    ]))
+
+    with pytest.raises(crud.InsufficientStockError) as exc_info:
+        crud.checkout_order(db_session, order.id, "cash")
+
+    assert exc_info.value.item_ids == [scarce.id]
+    stocks = dict(db_session.query(models.Item.id, models.Item.stock).all())
+    assert stocks == {plenty.id: 10, scarce.id: 2}
+    db_order = db_session.query(models.Order).filter(models.Order.id == order.id).first()
+    assert db_order.status == models.OrderStatus.PENDING
+    assert db_order.payment_method is None
+
+def test_checkout_order_sums_repeated_lines(db_session):
+    store = create_dummy_store(db_session)
+    item = crud.create_item(db_session, schemas.ItemCreate(name="Gyoza", price=400, stock=3), store_id=store.id)
+    order = crud.create_order(db_session, schemas.OrderCreate(items=[
+        schemas.OrderItemCreate(item_id=item.id, quantity=2, option_ids=[]),
+        schemas.OrderItemCreate(item_id=item.id, quantity=1, option_ids=[]),
+    ]))
+
+    crud.checkout_order(db_session, order.id, "cash")
+
+    assert db_session.query(models.Item).filter(models.Item.id == item.id).first().stock == 0
+
+def test_line_options_attach_to_their_own_lines(db_session):
+    store = create_dummy_store(db_session)
+    item = crud.create_item(db_session, schemas.ItemCreate(name="Ramen", price=800, stock=50), store_id=store.id)
+    options = [models.Option(name=name, price_adjustment=10 * i) for i, name in enumerate(("Small", "Large", "Egg"))]
+    db_session.add_all(options)
+    db_session.commit()
+    wanted = [[], [options[1].id], [options[0].id, options[2].id], [options[2].id]]
+    order = crud.create_order(db_session, schemas.OrderCreate(items=[
+        schemas.OrderItemCreate(item_id=item.id, quantity=1, option_ids=option_ids) for option_ids in wanted
+    ]))
+    lines = sorted(order.items, key=lambda line: line.id)
+    assert [sorted(option.id for option in line.options) for line in lines] == [sorted(ids) for ids in wanted]
+    assert [line.unit_price for line in lines] == [800, 810, 820, 820]
+
+    # Lines added later are matched to their own ids, not to the order's first lines
+    order = crud.add_items_to_order(db_session, order.id, [
+        schemas.OrderItemCreate(item_id=item.id, quantity=1, option_ids=option_ids) for option_ids in wanted[::-1]
+    ])
+    lines = sorted(order.items, key=lambda line: line.id)
+    assert [sorted(option.id for option in line.options) for line in lines] == [sorted(ids) for ids in wanted + wanted[::-1]]
@@ -0,0 +1,52 @@
+import os
+import tempfile
+
+import pytest
+from sqlalchemy import text
+
+from backend.database import SQLITE_BUSY_TIMEOUT_MS, create_db_engine, engine_options
+
+
+def _pragmas(engine):
+    with engine.connect() as conn:
+        return {
+            name: conn.execute(text(f"PRAGMA {name}")).scalar()
+            for name in ("journal_mode", "synchronous", "busy_timeout", "temp_store")
+        }
+
+
+def test_production_profile_applies_pragmas_and_pool():
+    path = os.path.join(tempfile.mkdtemp(), "prod.db")
+    engine = create_db_engine(f"sqlite:///{path}", "production")
+    try:
+        assert _pragmas(engine) == {
+            "journal_mode": "wal",
+            "synchronous": 1, # NORMAL
+            "busy_timeout": SQLITE_BUSY_TIMEOUT_MS,
+            "temp_store": 2, # MEMORY
+        }
+        assert engine.pool.size() == engine_options(f"sqlite:///{path}", "production")["pool_size"]
+    finally:
+        engine.dispose()
+
+
+def test_default_profile_keeps_driver_defaults():
+    path = os.path.join(tempfile.mkdtemp(), "default.db")
+    engine = create_db_engine(f"sqlite:///{path}", "default")
+    try:
+        pragmas = _pragmas(engine)
+        assert pragmas["journal_mode"] == "delete"
+        assert pragmas["synchronous"] == 2 # FULL
+    finally:
+        engine.dispose()
+
+
+def test_in_memory_database_skips_production_settings():
+    assert "pool_size" not in engine_options("sqlite:///:memory:", "production")
+    engine = create_db_engine("sqlite://", "production")
+    assert _pragmas(engine)["journal_mode"] == "memory"
+
+
+def test_unknown_profile():
+    with pytest.raises(ValueError):
+        engine_options("sqlite:///app.db", "turbo")
@@ -0,0 +1,84 @@
+import asyncio
+import threading
+
+import pytest
+
+from backend import crud, events, models, schemas
+
+
+def test_publish_from_thread_reaches_subscriber():
+    broker = events.InProcessOrderEventBroker()
+
+    async def scenario():
+        subscription = broker.subscribe(1)
+        thread = threading.Thread(target=broker.publish, args=(1, {"order_id": 1, "status": "completed"}))
+        thread.start()
+        thread.join()
+        event = await asyncio.wait_for(subscription.queue.get(), timeout=1)
+        subscription.close()
+        return event
+
+    assert asyncio.run(scenario())["status"] == "completed"
+    assert broker.subscriber_count(1) == 0
+
+def test_publish_only_reaches_same_order():
+    broker = events.InProcessOrderEventBroker()
+
+    async def scenario():
+        subscription = broker.subscribe(1)
+        broker.publish(2, {"order_id": 2, "status": "completed"})
+        await asyncio.sleep(0)
+        empty = subscription.queue.empty()
+        subscription.close()
+        return empty
+
+    assert asyncio.run(scenario())
+
+def test_stream_yields_initial_then_updates():
+    broker = events.InProcessOrderEventBroker()
+
+    async def scenario():
+        subscription = broker.subscribe(5)
+        stream = events.stream_order_events(subscription, {"order_id": 5, "status": "pending"})
+        first = await stream.__anext__()
+        broker.publish(5, {"order_id": 5, "status": "completed"})
+        second = await stream.__anext__()
+        await stream.aclose()
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first == 'event: status\ndata: {"order_id": 5, "status": "pending"}\n\n'
+    assert '"status": "completed"' in second
+    assert broker.subscriber_count(5) == 0
+
+def test_crud_status_changes_are_published(db_session):
+    published = []
+
+    class RecordingBroker(events.InProcessOrderEventBroker):
+        def publish(self, order_id, event):
+            published.append(event)
+
+    previous = events.broker
+    events.set_broker(RecordingBroker())
+    try:
+        order = crud.create_order(db_session, schemas.OrderCreate(items=[]))
+        crud.checkout_order(db_session, order.id, "cash")
+        crud.update_order_status(db_session, order.id, "served")
+    finally:
+        events.set_broker(previous)
+
+    assert [e["status"] for e in published] == [models.OrderStatus.COMPLETED, "served"]
+    assert published[0]["payment_method"] == "cash"
+
+def test_incomplete_broker_cannot_be_created():
+    class PublishOnlyBroker(events.OrderEventBroker):
+        def publish(self, order_id, event):
+            pass
+
+    with pytest.raises(TypeError):
+        PublishOnlyBroker()
+
+def test_order_events_not_found(client):
+    res = client.get("/orders/999/events")
+    assert res.status_code == 404
+    assert events.broker.subscriber_count(999) == 0
@@ -0,0 +1,41 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+from backend import archive, crud, export, schemas
+
+
+def test_export_streams_one_row_per_line(client, db_session, archive_dir, monkeypatch, menu, place, age, login):
+    old = place(db_session, [(menu.ramen.id, 2, [menu.large.id])], age_group="30s")
+    age(db_session, [old], days=200)
+    archive.archive_orders(db_session)
+    for _ in range(4):
+        place(db_session, [(menu.ramen.id, 1, [menu.large.id]), (menu.rice.id, 3, [])])
+    empty = crud.create_order(db_session, schemas.OrderCreate(items=[]))
+    empty_id = empty.id
+    headers = login()
+
+    assert client.get("/orders/export").status_code == 401
+    assert client.get("/orders/export", params={"format": "xlsx"}, headers=headers).status_code == 400
+
+    res = client.get("/orders/export", headers=headers)
+    assert res.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in res.text.splitlines()]
+    assert len(rows) == 1 + 4 * 2 + 1
+    # The archived order first, rendered from its segment
+    assert rows[0]["item_name"] == "Ramen" and rows[0]["options"] == ["Large"] and rows[0]["line_total"] == 1800
+    assert rows[2]["item_name"] == "Rice" and rows[2]["options"] == []
+    assert rows[-1]["order_id"] == empty_id and rows[-1]["line_id"] is None
+
+    res = client.get("/orders/export", params={"format": "csv", "start": (datetime.utcnow() - timedelta(days=1)).isoformat()}, headers=headers)
+    table = list(csv.DictReader(io.StringIO(res.text)))
+    assert list(table[0]) == list(export.COLUMNS)
+    assert len(table) == 4 * 2 + 1
+    assert table[0]["options"] == "Large"
+    assert client.get("/orders/export", params={"store_id": menu.store.id + 1}, headers=headers).text == ""
+
+    # Fetched and sent in batches, never all at once
+    monkeypatch.setattr(export, "EXPORT_BATCH_SIZE", 3)
+    chunks = list(export.stream_export(db_session, "ndjson"))
+    assert [chunk.count(b"\n") for chunk in chunks] == [1, 3, 3, 3]
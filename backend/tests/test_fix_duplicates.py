@@ -0,0 +1,62 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+from backend import crud, models, schemas
+from backend.fix_duplicates import fix_duplicates
+
+
+@pytest.fixture
+def legacy_db(db_session):
+    # As databases were before the unique indexes: duplicates allowed
+    db_session.execute(text("DROP INDEX uq_items_store_id_name"))
+    db_session.execute(text("DROP INDEX ix_options_name"))
+    db_session.commit()
+    return db_session
+
+
+def test_merges_duplicate_options_and_items(legacy_db, count_queries):
+    db = legacy_db
+    store = crud.create_store(db, schemas.StoreCreate(name="admin", password="pass"))
+    small, small_copy, large = (models.Option(name=name, price_adjustment=0) for name in ("少なめ", "少なめ", "Large"))
+    ramen, ramen_copy, rice = (models.Item(name=name, price=800, store_id=store.id) for name in ("Ramen", "Ramen", "Rice"))
+    db.add_all([small, small_copy, large, ramen, ramen_copy, rice])
+    db.flush()
+    db.add_all([
+        models.ItemOption(item_id=ramen.id, option_id=small.id),
+        models.ItemOption(item_id=ramen.id, option_id=small_copy.id),
+        models.ItemOption(item_id=ramen_copy.id, option_id=large.id),
+        models.ItemOption(item_id=rice.id, option_id=small_copy.id),
+    ])
+    line = models.OrderItem(item_id=ramen_copy.id, quantity=1)
+    db.add(line)
+    db.flush()
+    db.add(models.OrderItemOption(order_item_id=line.id, option_id=small_copy.id))
+    db.commit()
+    ids = (small.id, large.id, ramen.id, rice.id, line.id)
+
+    with count_queries() as queries:
+        assert fix_duplicates(db) == {"options": 1, "items": 1}
+    assert queries.count < 20 # Set-based: doesn't grow with the number of links
+    small_id, large_id, ramen_id, rice_id, line_id = ids
+
+    assert sorted(db.query(models.Option.id)) == sorted([(small_id,), (large_id,)])
+    assert sorted(db.query(models.Item.id)) == sorted([(ramen_id,), (rice_id,)])
+    links = sorted((link.item_id, link.option_id) for link in db.query(models.ItemOption))
+    assert links == sorted([(ramen_id, small_id), (ramen_id, large_id), (rice_id, small_id)])
+    db.expire_all()
+    line = db.get(models.OrderItem, line_id)
+    assert line.item_id == ramen_id
+    assert [option.id for option in line.options] == [small_id]
+
+    assert fix_duplicates(db) == {"options": 0, "items": 0}
+
+
+def test_unique_constraints(db_session):
+    store = crud.create_store(db_session, schemas.StoreCreate(name="admin", password="pass"))
+    crud.create_item(db_session, schemas.ItemCreate(name="Ramen", price=800), store_id=store.id)
+    with pytest.raises(crud.DuplicateItemError):
+        crud.create_item(db_session, schemas.ItemCreate(name="Ramen", price=900), store_id=store.id)
+    db_session.add_all([models.Option(name="Large", price_adjustment=100), models.Option(name="Large", price_adjustment=100)])
+    with pytest.raises(IntegrityError):
+        db_session.commit()
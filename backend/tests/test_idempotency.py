@@ -0,0 +1,79 @@
+import asyncio
+
+from backend import models
+from backend.idempotency import IdempotencyMiddleware, IdempotencyStore, idempotency_store
+
+
+def test_retried_order_returns_the_first_response(client, db_session, count_queries, menu):
+    payload = {"items": [{"item_id": menu.ramen.id, "quantity": 1}]}
+    headers = {"Idempotency-Key": "kiosk1-order-1"}
+    first = client.post("/orders", json=payload, headers=headers)
+    assert first.status_code == 200
+
+    with count_queries() as queries:
+        retry = client.post("/orders", json=payload, headers=headers)
+    assert queries.count == 0
+    assert retry.content == first.content
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert db_session.query(models.Order).count() == 1
+
+    # Without a key, or with another one, it is a new order
+    assert client.post("/orders", json=payload).json()["id"] != first.json()["id"]
+    assert client.post("/orders", json=payload, headers={"Idempotency-Key": "kiosk1-order-2"}).json()["id"] != first.json()["id"]
+    assert idempotency_store.stats()["replays"] == 1
+
+
+def test_retried_checkout_is_not_charged_twice(client, db_session, menu):
+    order_id = client.post("/orders", json={"items": [{"item_id": menu.ramen.id, "quantity": 2}]}).json()["id"]
+    headers = {"Idempotency-Key": "kiosk1-checkout-1"}
+    for _ in range(3):
+        response = client.post(f"/orders/{order_id}/checkout", json={"payment_method": "CARD"}, headers=headers)
+        assert response.status_code == 200
+    db_session.expire_all()
+    assert db_session.get(models.Item, menu.ramen.id).stock == 98
+
+
+def test_key_reused_for_another_request(client, db_session, menu):
+    headers = {"Idempotency-Key": "reused"}
+    client.post("/orders", json={"items": [{"item_id": menu.ramen.id, "quantity": 1}]}, headers=headers)
+    response = client.post("/orders", json={"items": [{"item_id": menu.ramen.id, "quantity": 3}]}, headers=headers)
+    assert response.status_code == 422
+    assert client.post("/orders", json={"items": []}, headers={"Idempotency-Key": "x" * 256}).status_code == 400
+
+
+def test_failures_are_not_stored():
+    calls = []
+
+    async def failing_app(scope, receive, send):
+        calls.append(await receive())
+        await send({"type": "http.response.start", "status": 503, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    store = IdempotencyStore()
+    middleware = IdempotencyMiddleware(failing_app, store=store)
+    scope = {"type": "http", "method": "POST", "path": "/orders", "headers": [(b"idempotency-key", b"k")]}
+
+    async def receive():
+        return {"type": "http.request", "body": b"{}", "more_body": False}
+
+    async def send(message):
+        pass
+
+    for _ in range(2):
+        asyncio.run(middleware(scope, receive, send))
+    assert [call["body"] for call in calls] == [b"{}", b"{}"]
+    assert store.stats()["size"] == 0
+
+
+def test_store_expires_oldest_entries():
+    store = IdempotencyStore(ttl=60, max_size=2)
+    for key in ("a", "b", "c"):
+        assert store.begin(key, b"") is None
+        store.complete(key, 200, [], b"")
+    assert store.stats()["size"] == 2
+    assert store.begin("a", b"") is None # Evicted, so reserved afresh
+    assert store.begin("c", b"").status == 200
+
+    store = IdempotencyStore(ttl=0)
+    store.begin("a", b"")
+    assert store.begin("a", b"") is None
@@ -0,0 +1,18 @@
+from backend.benchmarks import lunch_peak
+
+
+def test_in_process_run_reports_every_endpoint(tmp_path, capsys):
+    output = tmp_path / "report.json"
+    report = lunch_peak.main([
+        "--kiosks", "2", "--sessions", "2", "--think", "0", "--items", "3",
+        "--add-items-ratio", "1", "--output", str(output),
+    ])
+
+    assert output.exists()
+    assert report["paid_orders"] == 4
+    assert set(report["endpoints"]) == {
+        "POST /token", "GET /items", "POST /orders", "POST /orders/{id}/items",
+        "GET /orders/{id}", "POST /orders/{id}/checkout",
+    }
+    assert all(stats["errors"] == 0 for stats in report["endpoints"].values())
+    assert report["endpoints"]["POST /orders"]["count"] == 4
@@ -1,9 +1,27 @@
 from backend import crud, schemas
 
-def test_read_items(client):
-    response = client.get("/items")
+def test_read_items(client, db_session, login):
+    store = crud.create_store(db_session, schemas.StoreCreate(name="admin", password="pass"))
+    other = crud.create_store(db_session, schemas.StoreCreate(name="other", password="pass"))
+    ramen = crud.create_item(db_session, schemas.ItemCreate(name="Ramen", price=800, category="Noodles"), store_id=store.id)
+    tea = crud.create_item(db_session, schemas.ItemCreate(name="Tea", price=200, category="Drinks"), store_id=store.id)
+    crud.create_item(db_session, schemas.ItemCreate(name="Ramen", price=900, category="Noodles"), store_id=other.id)
+
+    assert client.get("/items").status_code == 401
+    headers = login()
+    response = client.get("/items", headers=headers)
     assert response.status_code == 200
-    assert isinstance(response.json(), list)
+    # Only the kiosk's own store's menu
+    assert [item["id"] for item in response.json()] == [ramen.id, tea.id]
+    assert [item["id"] for item in client.get("/items", params={"category": "Drinks"}, headers=headers).json()] == [tea.id]
+    assert [item["price"] for item in client.get("/items", headers=login("other")).json()] == [900]
+
+def test_store_menu_query_uses_composite_index(db_session):
+    from sqlalchemy import text
+    plan = db_session.execute(text(
+        "EXPLAIN QUERY PLAN SELECT * FROM items WHERE store_id = 1 AND category = 'Drinks' ORDER BY id"
+    )).all()
+    assert "ix_items_store_id_category_id" in " ".join(str(row[-1]) for row in plan)
 
 def test_create_order_simple(client):
     response = client.post("/orders", json={
@@ -56,7 +74,7 @@ def test_full_order_flow(client, db_session):
     
     # 6. Verify Stock Deduction logic via API shouldn't expose stock directly in order response,
     # but we can check item status via GET /items
-    items_res = client.get("/items")
+    items_res = client.get("/items", headers=headers)
     # Finding the item in list
     target_item = next(i for i in items_res.json() if i["id"] == item_id)
     assert target_item["stock"] == 95
@@ -193,3 +211,116 @@ def test_update_item_success(client, db_session):
     assert res.json()["name"] == "New Name"
     assert res.json()["price"] == 200
 
+
+def test_read_items_etag_not_modified(client, db_session, login):
+    from backend import crud, schemas
+    store = crud.create_store(db_session, schemas.StoreCreate(name="admin", password="pass"))
+    crud.create_item(db_session, schemas.ItemCreate(name="Ramen", price=800), store_id=store.id)
+
+    headers = login()
+    first = client.get("/items", headers=headers)
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+
+    res = client.get("/items", headers={**headers, "If-None-Match": etag})
+    assert res.status_code == 304
+    assert res.content == b""
+
+def test_read_items_served_from_cache(client, db_session, login):
+    from sqlalchemy import event
+    from backend import crud, schemas
+    store = crud.create_store(db_session, schemas.StoreCreate(name="admin", password="pass"))
+    crud.create_item(db_session, schemas.ItemCreate(name="Ramen", price=800), store_id=store.id)
+    headers = login()
+    client.get("/items", headers=headers)
+
+    statements = []
+    listener = lambda *args: statements.append(args)
+    engine = db_session.get_bind()
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        res = client.get("/items", headers=headers)
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+    assert res.status_code == 200
+    assert statements == []
+
+def test_read_items_invalidated_by_update(client, db_session, login):
+    from backend import crud, schemas
+    store = crud.create_store(db_session, schemas.StoreCreate(name="admin", password="pass"))
+    item = crud.create_item(db_session, schemas.ItemCreate(name="Old", price=800), store_id=store.id)
+    headers = login()
+    etag = client.get("/items", headers=headers).headers["etag"]
+
+    crud.update_item(db_session, item.id, schemas.ItemCreate(name="New", price=900))
+
+    res = client.get("/items", headers={**headers, "If-None-Match": etag})
+    assert res.status_code == 200
+    assert res.headers["etag"] != etag
+    assert res.json()[0]["name"] == "New"
+
+def test_read_orders_keyset_pagination(client, db_session):
+    from backend import crud, schemas
+    created = [crud.create_order(db_session, schemas.OrderCreate(items=[])).id for _ in range(5)]
+
+    first = client.get("/orders", params={"limit": 2})
+    assert [o["id"] for o in first.json()] == created[::-1][:2]
+
+    second = client.get("/orders", params={"limit": 2, "cursor": first.headers["x-next-cursor"]})
+    third = client.get("/orders", params={"limit": 2, "cursor": second.headers["x-next-cursor"]})
+    assert [o["id"] for o in second.json()] == created[::-1][2:4]
+    assert [o["id"] for o in third.json()] == created[::-1][4:]
+    assert "x-next-cursor" not in third.headers
+
+def test_read_orders_since_returns_only_changes(client, db_session):
+    from backend import crud, schemas
+    first = crud.create_order(db_session, schemas.OrderCreate(items=[]))
+    crud.create_order(db_session, schemas.OrderCreate(items=[]))
+    since = client.get("/orders").headers["x-since-cursor"]
+
+    res = client.get("/orders", params={"since": since})
+    assert res.json() == []
+    assert res.headers["x-since-cursor"] == since
+
+    crud.update_order_status(db_session, first.id, "completed")
+    third = crud.create_order(db_session, schemas.OrderCreate(items=[]))
+
+    res = client.get("/orders", params={"since": since})
+    assert [o["id"] for o in res.json()] == [first.id, third.id]
+    assert res.json()[0]["status"] == "completed"
+    assert client.get("/orders", params={"since": res.headers["x-since-cursor"]}).json() == []
+
+def test_read_orders_invalid_cursor(client):
+    assert client.get("/orders", params={"cursor": "not-a-cursor"}).status_code == 400
+    assert client.get("/orders", params={"since": "bm9waXBl"}).status_code == 400
+
+def test_checkout_insufficient_stock_conflict(client, db_session):
+    from backend import crud, schemas
+    store = crud.create_store(db_session, schemas.StoreCreate(name="admin", password="pass"))
+    item = crud.create_item(db_session, schemas.ItemCreate(name="Gyoza", price=400, stock=1), store_id=store.id)
+    order = crud.create_order(db_session, schemas.OrderCreate(items=[
+        schemas.OrderItemCreate(item_id=item.id, quantity=2, option_ids=[])
+    ]))
+
+    res = client.post(f"/orders/{order.id}/checkout", json={"payment_method": "cash"})
+    assert res.status_code == 409
+    assert res.json()["detail"]["item_ids"] == [item.id]
+    assert client.get(f"/orders/{order.id}").json()["status"] == "pending"
+
+def test_since_cursor_does_not_skip_orders_written_during_the_page_read(client, db_session, monkeypatch):
+    from backend import crud, schemas
+    crud.create_order(db_session, schemas.OrderCreate(items=[]))
+    get_orders = crud.get_orders
+    written = []
+
+    def get_orders_then_write(*args, **kwargs):
+        orders = get_orders(*args, **kwargs)
+        written.append(crud.create_order(db_session, schemas.OrderCreate(items=[])).id)
+        return orders
+
+    monkeypatch.setattr(crud, "get_orders", get_orders_then_write)
+    since = client.get("/orders").headers["x-since-cursor"]
+    monkeypatch.undo()
+
+    assert [o["id"] for o in client.get("/orders", params={"since": since}).json()] == written
@@ -0,0 +1,76 @@
+import threading
+import time
+
+from backend import crud, schemas
+from backend.menu_cache import MenuCache, menu_cache
+
+
+def test_invalidation_is_per_store():
+    cache = MenuCache()
+    loads = []
+    load = lambda store: (lambda: loads.append(store) or [])
+    for store in (1, 2):
+        cache.get(("Main", 0, 100), load(store), store_id=store)
+    cache.invalidate([1])
+    for store in (1, 2):
+        cache.get(("Main", 0, 100), load(store), store_id=store)
+    assert loads == [1, 2, 1]
+    cache.invalidate()
+    cache.get(("Main", 0, 100), load(2), store_id=2)
+    assert loads == [1, 2, 1, 2]
+
+
+def test_snapshots_expire_and_are_capped():
+    cache = MenuCache(ttl=0)
+    loads = []
+    for _ in range(2):
+        cache.get("k", lambda: loads.append(1) or [], store_id=1)
+    assert len(loads) == 2 # Expired at once: other workers' writes show up after ttl
+
+    cache = MenuCache(max_size=2)
+    for page in range(5):
+        cache.get(page, lambda: [], store_id=1)
+    assert cache.stats()["size"] == 2
+
+
+def test_concurrent_misses_share_one_load():
+    cache = MenuCache()
+    loads = []
+    started = threading.Event()
+
+    def slow_load():
+        loads.append(1)
+        started.set()
+        time.sleep(0.1)
+        return []
+
+    threads = [threading.Thread(target=cache.get, args=("k", slow_load), kwargs={"store_id": 1}) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert loads == [1]
+    assert cache.stats()["loads"] == 1
+
+
+def test_checkout_keeps_other_stores_menus(client, db_session):
+    store = crud.create_store(db_session, schemas.StoreCreate(name="admin", password="pass"))
+    other = crud.create_store(db_session, schemas.StoreCreate(name="other", password="pass"))
+    ramen = crud.create_item(db_session, schemas.ItemCreate(name="Ramen", price=800, stock=5), store_id=store.id)
+    crud.create_item(db_session, schemas.ItemCreate(name="Ramen", price=900, stock=5), store_id=other.id)
+    tokens = {
+        name: client.post("/token", data={"username": name, "password": "pass"}).json()["access_token"]
+        for name in ("admin", "other")
+    }
+    for token in tokens.values():
+        client.get("/items", headers={"Authorization": f"Bearer {token}"})
+    loads = menu_cache.stats()["loads"]
+
+    order = crud.create_order(db_session, schemas.OrderCreate(items=[schemas.OrderItemCreate(item_id=ramen.id, quantity=2)]))
+    crud.checkout_order(db_session, order.id, "cash")
+
+    other_menu = client.get("/items", headers={"Authorization": f"Bearer {tokens['other']}"})
+    assert menu_cache.stats()["loads"] == loads # Still cached
+    menu = client.get("/items", headers={"Authorization": f"Bearer {tokens['admin']}"}).json()
+    assert menu_cache.stats()["loads"] == loads + 1
+    assert menu[0]["stock"] == 3 and other_menu.json()[0]["stock"] == 5
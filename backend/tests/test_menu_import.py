@@ -0,0 +1,91 @@
+import json
+
+from sqlalchemy import insert
+
+from backend import crud, models, schemas
+from backend.menu_cache import menu_cache
+
+
+def test_csv_import_creates_and_updates(client, db_session, login, store):
+    headers = login()
+    other = crud.create_store(db_session, schemas.StoreCreate(name="shibuya", password="pass"))
+    db_session.add_all([models.Option(name="Large", price_adjustment=100), models.Option(name="Small", price_adjustment=-50)])
+    db_session.commit()
+    ramen = crud.create_item(db_session, schemas.ItemCreate(name="Ramen", price=800, stock=5, category="Noodles"), store_id=store.id)
+
+    body = "\n".join([
+        "name,price,category,stock,options,store_code",
+        "Ramen,850,,,Large|Small,",
+        "Gyoza,400,Sides,,,",
+        "Ramen,900,Noodles,20,,shibuya",
+        "Rice,,Rice,,,",
+        "Beer,abc,,,,",
+        "Tea,100,,,Huge,",
+    ])
+    other_menu = menu_cache.get(None, lambda: [], store_id=other.id)
+    version = menu_cache.version
+    response = client.post("/items/import", content=body.encode(), headers={**headers, "Content-Type": "text/csv"})
+    assert response.status_code == 200
+    summary = response.json()
+    assert (summary["rows"], summary["created"], summary["updated"], summary["rejected"]) == (6, 1, 1, 4)
+    assert [error["line"] for error in summary["errors"]] == [4, 5, 6, 7]
+    assert "another store" in summary["errors"][0]["detail"]
+    assert menu_cache.version == version + 1 # Invalidated once for the whole import
+    assert menu_cache.get(None, lambda: [], store_id=other.id) is other_menu # Only the importing store's menu
+
+    db_session.expire_all()
+    updated = db_session.get(models.Item, ramen.id)
+    assert (updated.price, updated.category, updated.stock) == (850, "Noodles", 5)
+    assert sorted(option.name for option in updated.options) == ["Large", "Small"]
+    gyoza = db_session.query(models.Item).filter_by(name="Gyoza").one()
+    assert (gyoza.store_id, gyoza.stock, gyoza.options) == (store.id, 10, [])
+    assert db_session.query(models.Item).filter_by(store_id=other.id).count() == 0
+    body = "name,price,store_code\nTea,150,admin\n"
+    assert client.post("/items/import", content=body.encode(), headers={**headers, "Content-Type": "text/csv"}).json()["created"] == 1
+
+
+def test_ndjson_import_replaces_options(client, db_session, count_queries, login, store):
+    headers = login()
+    large = models.Option(name="Large", price_adjustment=100)
+    db_session.add(large)
+    db_session.commit()
+    rows = [{"name": f"Item {i}", "price": 100 + i, "options": ["Large"]} for i in range(50)]
+    body = "\n".join(json.dumps(row) for row in rows)
+    with count_queries() as queries:
+        response = client.post("/items/import", content=body.encode(), headers={**headers, "Content-Type": "application/x-ndjson"})
+    assert response.json()["created"] == 50
+    assert queries.count < 10 # Set-based, not per row
+
+    body = json.dumps({"name": "Item 0", "options": []}) + "\n" + json.dumps({"name": "Item 1", "price": 5})
+    response = client.post("/items/import", content=body.encode(), headers={**headers, "Content-Type": "application/x-ndjson"})
+    assert response.json()["updated"] == 2
+    items = {item["name"]: item for item in client.get("/items", headers=headers).json()}
+    assert items["Item 0"]["options"] == []
+    assert items["Item 1"]["price"] == 5 and [o["name"] for o in items["Item 1"]["options"]] == ["Large"]
+
+
+def test_import_requires_a_known_format(client, db_session, login, store):
+    headers = login()
+    response = client.post("/items/import", content=b"{}", headers={**headers, "Content-Type": "application/json"})
+    assert response.status_code == 415
+    assert client.post("/items/import", content=b"", headers={"Content-Type": "text/csv"}).status_code == 401
+
+
+def test_concurrently_created_item_is_updated(client, db_session, monkeypatch, login, store):
+    headers = login()
+    insert_returning_keys = crud._insert_returning_keys
+    raced = []
+
+    def created_elsewhere_first(db, model, rows, key_columns):
+        if not raced:
+            # Another import commits the same item between the lookup and the insert
+            db.execute(insert(models.Item).values(name="Ramen", price=800, stock=5, store_id=store.id))
+            db.commit()
+            raced.append(True)
+        return insert_returning_keys(db, model, rows, key_columns)
+
+    monkeypatch.setattr(crud, "_insert_returning_keys", created_elsewhere_first)
+    response = client.post("/items/import", content=b"name,price\nRamen,850\n", headers={**headers, "Content-Type": "text/csv"})
+    assert response.status_code == 200
+    assert (response.json()["created"], response.json()["updated"], response.json()["rejected"]) == (0, 1, 0)
+    assert db_session.query(models.Item).filter_by(name="Ramen").one().price == 850
@@ -0,0 +1,88 @@
+import os
+import re
+import tempfile
+
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+
+from backend import metrics, models
+from backend.database import create_db_engine
+
+
+def _sample(body, name, **labels):
+    # Value of one sample line in the exposition text, or None
+    label_text = ",".join(f'{key}="{value}"' for key, value in labels.items())
+    pattern = "^" + re.escape(f"{name}{{{label_text}}}" if labels else name) + r" (\S+)$"
+    match = re.search(pattern, body, re.MULTILINE)
+    return float(match.group(1)) if match else None
+
+
+def test_request_and_db_metrics(client, db_session):
+    metrics.instrument_engine(db_session.get_bind(), "test")
+    item = models.Item(name="Ramen", price=800, stock=10, category="Noodles")
+    db_session.add(item)
+    db_session.commit()
+
+    before = metrics.REQUESTS.value(("POST", "/orders", "200"))
+    order = client.post("/orders", json={"items": [{"item_id": item.id, "quantity": 1}]}).json()
+    client.post(f"/orders/{order['id']}/checkout", json={"payment_method": "CARD"})
+    client.get("/no-such-page")
+
+    body = client.get("/metrics").text
+    assert _sample(body, "http_requests_total", method="POST", route="/orders", status="200") == before + 1
+    assert _sample(body, "http_requests_total", method="GET", route=metrics.UNMATCHED_ROUTE, status="404") >= 1
+    assert _sample(body, "http_request_duration_seconds_count", method="POST", route="/orders/{order_id}/checkout") >= 1
+    assert _sample(body, "http_request_db_queries_total", method="POST", route="/orders") > 0
+    assert _sample(body, "http_request_db_seconds_count", method="POST", route="/orders") >= 1
+    assert _sample(body, "db_queries_total", db="test") > 0
+    assert _sample(body, "password_pool_workers") is not None
+    assert _sample(body, "principal_cache_hit_ratio") is not None
+    # The scrape itself is not recorded
+    assert 'route="/metrics"' not in body
+
+
+def test_pool_checkout_wait_is_recorded():
+    path = os.path.join(tempfile.mkdtemp(), "metrics.db")
+    engine = create_db_engine(f"sqlite:///{path}", "production")
+    label = metrics.engine_label(engine)
+    before = metrics.CHECKOUT_WAIT.count((label,))
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        engine.dispose() # The recreated pool keeps timing checkouts
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    finally:
+        engine.dispose()
+    assert metrics.CHECKOUT_WAIT.count((label,)) == before + 2
+    assert metrics.CHECKOUTS.value((label,)) >= 2
+
+
+def test_histogram_exposition():
+    histogram = metrics.Histogram("demo_seconds", "Demo.", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(("/x",), value)
+    lines = histogram.render()
+    assert 'demo_seconds_bucket{route="/x",le="0.1"} 1' in lines
+    assert 'demo_seconds_bucket{route="/x",le="1.0"} 2' in lines
+    assert 'demo_seconds_bucket{route="/x",le="+Inf"} 3' in lines
+    assert 'demo_seconds_count{route="/x"} 3' in lines
+
+
+def test_engines_with_the_same_file_name_keep_separate_labels():
+    first, second = (os.path.join(tempfile.mkdtemp(), "kiosk.db") for _ in range(2))
+    engines = [create_db_engine(f"sqlite:///{first}"), create_db_engine(f"sqlite:///{second}"), create_db_engine(f"sqlite:///{second}", label="shard-1")]
+    try:
+        labels = [metrics.engine_label(engine) for engine in engines[:2]]
+        assert labels[0] != labels[1]
+        assert metrics.engine_label(make_url("postgresql://db-a:5432/kiosk")) == "db-a:5432/kiosk"
+        for engine in engines:
+            with engine.connect():
+                body = metrics.registry.render()
+        # Every registered pool is reported, not just the last one per label
+        for label in labels + ["shard-1"]:
+            assert _sample(body, "db_pool_checked_out", db=label) is not None
+        assert _sample(body, "db_pool_checked_out", db="shard-1") == 1
+    finally:
+        for engine in engines:
+            engine.dispose()
@@ -0,0 +1,64 @@
+from backend import analytics, models, schemas
+
+
+def offline(client_order_id, item_id, quantity=1, option_ids=(), payment_method="CASH"):
+    return {
+        "client_order_id": client_order_id,
+        "created_at": "2025-01-01T11:45:00",
+        "payment_method": payment_method,
+        "items": [{"item_id": item_id, "quantity": quantity, "option_ids": list(option_ids)}],
+    }
+
+
+def test_batch_creates_orders_in_request_order(client, db_session, menu):
+    response = client.post("/orders/batch", json={"orders": [
+        offline("kiosk1-1", menu.ramen.id, quantity=2, option_ids=[menu.large.id]),
+        offline("kiosk1-2", menu.ramen.id, payment_method=None),
+        offline("kiosk1-3", 999),
+    ]})
+    assert response.status_code == 200
+    results = response.json()
+    assert [r["result"] for r in results] == ["created", "created", "rejected"]
+    assert "999" in results[2]["detail"]
+
+    paid = client.get(f"/orders/{results[0]['order_id']}").json()
+    assert paid["client_order_id"] == "kiosk1-1"
+    assert paid["created_at"] == "2025-01-01T11:45:00"
+    assert (paid["status"], paid["total"], paid["store_id"]) == ("completed", 1800, menu.store.id)
+    assert [o["id"] for o in paid["items"][0]["options"]] == [menu.large.id]
+    assert client.get(f"/orders/{results[1]['order_id']}").json()["status"] == "pending"
+
+    # Only the paid order takes stock and reaches the rollups
+    db_session.expire_all()
+    assert db_session.get(models.Item, menu.ramen.id).stock == 98
+    sales = analytics.get_item_sales(db_session, store_id=menu.store.id)
+    assert [(row.quantity, row.revenue) for row in sales] == [(2, 1800)]
+
+
+def test_replayed_batch_reports_duplicates(client, db_session, menu):
+    first = client.post("/orders/batch", json={"orders": [offline("a", menu.ramen.id), offline("a", menu.ramen.id)]}).json()
+    assert [r["result"] for r in first] == ["created", "duplicate"]
+    assert first[1]["order_id"] == first[0]["order_id"]
+
+    replay = client.post("/orders/batch", json={"orders": [offline("a", menu.ramen.id), offline("b", menu.ramen.id)]}).json()
+    assert [(r["result"], r["order_id"]) for r in replay][0] == ("duplicate", first[0]["order_id"])
+    assert replay[1]["result"] == "created"
+    assert db_session.query(models.Order).count() == 2
+    db_session.expire_all()
+    assert db_session.get(models.Item, menu.ramen.id).stock == 98
+
+
+def test_batch_size_is_capped(client):
+    orders = [offline(str(i), 1) for i in range(schemas.MAX_ORDER_BATCH + 1)]
+    assert client.post("/orders/batch", json={"orders": orders}).status_code == 422
+
+
+def test_non_positive_quantities_are_rejected(client, db_session, menu):
+    for quantity in (0, -3):
+        line = {"item_id": menu.ramen.id, "quantity": quantity}
+        assert client.post("/orders", json={"items": [line]}).status_code == 422
+        assert client.post("/orders/batch", json={"orders": [offline("k1-neg", menu.ramen.id, quantity=quantity)]}).status_code == 422
+    order_id = client.post("/orders", json={"items": []}).json()["id"]
+    assert client.post(f"/orders/{order_id}/items", json={"items": [{"item_id": menu.ramen.id, "quantity": -1}]}).status_code == 422
+    db_session.expire_all()
+    assert db_session.get(models.Item, menu.ramen.id).stock == 100
@@ -0,0 +1,50 @@
+import pytest
+from sqlalchemy import event
+
+from backend import crud, models, pricing, schemas
+
+
+def test_order_totals_are_persisted(db_session, menu):
+    order = crud.create_order(db_session, schemas.OrderCreate(items=[
+        schemas.OrderItemCreate(item_id=menu.ramen.id, quantity=2, option_ids=[menu.large.id]),
+        schemas.OrderItemCreate(item_id=menu.ramen.id, quantity=1, option_ids=[menu.small.id]),
+    ]))
+    assert [(line.unit_price, line.line_total) for line in order.items] == [(900, 1800), (750, 750)]
+    assert order.total == 2550
+
+    order = crud.add_items_to_order(db_session, order.id, [schemas.OrderItemCreate(item_id=menu.ramen.id, quantity=1)])
+    assert order.total == 3350
+
+    order = crud.checkout_order(db_session, order.id, "cash")
+    assert order.total == 3350
+
+def test_price_table_serves_repeat_lookups_from_cache(db_session, menu):
+    line = [schemas.OrderItemCreate(item_id=menu.ramen.id, quantity=1, option_ids=[menu.large.id])]
+    pricing.price_lines(db_session, line)
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    engine = db_session.get_bind()
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        assert pricing.price_lines(db_session, line) == [(900, 900)]
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    assert statements == []
+
+def test_price_change_invalidates_table(db_session, menu):
+    line = [schemas.OrderItemCreate(item_id=menu.ramen.id, quantity=1)]
+    assert pricing.price_lines(db_session, line) == [(800, 800)]
+
+    crud.update_item(db_session, menu.ramen.id, schemas.ItemCreate(name="Ramen", price=850))
+    assert pricing.price_lines(db_session, line) == [(850, 850)]
+
+def test_unknown_item_or_option_rejected(client, db_session):
+    with pytest.raises(pricing.UnknownPriceError) as exc_info:
+        pricing.price_lines(db_session, [schemas.OrderItemCreate(item_id=999, quantity=1, option_ids=[998])])
+    assert exc_info.value.item_ids == [999]
+    assert exc_info.value.option_ids == [998]
+
+    res = client.post("/orders", json={"items": [{"item_id": 999, "quantity": 1}]})
+    assert res.status_code == 400
+    assert db_session.query(models.Order).count() == 0
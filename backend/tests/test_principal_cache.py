@@ -0,0 +1,67 @@
+from sqlalchemy import event
+
+from backend import auth, crud
+from backend.principal_cache import PrincipalCache, principal_cache
+
+
+def count_store_queries(db_session, fn):
+    statements = []
+    def listener(conn, cursor, statement, *args):
+        if "FROM stores" in statement:
+            statements.append(statement)
+    engine = db_session.get_bind()
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        fn()
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    return len(statements)
+
+def test_authenticated_requests_reuse_cached_principal(client, db_session, login, store):
+    headers = login()
+    responses = []
+
+    def create(name):
+        responses.append(client.post("/items/", json={"name": name, "price": 800}, headers=headers))
+
+    assert count_store_queries(db_session, lambda: create("Ramen")) == 1
+    assert count_store_queries(db_session, lambda: create("Gyoza")) == 0
+    assert [response.status_code for response in responses] == [200, 200]
+    assert principal_cache.stats()["hits"] == 1
+    assert client.get("/stats").json()["principal_cache"]["hit_ratio"] == 0.5
+
+def test_store_update_invalidates_principal(client, db_session, login, store):
+    headers = login()
+    client.post("/items/", json={"name": "Ramen", "price": 800}, headers=headers)
+    assert principal_cache.stats()["size"] == 1
+
+    store = crud.get_store_by_code(db_session, "admin")
+    store.code = "renamed"
+    db_session.commit()
+
+    assert principal_cache.stats()["size"] == 0
+    assert client.post("/items/", json={"name": "Gyoza", "price": 400}, headers=headers).status_code == 401
+
+def test_embedded_store_id_skips_lookup(client, db_session, monkeypatch, login, store):
+    monkeypatch.setattr(auth, "EMBED_STORE_ID_IN_TOKEN", True)
+    headers = login()
+
+    res = None
+    def create():
+        nonlocal res
+        res = client.post("/items/", json={"name": "Ramen", "price": 800}, headers=headers)
+    assert count_store_queries(db_session, create) == 0
+    assert res.status_code == 200
+    assert crud.get_items(db_session)[0].store_id == store.id
+    assert principal_cache.stats()["token_hits"] == 1
+
+def test_cache_expires_and_evicts():
+    cache = PrincipalCache(ttl=0, max_size=1)
+    class Store:
+        id, code, name = 1, "a", "A"
+    assert cache.get_or_load("a", lambda: Store()).id == 1
+    assert cache.get_or_load("a", lambda: None) is None # expired, reloaded
+    cache = PrincipalCache(ttl=60, max_size=1)
+    cache.get_or_load("a", lambda: Store())
+    cache.get_or_load("b", lambda: Store())
+    assert cache.stats()["size"] == 1
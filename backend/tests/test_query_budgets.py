@@ -0,0 +1,68 @@
+import pytest
+
+from backend import crud, models, schemas
+from backend.principal_cache import principal_cache
+
+# Most statements each endpoint may run, whatever the number of lines or orders.
+# Raise one only with a reason: an increase here is usually a new lazy load in crud.py.
+BUDGETS = {
+    "POST /orders": 11, # prices, options, store, 3 inserts, new line ids, order + 3 selectin loads
+    "POST /orders/{id}/items": 9, # as POST /orders, with the total update in place of the store lookup
+    "GET /orders/{id}": 4,
+    "POST /orders/{id}/checkout": 11, # claim, stock, 3 sales rollup statements, reload
+    "PUT /orders/{id}/status": 7, # includes the principal lookup on a cold cache
+    "GET /orders": 5,
+    "GET /items": 1, # cold menu cache
+}
+
+def _seed_menu(db, lines):
+    store = crud.create_store(db, schemas.StoreCreate(name="admin", password="pass"))
+    options = [models.Option(name=f"option{i} of {lines}", price_adjustment=50) for i in range(2)]
+    items = [models.Item(name=f"item{i} of {lines}", price=500, stock=100, category="Main", store_id=store.id) for i in range(lines)]
+    db.add_all(options + items)
+    db.flush()
+    db.add_all(models.ItemOption(item_id=item.id, option_id=option.id) for item in items for option in options)
+    db.commit()
+    return [{"item_id": item.id, "quantity": 2, "option_ids": [option.id for option in options]} for item in items]
+
+
+def _kiosk_flow(client, count_queries, cart):
+    """Statements run by each endpoint of an ordering session, by endpoint."""
+    token = client.post("/token", data={"username": "admin", "password": "pass"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    counted = {}
+
+    def call(endpoint, method, url, **kwargs):
+        with count_queries() as queries:
+            response = client.request(method, url, **kwargs)
+        assert response.status_code == 200, response.text
+        counted[endpoint] = queries
+        return response
+
+    order_id = call("POST /orders", "POST", "/orders", json={"items": cart}).json()["id"]
+    call("POST /orders/{id}/items", "POST", f"/orders/{order_id}/items", json={"items": cart})
+    call("GET /orders/{id}", "GET", f"/orders/{order_id}")
+    call("POST /orders/{id}/checkout", "POST", f"/orders/{order_id}/checkout", json={"payment_method": "CARD"})
+    call("PUT /orders/{id}/status", "PUT", f"/orders/{order_id}/status", json={"status": "COMPLETED"}, headers=headers)
+    for _ in range(4):
+        client.post("/orders", json={"items": cart})
+    call("GET /orders", "GET", "/orders")
+    call("GET /items", "GET", "/items", headers=headers)
+    return counted
+
+
+@pytest.mark.parametrize("lines", [1, 8])
+def test_endpoints_stay_within_query_budget(client, db_session, count_queries, lines):
+    counted = _kiosk_flow(client, count_queries, _seed_menu(db_session, lines))
+    for endpoint, budget in BUDGETS.items():
+        queries = counted[endpoint]
+        assert queries.count <= budget, f"{endpoint} ran {queries.count} statements:\n" + "\n".join(queries.statements)
+
+
+def test_query_count_does_not_grow_with_lines(client, db_session, count_queries):
+    one = _kiosk_flow(client, count_queries, _seed_menu(db_session, 1))
+    db_session.query(models.Store).delete()
+    db_session.commit()
+    principal_cache.clear()
+    many = _kiosk_flow(client, count_queries, _seed_menu(db_session, 8))
+    assert {endpoint: q.count for endpoint, q in many.items()} == {endpoint: q.count for endpoint, q in one.items()}
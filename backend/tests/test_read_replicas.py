@@ -0,0 +1,184 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import backend
+from backend import auth, crud, models, schemas
+from backend.database import (
+    READ_YOUR_WRITES_SECONDS, WRITE_MARKER_COOKIE, WRITE_MARKER_HEADER, Base, ReadSessionLocal, RecentWrites, recent_writes,
+)
+from backend.main import app, get_db, get_read_db
+from backend.menu_cache import menu_cache
+from backend.pricing import price_table
+from backend.principal_cache import principal_cache
+
+
+@pytest.fixture
+def replica():
+    # The replica is a copy of the primary file taken after seeding, so later
+    # primary writes are invisible to it, like an arbitrarily lagging replica
+    directory = tempfile.mkdtemp()
+    primary_path = os.path.join(directory, "primary.db")
+    replica_path = os.path.join(directory, "replica.db")
+    primary_engine = create_engine(f"sqlite:///{primary_path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=primary_engine)
+    PrimarySession = sessionmaker(autocommit=False, autoflush=False, bind=primary_engine)
+
+    with PrimarySession() as db:
+        store = models.Store(name="admin", code="admin", hashed_password=auth.get_password_hash("pass"))
+        db.add(store)
+        db.flush()
+        item = models.Item(name="Burger", price=5000, stock=10, category="Main", store_id=store.id)
+        db.add(item)
+        db.commit()
+        order = crud.create_order(db, schemas.OrderCreate(items=[schemas.OrderItemCreate(item_id=item.id, quantity=1)]))
+        item_id, order_id = item.id, order.id
+    primary_engine.dispose()
+    shutil.copyfile(primary_path, replica_path)
+    replica_engine = create_engine(f"sqlite:///{replica_path}", connect_args={"check_same_thread": False})
+
+    def override_get_db():
+        with PrimarySession() as db:
+            yield db
+
+    def override_get_read_db():
+        with ReadSessionLocal(bind=replica_engine) as db:
+            yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_read_db
+    menu_cache.invalidate()
+    price_table.invalidate()
+    recent_writes.clear()
+    principal_cache.clear()
+    yield TestClient(app), PrimarySession, item_id, order_id
+    app.dependency_overrides.clear()
+    menu_cache.invalidate()
+    recent_writes.clear()
+    primary_engine.dispose()
+    replica_engine.dispose()
+    shutil.rmtree(directory)
+
+
+def test_reads_go_to_replica(replica):
+    client, PrimarySession, _, order_id = replica
+    with PrimarySession() as db:
+        # Written behind the app's back, so nothing is marked as recent
+        db.query(models.Order).filter(models.Order.id == order_id).update({"status": models.OrderStatus.COMPLETED})
+        db.commit()
+
+    assert client.get(f"/orders/{order_id}").json()["status"] == models.OrderStatus.PENDING
+    assert client.get("/orders").json()[0]["status"] == models.OrderStatus.PENDING
+
+
+def test_kiosk_reads_its_own_writes(replica):
+    client, _, item_id, _ = replica
+    response = client.post("/orders", json={"items": [{"item_id": item_id, "quantity": 2}]})
+    order_id = response.json()["id"]
+    assert client.get(f"/orders/{order_id}").status_code == 200
+
+    client.post(f"/orders/{order_id}/checkout", json={"payment_method": "CARD"})
+    assert client.get(f"/orders/{order_id}").json()["status"] == models.OrderStatus.COMPLETED
+
+
+def test_unreplicated_order_falls_back_to_primary(replica):
+    client, PrimarySession, item_id, _ = replica
+    with PrimarySession() as db:
+        order = crud.create_order(db, schemas.OrderCreate(items=[schemas.OrderItemCreate(item_id=item_id, quantity=1)]))
+    recent_writes.clear() # As if another worker had created it
+
+    response = client.get(f"/orders/{order.id}")
+    assert response.status_code == 200
+    assert response.json()["id"] == order.id
+
+
+def test_menu_reload_after_write_uses_primary(replica):
+    client, PrimarySession, item_id, _ = replica
+    token = client.post("/token", data={"username": "admin", "password": "pass"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get("/items", headers=headers).json()[0]["price"] == 5000
+    with PrimarySession() as db:
+        crud.update_item(db, item_id, schemas.ItemCreate(name="Burger", price=5500, stock=10, category="Main"))
+
+    assert client.get("/items", headers=headers).json()[0]["price"] == 5500
+
+
+def test_read_session_rejects_writes():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    with ReadSessionLocal(bind=engine) as db:
+        assert db.query(models.Item).count() == 0
+        db.add(models.Item(name="Fries", price=1000, stock=1, category="Side"))
+        with pytest.raises(RuntimeError):
+            db.commit()
+
+
+def test_recent_writes_expire():
+    tracker = RecentWrites(window=0)
+    tracker.mark(("order", 1))
+    assert not tracker.is_recent(("order", 1))
+
+    tracker = RecentWrites(window=60)
+    tracker.mark(("order", 1))
+    assert tracker.is_recent(("order", 1))
+    assert not tracker.is_recent(("order", 2))
+
+
+def test_write_marker_routes_reads_to_primary_on_any_worker(replica):
+    client, _, item_id, _ = replica
+    response = client.post("/orders", json={"items": [{"item_id": item_id, "quantity": 1}]})
+    order_id = response.json()["id"]
+    marker = response.headers[WRITE_MARKER_HEADER]
+    assert client.cookies.get(WRITE_MARKER_COOKIE) == marker
+    recent_writes.clear() # As if the reads landed on another worker
+
+    assert client.get(f"/orders/{order_id}").status_code == 200
+    assert order_id in [order["id"] for order in client.get("/orders").json()]
+
+    client.cookies.clear()
+    assert order_id not in [order["id"] for order in client.get("/orders").json()] # Replica, still lagging
+    assert order_id in [order["id"] for order in client.get("/orders", headers={WRITE_MARKER_HEADER: marker}).json()]
+    stale = f"{float(marker) - READ_YOUR_WRITES_SECONDS - 1:.3f}"
+    assert order_id not in [order["id"] for order in client.get("/orders", headers={WRITE_MARKER_HEADER: stale}).json()]
+
+
+# Worker B: a separate process serving one request from the same primary and replica files
+OTHER_WORKER = """
+import json, sys
+from fastapi.testclient import TestClient
+from backend.main import app
+response = TestClient(app).get(sys.argv[1], headers=json.loads(sys.argv[2]))
+print(json.dumps(response.json()))
+"""
+
+
+def _other_worker_get(PrimarySession, path, headers=None):
+    primary_path = PrimarySession.kw["bind"].url.database
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{primary_path}",
+        "DATABASE_READ_URLS": f"sqlite:///{os.path.join(os.path.dirname(primary_path), 'replica.db')}",
+    }
+    result = subprocess.run(
+        [sys.executable, "-c", OTHER_WORKER, path, json.dumps(headers or {})],
+        cwd=os.path.dirname(os.path.dirname(backend.__file__)), env=env, capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def test_write_marker_crosses_worker_processes(replica):
+    client, PrimarySession, item_id, _ = replica
+    response = client.post("/orders", json={"items": [{"item_id": item_id, "quantity": 1}]})
+    order_id = response.json()["id"]
+
+    assert order_id not in [order["id"] for order in _other_worker_get(PrimarySession, "/orders")]
+    echoed = {WRITE_MARKER_HEADER: response.headers[WRITE_MARKER_HEADER]}
+    assert order_id in [order["id"] for order in _other_worker_get(PrimarySession, "/orders", echoed)]
@@ -0,0 +1,48 @@
+import json
+from typing import List
+
+from pydantic import TypeAdapter
+
+from backend import crud, models, schemas, serialization
+
+
+def make_orders(db):
+    store = crud.create_store(db, schemas.StoreCreate(name="admin", password="pass"))
+    ramen = crud.create_item(db, schemas.ItemCreate(name="醤油ラーメン", price=800, category="麺類"), store_id=store.id)
+    large = models.Option(name="大盛", price_adjustment=100)
+    db.add(large)
+    db.flush()
+    db.add(models.ItemOption(item_id=ramen.id, option_id=large.id))
+    db.commit()
+    crud.create_order(db, schemas.OrderCreate(items=[
+        schemas.OrderItemCreate(item_id=ramen.id, quantity=2, option_ids=[large.id])
+    ], age_group="30s"))
+    order = crud.create_order(db, schemas.OrderCreate(items=[]))
+    crud.checkout_order(db, order.id, "cash")
+    return crud.get_orders(db)
+
+def reference(schema, rows):
+    # What FastAPI's response_model path produces
+    adapter = TypeAdapter(List[schema])
+    return adapter.dump_python(adapter.validate_python(rows, from_attributes=True), mode="json")
+
+def test_render_orders_matches_response_model(db_session):
+    orders = make_orders(db_session)
+    assert json.loads(serialization.render_orders(orders)) == reference(schemas.Order, orders)
+
+def test_render_items_matches_response_model(db_session):
+    make_orders(db_session)
+    items = crud.get_items(db_session)
+    assert json.loads(serialization.render_items(items)) == reference(schemas.Item, items)
+
+def test_stdlib_fallback_matches_orjson(db_session, monkeypatch):
+    orders = make_orders(db_session)
+    fast = serialization.render_orders(orders)
+    monkeypatch.setattr(serialization, "orjson", None)
+    assert json.loads(serialization.render_orders(orders)) == json.loads(fast)
+
+def test_read_orders_fast_path(client, db_session):
+    orders = make_orders(db_session)
+    res = client.get("/orders")
+    assert res.headers["content-type"] == "application/json"
+    assert res.json() == reference(schemas.Order, orders)
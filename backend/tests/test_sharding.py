@@ -0,0 +1,85 @@
+from backend import models, sharding
+
+
+def _order(client, item_id, quantity=1):
+    response = client.post("/orders", json={"items": [{"item_id": item_id, "quantity": quantity}]})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_ids_are_allocated_per_shard(sharded):
+    _, router, store_ids, item_ids = sharded
+    for store_id in store_ids:
+        assert router.shard_for_id(item_ids[store_id]) == router.shard_for_store(store_id)
+    assert max(item_ids.values()) > sharding.ID_STRIDE
+
+
+def test_orders_are_written_to_their_stores_shard(sharded):
+    client, router, store_ids, item_ids = sharded
+    for store_id in store_ids:
+        order = _order(client, item_ids[store_id], quantity=2)
+        assert order["store_id"] == store_id
+        shard = router.shard_for_store(store_id)
+        assert router.shard_for_id(order["id"]) == shard
+        with router.session(shard) as db:
+            assert db.get(models.Order, order["id"]) is not None
+        with router.session(1 - shard) as db:
+            assert db.get(models.Order, order["id"]) is None
+
+        assert client.get(f"/orders/{order['id']}").json()["total"] == 1600
+        assert client.post(f"/orders/{order['id']}/checkout", json={"payment_method": "CARD"}).status_code == 200
+        with router.session(shard) as db:
+            assert db.get(models.Item, item_ids[store_id]).stock == 3
+
+
+def test_feed_merges_every_shard(sharded):
+    client, _, store_ids, item_ids = sharded
+    created = [_order(client, item_ids[store_ids[i % 2]])["id"] for i in range(3)]
+
+    first = client.get("/orders", params={"limit": 2})
+    assert [o["id"] for o in first.json()] == created[::-1][:2]
+    rest = client.get("/orders", params={"limit": 2, "cursor": first.headers["X-Next-Cursor"]})
+    assert [o["id"] for o in rest.json()] == created[:1]
+
+    since = first.headers["X-Since-Cursor"]
+    client.post(f"/orders/{created[0]}/checkout", json={"payment_method": "CASH"})
+    changed = client.get("/orders", params={"since": since}).json()
+    assert [o["id"] for o in changed] == [created[0]]
+
+
+def test_menu_and_sales_span_shards(sharded):
+    client, _, store_ids, item_ids = sharded
+    # Each kiosk gets its own store's menu, read from that store's shard only
+    for name, store_id in zip(("shinjuku", "shibuya"), store_ids):
+        token = client.post("/token", data={"username": name, "password": "pass"}).json()["access_token"]
+        menu = client.get("/items", headers={"Authorization": f"Bearer {token}"}).json()
+        assert [item["id"] for item in menu] == [item_ids[store_id]]
+
+    for store_id in store_ids:
+        order = _order(client, item_ids[store_id])
+        client.post(f"/orders/{order['id']}/checkout", json={"payment_method": "CARD"})
+    token = client.post("/token", data={"username": "shinjuku", "password": "pass"}).json()["access_token"]
+    sales = client.get("/analytics/sales/items", headers={"Authorization": f"Bearer {token}"}).json()
+    assert sorted(row["store_id"] for row in sales) == sorted(store_ids)
+
+
+def test_unroutable_requests(sharded):
+    client, _, store_ids, item_ids = sharded
+    response = client.post("/orders", json={"items": [{"item_id": item_id, "quantity": 1} for item_id in item_ids.values()]})
+    assert response.status_code == 400
+    assert client.get(f"/orders/{5 * sharding.ID_STRIDE}").status_code == 404
+
+
+def test_empty_order_opens_on_the_kiosks_shard(sharded):
+    client, router, store_ids, item_ids = sharded
+    for store_id, code in zip(store_ids, ("shinjuku", "shibuya")):
+        token = client.post("/token", data={"username": code, "password": "pass"}).json()["access_token"]
+        response = client.post("/orders", json={"items": []}, headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 200
+        order_id = response.json()["id"]
+        assert router.shard_for_id(order_id) == router.shard_for_store(store_id)
+        added = client.post(f"/orders/{order_id}/items", json={"items": [{"item_id": item_ids[store_id], "quantity": 1}]})
+        assert added.status_code == 200 and added.json()["total"] == 800
+    # As when unsharded, logging in is not required
+    assert client.post("/orders", json={"items": []}).status_code == 200
+    assert client.post("/orders", json={"items": []}, headers={"Authorization": "Bearer expired"}).status_code == 200
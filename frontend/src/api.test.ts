@@ -0,0 +1,30 @@
+import { describe, it, expect, beforeEach } from 'vitest';
+import type { AxiosAdapter, InternalAxiosRequestConfig } from 'axios';
+import api, { LAST_WRITE_HEADER } from './api';
+
+// Answers every request with the given headers and records what was sent
+const respondWith = (headers: Record<string, string>, sent: InternalAxiosRequestConfig[]): AxiosAdapter =>
+    async (config) => {
+        sent.push(config);
+        return { data: {}, status: 200, statusText: 'OK', headers, config };
+    };
+
+describe('api client', () => {
+    beforeEach(() => {
+        sessionStorage.clear();
+    });
+
+    it('sends cookies with cross-origin requests', () => {
+        expect(api.defaults.withCredentials).toBe(true);
+    });
+
+    it('echoes the last write marker on later requests', async () => {
+        const sent: InternalAxiosRequestConfig[] = [];
+        await api.get('/orders/1', { adapter: respondWith({}, sent) });
+        expect(sent[0].headers[LAST_WRITE_HEADER]).toBeUndefined();
+
+        await api.post('/orders', {}, { adapter: respondWith({ 'x-last-write': '1700000000.123' }, sent) });
+        await api.get('/orders/1', { adapter: respondWith({}, sent) });
+        expect(sent[2].headers[LAST_WRITE_HEADER]).toBe('1700000000.123');
+    });
+});
@@ -2,8 +2,15 @@ import axios from 'axios';
 
 const api = axios.create({
     baseURL: import.meta.env.VITE_API_BASE_URL || 'http://localhost:8000',
+    // Sends the server's last_write cookie back, so reads right after a write skip lagging replicas
+    withCredentials: true,
 });
 
+// Write-time marker from the last order write; echoed on every request so whichever
+// API worker serves the next read sends it to the primary (see backend mark_client_write)
+export const LAST_WRITE_HEADER = 'X-Last-Write';
+const LAST_WRITE_KEY = 'last_write';
+
 // Request interceptor to ensure token is present in headers
 api.interceptors.request.use(
     (config) => {
@@ -11,6 +18,10 @@ api.interceptors.request.use(
         if (token) {
             config.headers.Authorization = `Bearer ${token}`;
         }
+        const lastWrite = sessionStorage.getItem(LAST_WRITE_KEY);
+        if (lastWrite) {
+            config.headers[LAST_WRITE_HEADER] = lastWrite;
+        }
         return config;
     },
     (error) => {
@@ -18,4 +29,12 @@ api.interceptors.request.use(
     }
 );
 
+api.interceptors.response.use((response) => {
+    const lastWrite = response.headers?.[LAST_WRITE_HEADER.toLowerCase()];
+    if (lastWrite) {
+        sessionStorage.setItem(LAST_WRITE_KEY, lastWrite);
+    }
+    return response;
+});
+
 export default api;
@@ -1,4 +1,4 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import api from '../../api';
 import type { Order } from '../../types';
 
@@ -6,11 +6,15 @@ export const OrderManager = () => {
     const [orders, setOrders] = useState<Order[]>([]);
     const [loading, setLoading] = useState(true);
 
+    // Cursor returned by the API; lets the periodic refresh fetch only new or changed orders
+    const sinceCursor = useRef<string | null>(null);
+
     const fetchOrders = async () => {
         try {
             setLoading(true);
             const res = await api.get('/orders');
             setOrders(res.data);
+            sinceCursor.current = res.headers?.['x-since-cursor'] ?? null;
         } catch (error) {
             console.error("Failed to fetch orders", error);
         } finally {
@@ -18,26 +22,42 @@ export const OrderManager = () => {
         }
     };
 
+    const fetchChanges = async () => {
+        if (!sinceCursor.current) return fetchOrders();
+        try {
+            const res = await api.get<Order[]>('/orders', { params: { since: sinceCursor.current } });
+            sinceCursor.current = res.headers?.['x-since-cursor'] ?? sinceCursor.current;
+            if (res.data.length === 0) return;
+            setOrders(prev => {
+                const byId = new Map(prev.map(o => [o.id, o]));
+                res.data.forEach(o => byId.set(o.id, o));
+                return [...byId.values()].sort((a, b) => b.created_at.localeCompare(a.created_at) || b.id - a.id);
+            });
+        } catch (error) {
+            console.error("Failed to fetch order changes", error);
+        }
+    };
+
     useEffect(() => {
         fetchOrders();
-        // Optional: Polling every 30 seconds
-        const interval = setInterval(fetchOrders, 30000);
+        // Polling every 30 seconds, incremental after the first load
+        const interval = setInterval(fetchChanges, 30000);
         return () => clearInterval(interval);
     }, []);
 
     const handleStatusUpdate = async (orderId: number, newStatus: string) => {
         try {
             await api.put(`/orders/${orderId}/status`, { status: newStatus });
-            // Optimistic update or refresh
-            fetchOrders();
+            fetchChanges();
         } catch (error) {
             console.error("Failed to update status", error);
             alert("ステータス更新に失敗しました");
         }
     };
 
-    // Calculate order total helper (since backend might not send total yet, or just to be safe)
+    // Backend persists totals; recompute only for orders created before that
     const calculateTotal = (order: Order) => {
+        if (order.total != null) return order.total;
         return order.items.reduce((sum, item) => {
             const itemPrice = item.item.price;
             const optionsPrice = item.options.reduce((optSum, opt) => optSum + opt.price_adjustment, 0);
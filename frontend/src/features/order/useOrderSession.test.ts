@@ -21,6 +21,7 @@ describe('useOrderSession', () => {
 
     afterEach(() => {
         vi.useRealTimers();
+        vi.unstubAllGlobals();
     });
 
     it('initializes with default values', () => {
@@ -53,6 +54,7 @@ describe('useOrderSession', () => {
 
     // Add more tests for existing order (add items), checkout, and polling
     it('polls for status updates when currentOrderId is set', async () => {
+        vi.stubGlobal('EventSource', undefined); // Force the polling fallback
         const mockOrderResponse = { data: { id: 123, status: 'completed', items: [] } };
         (api.get as ReturnType<typeof vi.fn>).mockResolvedValue(mockOrderResponse);
 
@@ -83,6 +85,40 @@ describe('useOrderSession', () => {
         expect(api.get).toHaveBeenCalledWith('/orders/123');
     });
 
+    it('receives status updates over SSE when EventSource is available', async () => {
+        const sources: { url: string; listeners: Record<string, (e: MessageEvent) => void>; close: () => void }[] = [];
+        class FakeEventSource {
+            url: string;
+            listeners: Record<string, (e: MessageEvent) => void> = {};
+            close = vi.fn();
+            constructor(url: string) {
+                this.url = url;
+                sources.push(this);
+            }
+            addEventListener(name: string, listener: (e: MessageEvent) => void) {
+                this.listeners[name] = listener;
+            }
+        }
+        vi.stubGlobal('EventSource', FakeEventSource);
+
+        (api.post as ReturnType<typeof vi.fn>).mockResolvedValue({ data: { id: 123, status: 'pending', items: [] } });
+        const { result, unmount } = renderHook(() => useOrderSession());
+
+        await act(async () => {
+            await result.current.sendOrder([{ id: 1, quantity: 1, selected_options: [] } as any], () => { });
+        });
+
+        expect(sources[0].url).toBe('/orders/123/events');
+        act(() => {
+            sources[0].listeners.status({ data: JSON.stringify({ order_id: 123, status: 'completed', payment_method: 'cash' }) } as MessageEvent);
+        });
+        expect(result.current.sessionOrders[0].status).toBe('completed');
+        expect(api.get).not.toHaveBeenCalled();
+
+        unmount();
+        expect(sources[0].close).toHaveBeenCalled();
+    });
+
     it('calculates sessionTotal correctly', async () => {
         const mockOrderResponse = {
             data: {
@@ -10,10 +10,22 @@ export const useOrderSession = () => {
     const [isThankYouVisible, setIsThankYouVisible] = useState(false);
     const [customerAttributes, setCustomerAttributes] = useState<{ ageGroup: string; gender: string } | null>(null);
 
-    // Polling for status updates
+    // Status updates: server push (SSE) where available, polling as a fallback
     useEffect(() => {
         if (!currentOrderId) return;
 
+        if (typeof EventSource !== 'undefined') {
+            const source = new EventSource(`${api.defaults?.baseURL ?? ''}/orders/${currentOrderId}/events`);
+            source.addEventListener('status', (event) => {
+                const update = JSON.parse((event as MessageEvent).data);
+                setSessionOrders(prev => prev.map(o => o.id === currentOrderId
+                    ? { ...o, status: update.status, payment_method: update.payment_method }
+                    : o));
+            });
+            // EventSource reconnects on its own after network errors
+            return () => source.close();
+        }
+
         const pollOrder = async () => {
             try {
                 const res = await api.get<Order>(`/orders/${currentOrderId}`);
@@ -87,11 +99,11 @@ export const useOrderSession = () => {
     }, []);
 
     const sessionTotal = sessionOrders.reduce((acc, order) =>
-        acc + order.items.reduce((sum, item) => {
+        acc + (order.total ?? order.items.reduce((sum, item) => {
             const itemPrice = item.item.price;
             const optionsPrice = item.options.reduce((optSum, opt) => optSum + opt.price_adjustment, 0);
             return sum + (itemPrice + optionsPrice) * item.quantity;
-        }, 0), 0);
+        }, 0)), 0);
 
     return {
         currentOrderId,
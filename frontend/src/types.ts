@@ -35,6 +35,8 @@ export interface OrderItem {
     item: Item;
     quantity: number;
     options: Option[];
+    unit_price?: number | null;
+    line_total?: number | null;
 }
 
 export interface Order {
@@ -42,6 +44,9 @@ export interface Order {
     created_at: string;
     status: string;
     payment_method: string | null;
+    total?: number | null; // Persisted by the backend pricing engine
+    store_id?: number | null;
+    client_order_id?: string | null;
     items: OrderItem[];
     session_total?: number; // Calculated on frontend or separate
 }